@@ -0,0 +1,109 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+
+from .app import run
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m cascade_ui", description="Run Cascade Web UI")
+    parser.add_argument("--path", default=".")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes, when more than one they share the persistent index "
+        "which one of them refreshes every CASCADE_UI_REFRESH_INTERVAL or 10 seconds. "
+        "Each worker keeps its own in-memory indexes of the lines it serves",
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=None,
+        help="Threads for parallel meta reads, CASCADE_UI_IO_WORKERS or 8 by default",
+    )
+    parser.add_argument(
+        "--handler-workers",
+        type=int,
+        default=None,
+        help=(
+            "Threads running blocking parts of requests, "
+            "CASCADE_UI_HANDLER_WORKERS or 16 by default"
+        ),
+    )
+    parser.add_argument(
+        "--scan-limit",
+        type=int,
+        default=None,
+        help="Max concurrent repo and line scans, CASCADE_UI_SCAN_LIMIT or 4 by default",
+    )
+    parser.add_argument(
+        "--index",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help="Keep the persistent index of the workspace in a SQLite file to start faster, "
+        "in .cascade_ui_index.sqlite of the workspace if no path is given",
+    )
+    parser.add_argument(
+        "--meta-cache-mb",
+        type=int,
+        default=None,
+        help="Size of parsed metas cached by each worker, CASCADE_UI_META_CACHE_MB or 256 "
+        "split between the workers by default",
+    )
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        default=None,
+        help="Send Server-Timing headers and serve /v1/metrics, also CASCADE_UI_INSTRUMENT=1",
+    )
+    parser.add_argument(
+        "--profile-slowest",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Keep cProfile dumps of N slowest requests, CASCADE_UI_PROFILE_SLOWEST",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Where to keep the dumps, CASCADE_UI_PROFILE_DIR or ./cascade_ui_profiles",
+    )
+    args = parser.parse_args()
+
+    run(
+        args.path,
+        args.host,
+        args.port,
+        io_workers=args.io_workers,
+        handler_workers=args.handler_workers,
+        scan_limit=args.scan_limit,
+        index_path=args.index,
+        instrument=args.instrument,
+        profile_slowest=args.profile_slowest,
+        profile_dir=args.profile_dir,
+        workers=args.workers,
+        meta_cache_mb=args.meta_cache_mb,
+    )
+
+
+if __name__ == "__main__":
+    main()
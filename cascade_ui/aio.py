@@ -0,0 +1,538 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import codecs
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Body, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing_extensions import Annotated
+
+from .etag import body_etag, cache_headers, etag_matches
+from .instrument import profiled
+from .logs import CHUNK_SIZE, read_chunk
+from .models import (
+    AddCommentRequest,
+    CacheStats,
+    Comment,
+    ConfigResponse,
+    DatasetPathSpec,
+    DatasetResponse,
+    ExportRequest,
+    LeaderboardQuery,
+    LeaderboardResponse,
+    LineAggregatesResponse,
+    LinePathSpec,
+    LineQuery,
+    LineRequest,
+    LineResponse,
+    LineSeriesResponse,
+    LogRequest,
+    LogResponse,
+    ModelFilesRequest,
+    ModelFilesResponse,
+    ModelPathSpec,
+    ModelResponse,
+    ModelsBatchRequest,
+    ModelsBatchResponse,
+    RepoPathSpec,
+    RepoResponse,
+    SearchRequest,
+    SearchResponse,
+    VersionResponse,
+    WorkspaceResponse,
+)
+from .pool import ScanCancelled, cancel_event
+from .responses import FastJSONResponse, IteratorResponse
+from .server import Server
+
+DEFAULT_HANDLER_WORKERS = 16
+DEFAULT_SCAN_LIMIT = 4
+
+# Status used by some servers when the client closed the connection
+CLIENT_CLOSED_REQUEST = 499
+
+
+class AsyncServer:
+    """
+    Async endpoints over the ``Server``
+
+    Blocking metadata and file reads run in a dedicated executor instead of
+    the default threadpool, so they do not starve other requests.
+    Slow scans of repos and lines are additionally limited in number and
+    are cancelled when the client disconnects.
+    """
+
+    def __init__(
+        self,
+        server: Server,
+        handler_workers: int = DEFAULT_HANDLER_WORKERS,
+        scan_limit: int = DEFAULT_SCAN_LIMIT,
+        disconnect_poll_interval: float = 0.1,
+        follow_interval: float = 0.5,
+        keepalive_interval: float = 15.0,
+    ) -> None:
+        self._server = server
+        self._executor = ThreadPoolExecutor(
+            max_workers=handler_workers, thread_name_prefix="cascade_ui_handler"
+        )
+        self._scan_limit = scan_limit
+        self._scan_slots: Optional[asyncio.Semaphore] = None
+        self._poll_interval = disconnect_poll_interval
+        self._follow_interval = follow_interval
+        self._keepalive_interval = keepalive_interval
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, ctx.run, profiled, fn, *args)
+
+    async def _wait_disconnect(self, request: Request) -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(self._poll_interval)
+
+    def _slots(self) -> asyncio.Semaphore:
+        if self._scan_slots is None:
+            # Created lazily to be bound to the running loop
+            self._scan_slots = asyncio.Semaphore(self._scan_limit)
+        return self._scan_slots
+
+    async def _run_scan(
+        self,
+        request: Request,
+        event: threading.Event,
+        ctx: contextvars.Context,
+        fn: Callable[..., Any],
+        *args: Any,
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, ctx.run, profiled, fn, *args)
+        watcher = asyncio.ensure_future(self._wait_disconnect(request))
+        try:
+            await asyncio.wait({future, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+
+        if not future.done():
+            # The scan stops at the next read and its result is dropped
+            event.set()
+            future.add_done_callback(lambda f: f.exception())
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+        try:
+            return future.result()
+        except ScanCancelled:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+    @staticmethod
+    def _scan_context() -> Tuple[threading.Event, contextvars.Context]:
+        event = threading.Event()
+        ctx = contextvars.copy_context()
+        ctx.run(cancel_event.set, event)
+        return event, ctx
+
+    async def _scan(self, request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+        async with self._slots():
+            event, ctx = self._scan_context()
+            return await self._run_scan(request, event, ctx, fn, *args)
+
+    async def _scan_stream(self, request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Same as ``_scan`` for the responses streamed from a blocking iterator.
+        The iterator is read in the same scan, so the slot and the cancellation
+        are kept until the whole body is sent
+        """
+        slots = self._slots()
+        await slots.acquire()
+        event, ctx = self._scan_context()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                # Stops the reads still running if the body was not sent
+                event.set()
+                slots.release()
+
+        try:
+            result = await self._run_scan(request, event, ctx, fn, *args)
+        except BaseException:
+            release()
+            raise
+        if not isinstance(result, IteratorResponse):
+            release()
+            return result
+
+        async def chunks() -> AsyncIterator[bytes]:
+            try:
+                while True:
+                    chunk = await self._run_scan(request, event, ctx, next, result.iterator, None)
+                    if chunk is None or isinstance(chunk, Response):
+                        return
+                    yield chunk
+            finally:
+                release()
+
+        result.body_iterator = chunks()
+        # The body may never be read if sending fails before it
+        result.on_close = release
+        return result
+
+    async def _conditional(
+        self,
+        request: Request,
+        response: Response,
+        etag: Callable[[], str],
+        body: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Answers 304 if the client has the response with the same ETag,
+        otherwise builds the body and sends it with the ETag
+        """
+        tag = await self._run(etag)
+        if etag_matches(request.headers.get("if-none-match"), tag):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=cache_headers(tag))
+
+        result = await body()
+        if isinstance(result, Response):
+            return result
+
+        # Building the body may update metas on disk, e.g. lines
+        # sync their meta when created, so the tag is taken after it
+        tag = await self._run(etag)
+        response.headers.update(cache_headers(tag))
+        return FastJSONResponse(result, headers=response.headers)
+
+    async def _scan_conditional(
+        self,
+        request: Request,
+        response: Response,
+        etag: Callable[[], str],
+        fn: Callable[..., Any],
+        *args: Any,
+    ) -> Any:
+        """
+        Same as ``_conditional`` for the responses whose ETag needs a scan
+        e.g. of the line index on the first request. The ETag and the body are
+        built in one scan, so it is limited and cancelled as the scans are
+        """
+        if_none_match = request.headers.get("if-none-match")
+
+        def build() -> Tuple[str, Any]:
+            # Data changed after the tag is taken only makes the tag older than
+            # the body, then the client gets the body again next time
+            tag = etag()
+            if etag_matches(if_none_match, tag):
+                return tag, None
+            return tag, fn(*args)
+
+        result = await self._scan(request, build)
+        if isinstance(result, Response):
+            return result
+
+        tag, body = result
+        if body is None:
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=cache_headers(tag))
+        response.headers.update(cache_headers(tag))
+        return FastJSONResponse(body, headers=response.headers)
+
+    async def _hashed(self, request: Request, fn: Callable[..., Any], *args: Any) -> Response:
+        """
+        For the responses without cheap validators the ETag is the hash of the body,
+        this saves sending it again, but not building it
+        """
+        return self._hashed_response(request, await self._run(fn, *args))
+
+    def _hashed_response(self, request: Request, result: Any) -> Response:
+        response = FastJSONResponse(result)
+        tag = body_etag(response.body)
+        if etag_matches(request.headers.get("if-none-match"), tag):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=cache_headers(tag))
+        response.headers.update(cache_headers(tag))
+        return response
+
+    async def add_comment(self, req: AddCommentRequest) -> Comment:
+        return await self._run(self._server.add_comment, req)
+
+    async def workspace(self, request: Request, response: Response) -> WorkspaceResponse:
+        return await self._conditional(
+            request,
+            response,
+            self._server.workspace_etag,
+            lambda: self._run(self._server.workspace),
+        )
+
+    async def repo(self, path: RepoPathSpec, request: Request, response: Response) -> RepoResponse:
+        return await self._conditional(
+            request,
+            response,
+            lambda: self._server.repo_etag(path),
+            lambda: self._scan(request, self._server.repo, path),
+        )
+
+    async def repo_get(
+        self, path: Annotated[RepoPathSpec, Query()], request: Request, response: Response
+    ) -> RepoResponse:
+        return await self.repo(path, request, response)
+
+    async def line_item_table(
+        self,
+        line_path: LinePathSpec,
+        item_fields: List[str],
+        request: Request,
+        response: Response,
+        query: Optional[LineQuery] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self._scan_conditional(
+            request,
+            response,
+            lambda: self._server.line_item_table_etag(line_path, item_fields, query),
+            self._server.line_item_table,
+            line_path,
+            item_fields,
+            query,
+            response,
+        )
+
+    async def line_item_table_stream(
+        self, line_path: LinePathSpec, item_fields: List[str], request: Request
+    ) -> StreamingResponse:
+        return await self._scan_stream(
+            request, self._server.line_item_table_stream, line_path, item_fields
+        )
+
+    async def export(self, req: ExportRequest, request: Request) -> StreamingResponse:
+        return await self._scan_stream(request, self._server.export, req)
+
+    async def line_series(
+        self,
+        line_path: LinePathSpec,
+        field: Annotated[str, Body()],
+        request: Request,
+        response: Response,
+        points: Annotated[Optional[int], Body(gt=2)] = None,
+    ) -> LineSeriesResponse:
+        return await self._scan_conditional(
+            request,
+            response,
+            lambda: self._server.line_series_etag(line_path, field, points),
+            self._server.line_series,
+            line_path,
+            field,
+            points,
+        )
+
+    async def line_aggregates(
+        self,
+        line_path: LinePathSpec,
+        request: Request,
+        response: Response,
+        fields: Optional[List[str]] = None,
+    ) -> LineAggregatesResponse:
+        return await self._scan_conditional(
+            request,
+            response,
+            lambda: self._server.line_aggregates_etag(line_path, fields),
+            self._server.line_aggregates,
+            line_path,
+            fields,
+        )
+
+    async def line(self, path: LineRequest, request: Request, response: Response) -> LineResponse:
+        return await self._scan_conditional(
+            request, response, lambda: self._server.line_etag(path), self._server.line, path
+        )
+
+    async def line_get(
+        self, path: Annotated[LineRequest, Query()], request: Request, response: Response
+    ) -> LineResponse:
+        return await self.line(path, request, response)
+
+    async def query(self, query: LeaderboardQuery, request: Request) -> LeaderboardResponse:
+        result = await self._scan(request, self._server.query, query)
+        if isinstance(result, Response):
+            return result
+        return FastJSONResponse(result)
+
+    async def search(self, req: SearchRequest, request: Request) -> SearchResponse:
+        result = await self._scan(request, self._server.search, req)
+        if isinstance(result, Response):
+            return result
+        return FastJSONResponse(result)
+
+    async def search_get(
+        self, req: Annotated[SearchRequest, Query()], request: Request
+    ) -> SearchResponse:
+        return await self.search(req, request)
+
+    async def model(
+        self, path: ModelPathSpec, request: Request, response: Response
+    ) -> ModelResponse:
+        return await self._conditional(
+            request,
+            response,
+            lambda: self._server.model_etag(path),
+            lambda: self._run(self._server.model, path),
+        )
+
+    async def model_get(
+        self, path: Annotated[ModelPathSpec, Query()], request: Request, response: Response
+    ) -> ModelResponse:
+        return await self.model(path, request, response)
+
+    async def models_batch(self, req: ModelsBatchRequest, request: Request) -> ModelsBatchResponse:
+        result = await self._scan(request, self._server.models_batch, req)
+        if isinstance(result, Response):
+            return result
+        return self._hashed_response(request, result)
+
+    async def model_files(self, req: ModelFilesRequest, request: Request) -> ModelFilesResponse:
+        return await self._hashed(request, self._server.model_files, req)
+
+    async def run_log(self, path: LogRequest, request: Request) -> LogResponse:
+        return await self._hashed(request, self._server.run_log, path)
+
+    async def run_log_get(
+        self, path: Annotated[LogRequest, Query()], request: Request
+    ) -> LogResponse:
+        return await self.run_log(path, request)
+
+    async def _follow(self, log_file: str, offset: int, request: Request) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        idle = 0.0
+        while not await request.is_disconnected():
+            try:
+                size = await self._run(os.path.getsize, log_file)
+            except FileNotFoundError:
+                size = 0
+
+            if size < offset:
+                # The log was truncated or replaced
+                offset = 0
+                decoder.reset()
+
+            if size > offset:
+                data = await self._run(read_chunk, log_file, offset, CHUNK_SIZE)
+                event = {
+                    "text": decoder.decode(data),
+                    "offset": offset,
+                    "end": offset + len(data),
+                }
+                offset += len(data)
+                yield f"data: {json.dumps(event)}\n\n"
+                idle = 0.0
+                continue
+
+            if idle >= self._keepalive_interval:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(self._follow_interval)
+            idle += self._follow_interval
+
+    async def run_log_follow(
+        self, repo: str, line: str, num: int, request: Request, offset: int = 0
+    ) -> StreamingResponse:
+        """
+        Server-Sent Events with the bytes appended to the log after the offset
+        """
+        log_file = self._server.run_log_path(ModelPathSpec(repo=repo, line=line, num=num))
+        return StreamingResponse(
+            self._follow(log_file, offset, request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    async def _events(
+        self, last_id: Optional[str], request: Request, line: Optional[Tuple[str, str]]
+    ) -> AsyncIterator[str]:
+        # Subscribed here, since the body is not read if the client
+        # is gone before it and then nothing would unsubscribe
+        if line is not None:
+            self._server.subscribe(*line)
+        try:
+            if last_id is None:
+                last_id = await self._run(self._server.last_event_id)
+            # Browsers reconnect after this many milliseconds and send the last id
+            yield f"retry: {int(self._follow_interval * 2000)}\n\n"
+            idle = 0.0
+            while not await request.is_disconnected():
+                events = await self._run(self._server.events, last_id)
+                if events:
+                    for event in events:
+                        data = event.model_dump_json(exclude_none=True)
+                        yield f"id: {event.id}\ndata: {data}\n\n"
+                    last_id = events[-1].id
+                    idle = 0.0
+                elif idle >= self._keepalive_interval:
+                    yield ": keep-alive\n\n"
+                    idle = 0.0
+                await asyncio.sleep(self._follow_interval)
+                idle += self._follow_interval
+        finally:
+            if line is not None:
+                self._server.unsubscribe(*line)
+
+    async def events(
+        self,
+        request: Request,
+        last_event_id: Annotated[Optional[str], Header()] = None,
+        repo: Optional[str] = None,
+        line: Optional[str] = None,
+    ) -> StreamingResponse:
+        """
+        Server-Sent Events with changes in the workspace, clients
+        that reconnect get the events they missed or a reset event.
+        Events of items come only for the line given
+        """
+        subscription = (repo, line) if repo is not None and line is not None else None
+        return StreamingResponse(
+            self._events(last_event_id, request, subscription),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    async def run_config(self, path: ModelPathSpec, request: Request) -> ConfigResponse:
+        return await self._hashed(request, self._server.run_config, path)
+
+    async def run_config_get(
+        self, path: Annotated[ModelPathSpec, Query()], request: Request
+    ) -> ConfigResponse:
+        return await self.run_config(path, request)
+
+    async def dataset(self, path: DatasetPathSpec, request: Request) -> DatasetResponse:
+        return await self._hashed(request, self._server.dataset, path)
+
+    async def dataset_get(
+        self, path: Annotated[DatasetPathSpec, Query()], request: Request
+    ) -> DatasetResponse:
+        return await self.dataset(path, request)
+
+    async def cache_stats(self) -> CacheStats:
+        return self._server.cache_stats()
+
+    async def version(self) -> VersionResponse:
+        return self._server.version()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -16,27 +16,116 @@ limitations under the License.
 
 import logging
 import os
+import time
+from typing import Optional
 
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
 
 from . import __version__
+from .aio import DEFAULT_HANDLER_WORKERS, DEFAULT_SCAN_LIMIT, AsyncServer
+from .cache import DEFAULT_META_CACHE_MB, MetaCache
+from .instrument import Metrics, RequestStats, SlowestProfiles, current_request
+from .pool import DEFAULT_IO_WORKERS
+from .refresh import IndexRefresher
+from .responses import GZIP_MIN_SIZE
 from .server import Server
+from .store import IndexStore
 
 
-def run(path: str, host: str, port: int):
-    logging.basicConfig(level="INFO")
-    logger = logging.getLogger(__file__)
+DEFAULT_PROFILE_DIR = "cascade_ui_profiles"
 
-    cwd = os.path.abspath(path)
-    logger.info(f"Starting in {cwd}")
+# Seconds between refreshes of the shared index when running several workers
+DEFAULT_REFRESH_INTERVAL = 10
+
+# Workers split the default meta cache, but keep at least this much each
+MIN_META_CACHE_MB = 16
+
+
+# Responses of these paths are streamed as they are produced. Compressing them
+# would hold the chunks back in the compressor, and before 0.46 Starlette
+# compressed event streams too
+STREAMING_PATHS = frozenset({"/v1/events", "/v1/run_log/follow", "/v1/line_item_table_stream"})
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """
+    Compresses the responses except the ones of the streaming paths
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return int(value)
+
+
+def _add_instrumentation(
+    app: FastAPI, server: AsyncServer, profiles: Optional[SlowestProfiles]
+) -> None:
+    metrics = Metrics()
 
-    server = Server(cwd)
+    @app.middleware("http")
+    async def instrument(request: Request, call_next):
+        stats = RequestStats("other", profile=profiles is not None)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            current_request.reset(token)
+        total = time.perf_counter() - start
 
+        # Requests are labeled by the template of the matched route and the rest are
+        # labeled as "other" to keep the number of series bounded
+        route = request.scope.get("route")
+        if route is not None and route.path.startswith("/v1/"):
+            stats.route = route.path
+
+        response.headers["Server-Timing"] = stats.server_timing(total)
+        response.headers["Timing-Allow-Origin"] = "*"
+        metrics.observe(stats, total)
+        if profiles is not None:
+            profiles.offer(stats, total)
+        return response
+
+    async def prometheus() -> Response:
+        cache = await server.cache_stats()
+        extra = {
+            f"cascade_ui_meta_cache_{key}": value for key, value in cache.model_dump().items()
+        }
+        return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route("/v1/metrics", prometheus, methods=["get"])
+
+
+def create_app(
+    server: AsyncServer,
+    instrument: bool = False,
+    profile_slowest: int = 0,
+    profile_dir: str = DEFAULT_PROFILE_DIR,
+) -> FastAPI:
+    """
+    Creates the app with the routes of the server and the frontend if it is built
+
+    With ``instrument`` every response gets the Server-Timing header with the time
+    spent in phases of the request and /v1/metrics serves the totals in Prometheus
+    format. With ``profile_slowest`` cProfile dumps of that many slowest requests
+    are kept in ``profile_dir``
+    """
     package_dir = os.path.dirname(os.path.abspath(__file__))
 
     app = FastAPI(title="CascadeUI Backend", version=__version__)
@@ -47,18 +136,54 @@ def run(path: str, host: str, port: int):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "X-Total-Count"],
+    )
+    # Level 5 is several times faster than the default 9 for a slightly larger body
+    app.add_middleware(
+        StreamingGZipMiddleware,
+        minimum_size=_env_int("CASCADE_UI_GZIP_MIN_SIZE", GZIP_MIN_SIZE),
+        compresslevel=5,
     )
 
-    app.add_api_route("/v1/workspace", server.workspace, methods=["post"])
+    if instrument or profile_slowest > 0:
+        profiles = SlowestProfiles(profile_dir, profile_slowest) if profile_slowest > 0 else None
+        _add_instrumentation(app, server, profiles)
+
+    app.add_api_route("/v1/workspace", server.workspace, methods=["get", "post"])
     app.add_api_route("/v1/repo", server.repo, methods=["post"])
+    app.add_api_route("/v1/repo", server.repo_get, methods=["get"])
     app.add_api_route("/v1/line", server.line, methods=["post"])
+    app.add_api_route("/v1/line", server.line_get, methods=["get"])
     app.add_api_route("/v1/model", server.model, methods=["post"])
+    app.add_api_route("/v1/model", server.model_get, methods=["get"])
+    app.add_api_route("/v1/models_batch", server.models_batch, methods=["post"])
+    app.add_api_route("/v1/model_files", server.model_files, methods=["post"])
     app.add_api_route("/v1/run_log", server.run_log, methods=["post"])
+    app.add_api_route("/v1/run_log", server.run_log_get, methods=["get"])
+    app.add_api_route("/v1/run_log/follow", server.run_log_follow, methods=["get"])
     app.add_api_route("/v1/run_config", server.run_config, methods=["post"])
+    app.add_api_route("/v1/run_config", server.run_config_get, methods=["get"])
     app.add_api_route("/v1/dataset", server.dataset, methods=["post"])
+    app.add_api_route("/v1/dataset", server.dataset_get, methods=["get"])
     app.add_api_route("/v1/version", server.version, methods=["get"])
+    app.add_api_route("/v1/cache_stats", server.cache_stats, methods=["get"])
     app.add_api_route("/v1/line_item_table", server.line_item_table, methods=["post"])
+    app.add_api_route(
+        "/v1/line_item_table_stream", server.line_item_table_stream, methods=["post"]
+    )
+    app.add_api_route("/v1/line_series", server.line_series, methods=["post"])
+    app.add_api_route("/v1/line_aggregates", server.line_aggregates, methods=["post"])
+    app.add_api_route("/v1/query", server.query, methods=["post"])
+    app.add_api_route("/v1/export", server.export, methods=["post"])
+    app.add_api_route("/v1/search", server.search, methods=["post"])
+    app.add_api_route("/v1/search", server.search_get, methods=["get"])
     app.add_api_route("/v1/add_comment", server.add_comment, methods=["post"])
+    app.add_api_route("/v1/events", server.events, methods=["get"])
+
+    dist_dir = os.path.join(package_dir, "web", "dist")
+    if not os.path.isdir(dist_dir):
+        # The frontend is not built, e.g. when it is served by its dev server
+        return app
 
     app.mount(
         "/assets",
@@ -92,4 +217,146 @@ def run(path: str, host: str, port: int):
             return FileResponse(index_path)
         return Response(status_code=404)
 
-    uvicorn.run(app, host=host, port=port)
+    return app
+
+
+def build_app(
+    path: str,
+    io_workers: Optional[int] = None,
+    handler_workers: Optional[int] = None,
+    scan_limit: Optional[int] = None,
+    index_path: Optional[str] = None,
+    instrument: Optional[bool] = None,
+    profile_slowest: Optional[int] = None,
+    profile_dir: Optional[str] = None,
+    refresh_interval: Optional[float] = None,
+    meta_cache_mb: Optional[int] = None,
+) -> FastAPI:
+    """
+    Creates the server of the workspace and its app, options
+    that are None are taken from the environment or defaults
+
+    With the index and ``refresh_interval`` greater than zero one of
+    the processes sharing the index keeps it up to date in the background
+    """
+    logger = logging.getLogger(__file__)
+
+    cwd = os.path.abspath(path)
+    logger.info(f"Starting in {cwd}")
+
+    if io_workers is None:
+        io_workers = _env_int("CASCADE_UI_IO_WORKERS", DEFAULT_IO_WORKERS)
+
+    if handler_workers is None:
+        handler_workers = _env_int("CASCADE_UI_HANDLER_WORKERS", DEFAULT_HANDLER_WORKERS)
+    if scan_limit is None:
+        scan_limit = _env_int("CASCADE_UI_SCAN_LIMIT", DEFAULT_SCAN_LIMIT)
+
+    store = None
+    if index_path is not None:
+        store = IndexStore(index_path) if index_path else IndexStore.for_workspace(cwd)
+        logger.info(f"Using persistent index in {store.path}")
+
+    if meta_cache_mb is None:
+        meta_cache_mb = _env_int("CASCADE_UI_META_CACHE_MB", DEFAULT_META_CACHE_MB)
+
+    server = Server(
+        cwd, io_workers=io_workers, store=store, meta_cache=MetaCache(meta_cache_mb * 1024**2)
+    )
+
+    if refresh_interval is None:
+        refresh_interval = _env_int("CASCADE_UI_REFRESH_INTERVAL", 0)
+    if store is not None and refresh_interval > 0:
+        IndexRefresher(server, store.path, refresh_interval).start()
+
+    if instrument is None:
+        instrument = bool(_env_int("CASCADE_UI_INSTRUMENT", 0))
+    if profile_slowest is None:
+        profile_slowest = _env_int("CASCADE_UI_PROFILE_SLOWEST", 0)
+    if profile_dir is None:
+        profile_dir = os.environ.get("CASCADE_UI_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+
+    return create_app(
+        AsyncServer(server, handler_workers=handler_workers, scan_limit=scan_limit),
+        instrument=instrument,
+        profile_slowest=profile_slowest,
+        profile_dir=profile_dir,
+    )
+
+
+def app_factory() -> FastAPI:
+    """
+    Entry point for process managers, every worker process calls it
+    and configuration is read from the environment
+
+    CASCADE_UI_PATH=ws CASCADE_UI_INDEX=ws/.cascade_ui_index.sqlite \\
+        uvicorn --factory cascade_ui.app:app_factory --workers 4
+    """
+    logging.basicConfig(level="INFO")
+    return build_app(
+        os.environ.get("CASCADE_UI_PATH", "."),
+        index_path=os.environ.get("CASCADE_UI_INDEX"),
+    )
+
+
+def run(
+    path: str,
+    host: str,
+    port: int,
+    io_workers: Optional[int] = None,
+    handler_workers: Optional[int] = None,
+    scan_limit: Optional[int] = None,
+    index_path: Optional[str] = None,
+    instrument: Optional[bool] = None,
+    profile_slowest: Optional[int] = None,
+    profile_dir: Optional[str] = None,
+    workers: int = 1,
+    meta_cache_mb: Optional[int] = None,
+):
+    logging.basicConfig(level="INFO")
+
+    if workers <= 1:
+        app = build_app(
+            path,
+            io_workers=io_workers,
+            handler_workers=handler_workers,
+            scan_limit=scan_limit,
+            index_path=index_path,
+            instrument=instrument,
+            profile_slowest=profile_slowest,
+            profile_dir=profile_dir,
+            meta_cache_mb=meta_cache_mb,
+        )
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    # Worker processes are started from scratch and create
+    # their apps with the factory, so options go through the environment.
+    # They share the index which is always used then. Every worker still
+    # keeps in memory the indexes of the lines it served and its own meta cache,
+    # so the cache is split between them
+    cwd = os.path.abspath(path)
+    if not index_path:
+        index_path = IndexStore.for_workspace(cwd).path
+    os.environ["CASCADE_UI_PATH"] = cwd
+    os.environ["CASCADE_UI_INDEX"] = index_path
+    os.environ.setdefault("CASCADE_UI_REFRESH_INTERVAL", str(DEFAULT_REFRESH_INTERVAL))
+    os.environ.setdefault(
+        "CASCADE_UI_META_CACHE_MB", str(max(DEFAULT_META_CACHE_MB // workers, MIN_META_CACHE_MB))
+    )
+    options = {
+        "CASCADE_UI_IO_WORKERS": io_workers,
+        "CASCADE_UI_HANDLER_WORKERS": handler_workers,
+        "CASCADE_UI_SCAN_LIMIT": scan_limit,
+        "CASCADE_UI_INSTRUMENT": None if instrument is None else int(instrument),
+        "CASCADE_UI_PROFILE_SLOWEST": profile_slowest,
+        "CASCADE_UI_PROFILE_DIR": profile_dir,
+        "CASCADE_UI_META_CACHE_MB": meta_cache_mb,
+    }
+    for name, value in options.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+    uvicorn.run(
+        "cascade_ui.app:app_factory", factory=True, host=host, port=port, workers=workers
+    )
@@ -0,0 +1,225 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import glob
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from cascade.base import Meta, MetaHandler, MultipleMetaError, ZeroMetaError
+
+from .instrument import count, span
+from .models import CacheStats
+
+Stamp = Tuple[int, int]
+
+
+def file_stamp(path: str) -> Stamp:
+    """
+    Returns (mtime_ns, size) of the file which is used
+    to decide whether the cached content is still valid
+    """
+    count("fs_stat")
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+# Default bound of the parsed metas kept by a process
+DEFAULT_META_CACHE_MB = 256
+
+
+class MetaCache:
+    """
+    Process-wide cache of parsed meta files
+
+    Entries are keyed by the meta file path and are reused only
+    if the (mtime_ns, size) of the file did not change since it was parsed.
+    The cache is bounded by the total size of the cached files
+    and evicts least recently used entries first.
+
+    Returned metas are shared between callers and should be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_META_CACHE_MB * 1024**2) -> None:
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Stamp, Meta]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read(self, path: str) -> Meta:
+        meta, _ = self.read_stamped(path)
+        return meta
+
+    def read_stamped(self, path: str) -> Tuple[Meta, Stamp]:
+        """
+        Reads meta and returns it together with the stamp
+        of the file it was parsed from
+        """
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                count("cache_hit")
+                return entry[1], stamp
+            self.misses += 1
+        count("cache_miss")
+
+        with span("parse"):
+            meta = MetaHandler.read(path)
+        self.put(path, meta, stamp)
+        return meta, stamp
+
+    def find_meta(self, path: str, meta_template: str = "meta.*") -> str:
+        """
+        Finds the single meta file in the directory
+        raising the same errors as ``MetaHandler.read_dir``
+        """
+        count("fs_list")
+        with span("list"):
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            meta_paths = glob.glob(os.path.join(path, meta_template))
+        if len(meta_paths) == 0:
+            raise ZeroMetaError(f"There is no {meta_template} file in {path}")
+        elif len(meta_paths) > 1:
+            raise MultipleMetaError(f"There are {len(meta_paths)} in {path}")
+        return meta_paths[0]
+
+    def read_dir(self, path: str, meta_template: str = "meta.*") -> Meta:
+        """
+        Same as ``MetaHandler.read_dir``, but goes through the cache
+        """
+        return self.read(self.find_meta(path, meta_template))
+
+    def put(self, path: str, meta: Meta, stamp: Optional[Stamp] = None) -> None:
+        if stamp is None:
+            stamp = file_stamp(path)
+
+        size = stamp[1]
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= old[0][1]
+
+            if size > self._max_bytes:
+                return
+
+            self._entries[path] = (stamp, meta)
+            self._size += size
+
+            while self._size > self._max_bytes:
+                _, (old_stamp, _) = self._entries.popitem(last=False)
+                self._size -= old_stamp[1]
+                self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= old[0][1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                entries=len(self._entries),
+                size_bytes=self._size,
+                max_bytes=self._max_bytes,
+            )
+
+
+meta_cache = MetaCache()
+
+
+class Listing(NamedTuple):
+    dirs: List[str]
+    metas: List[str]
+
+
+class DirCache:
+    """
+    Cache of directory listings
+
+    A listing keeps sorted names of the subdirectories and of the meta files
+    and is reused while the mtime of the directory is the same, since
+    creating, removing or renaming an entry always changes it. This is
+    enough to count the items of a line or to find the meta of an object
+    without listing the folder again.
+
+    Returned listings are shared between callers and should be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 65536) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, Listing]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def listing(self, path: str) -> Listing:
+        count("fs_stat")
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        count("fs_list")
+        dirs = []
+        metas = []
+        with span("list"):
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif entry.name.startswith("meta."):
+                        metas.append(entry.name)
+        listing = Listing(sorted(dirs), sorted(metas))
+
+        with self._lock:
+            self._entries[path] = (mtime, listing)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return listing
+
+    def list_dirs(self, path: str) -> List[str]:
+        return self.listing(path).dirs
+
+    def find_meta(self, path: str) -> str:
+        """
+        Same as ``MetaCache.find_meta``, but the folder
+        is listed only when it changes
+        """
+        metas = self.listing(path).metas
+        if len(metas) == 0:
+            raise ZeroMetaError(f"There is no meta.* file in {path}")
+        elif len(metas) > 1:
+            raise MultipleMetaError(f"There are {len(metas)} in {path}")
+        return os.path.join(path, metas[0])
@@ -0,0 +1,147 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from getpass import getuser
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pendulum
+from cascade.base import MetaHandler
+
+from .cache import MetaCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def _folder_lock(root: str) -> Iterator[None]:
+    # Serializes writers from other processes e.g. other workers of the server.
+    # The folder is locked since the meta file itself is replaced
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(root, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def write_meta_atomic(meta_path: str, meta: Any) -> None:
+    """
+    Writes the meta to a temporary file next to it and renames it over
+    the meta, so readers see either the old or the new file
+    """
+    root, name = os.path.split(meta_path)
+    _, ext = os.path.splitext(name)
+    # Should not match meta.* to not be taken for the second meta
+    tmp_path = os.path.join(root, f".tmp-{uuid.uuid4().hex}{ext}")
+    try:
+        MetaHandler.write(tmp_path, meta)
+        os.replace(tmp_path, meta_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CommentWriter:
+    """
+    Adds comments to the metas of objects
+
+    Comments to the same object are written by one thread at a time. Comments
+    that arrive while a write is in progress are queued and written together
+    by the next write, so a burst of comments costs a few reads and writes
+    of the meta instead of one per comment. Every write replaces the meta
+    atomically and puts the new meta into the cache.
+    """
+
+    def __init__(self, meta_cache: MetaCache) -> None:
+        self._meta_cache = meta_cache
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[str, Future]]] = {}
+        self._writing = set()
+
+    def add(self, root: str, message: str) -> Dict[str, Any]:
+        """
+        Adds the comment to the object in the folder and returns it
+        when it is written
+        """
+        future: Future = Future()
+        with self._lock:
+            self._pending.setdefault(root, []).append((message, future))
+            leader = root not in self._writing
+            if leader:
+                self._writing.add(root)
+
+        if leader:
+            self._drain(root)
+        return future.result()
+
+    def _drain(self, root: str) -> None:
+        while True:
+            with self._lock:
+                batch = self._pending.pop(root, [])
+                if not batch:
+                    self._writing.discard(root)
+                    return
+            try:
+                comments = self._write(root, [message for message, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), comment in zip(batch, comments):
+                    future.set_result(comment)
+
+    def _write(self, root: str, messages: List[str]) -> List[Dict[str, Any]]:
+        with _folder_lock(root):
+            meta_path = self._meta_cache.find_meta(root)
+            # Read again bypassing the cache since cached metas are shared
+            meta = MetaHandler.read(meta_path)
+
+            comments = meta[0].get("comments") or []
+            # Sequential ids the same way as Traceable.comment
+            last_id = int(comments[-1]["id"]) if comments else 0
+            user = getuser()
+            host = socket.gethostname()
+            now = pendulum.now(tz="UTC")
+
+            new = [
+                {
+                    "id": str(last_id + i + 1),
+                    "user": user,
+                    "host": host,
+                    "timestamp": now.isoformat(),
+                    "message": message,
+                }
+                for i, message in enumerate(messages)
+            ]
+            meta[0]["comments"] = comments + new
+            meta[0]["updated_at"] = str(now)
+
+            write_meta_atomic(meta_path, meta)
+            self._meta_cache.put(meta_path, meta)
+        return new
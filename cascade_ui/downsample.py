@@ -0,0 +1,61 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from typing import List, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], n: int) -> List[int]:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling
+
+    The first and the last points are always kept, the rest are split into
+    ``n - 2`` buckets and from every bucket the point forming the largest
+    triangle with the previous kept point and the average of the next bucket
+    is taken. This keeps peaks and the shape of the series.
+    ``xs`` should be sorted in ascending order.
+    """
+    size = len(xs)
+    if n >= size:
+        return list(range(size))
+    if n < 3:
+        return [0, size - 1][:n] if n > 0 else []
+
+    every = (size - 2) / (n - 2)
+    kept = [0]
+    a = 0
+    for i in range(n - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, size)
+
+        count = next_end - end
+        avg_x = sum(xs[end:next_end]) / count
+        avg_y = sum(ys[end:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            # Doubled area, it is only compared
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        kept.append(best)
+        a = best
+
+    kept.append(size - 1)
+    return kept
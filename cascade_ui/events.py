@@ -0,0 +1,323 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import pydantic
+from cascade.base import Meta, MetaIOError
+
+from .cache import Stamp
+from .index import item_from_meta
+from .pool import IOPool
+from .watch import ChangeDetector
+
+# Events kept for the clients that reconnect with Last-Event-ID,
+# the clients that are further behind get a reset event
+EVENT_LOG_SIZE = 4096
+
+# Seconds the items of a line are still followed after its last
+# subscriber is gone, so the clients that reconnect miss nothing
+SUBSCRIPTION_GRACE = 60.0
+
+# (repo, line, item), None for the levels above the object
+Key = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class EventLog:
+    """
+    Numbered events of the feed
+
+    Event ids include the id of the server instance, so the clients
+    that reconnect after a restart are told to reset their state
+    """
+
+    def __init__(self, instance: str, size: int = EVENT_LOG_SIZE) -> None:
+        self._instance = instance
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self) -> str:
+        with self._lock:
+            return f"{self._instance}:{self._seq}"
+
+    def append(self, type: str, key: Key, **fields: Any) -> None:
+        repo, line, item = key
+        with self._lock:
+            self._seq += 1
+            self._events.append(
+                {
+                    "id": f"{self._instance}:{self._seq}",
+                    "type": type,
+                    "repo": repo,
+                    "line": line,
+                    "item": item,
+                    **fields,
+                }
+            )
+
+    def since(self, last_id: str) -> List[Dict[str, Any]]:
+        """
+        Events after the given id or a single reset event
+        if some events after it are not known
+        """
+        instance, _, seq = last_id.partition(":")
+        seq = int(seq) if seq.isdigit() else -1
+        with self._lock:
+            missed = self._seq - seq
+            if instance != self._instance or seq < 0 or not 0 <= missed <= len(self._events):
+                reset_id = f"{self._instance}:{self._seq}"
+                return [{"id": reset_id, "type": "reset", "repo": None, "line": None, "item": None}]
+            return list(self._events)[len(self._events) - missed :]
+
+
+def _list_dirs(root: str) -> Set[str]:
+    with os.scandir(root) as it:
+        return {entry.name for entry in it if entry.is_dir()}
+
+
+def _comments(meta: Any) -> List[Dict[str, Any]]:
+    return meta[0].get("comments") or []
+
+
+class ChangeFeed:
+    """
+    Turns changes in the workspace tree into events of the log
+
+    Repos and lines are found by their listings, items by a change
+    detector over the line folders. Items are followed only in the lines
+    with subscribers, since only the views of the lines show them.
+    Metas are read only when their stamps change and only the number
+    of comments is kept for every object to tell new comments from other
+    updates. The first scan of the workspace or of a line only records
+    the state and makes no events.
+    """
+
+    def __init__(
+        self,
+        log: EventLog,
+        detector: ChangeDetector,
+        pool: IOPool,
+        ws_root: str,
+        list_repos: Callable[[], List[str]],
+        list_lines: Callable[[str], List[str]],
+        meta_stamp: Callable[[str], Optional[Stamp]],
+        read_meta: Callable[[str], Any],
+        interval: float = 0.5,
+        grace: float = SUBSCRIPTION_GRACE,
+    ) -> None:
+        self._log = log
+        self._detector = detector
+        self._pool = pool
+        self._ws_root = ws_root
+        self._list_repos = list_repos
+        self._list_lines = list_lines
+        self._meta_stamp = meta_stamp
+        self._read_meta = read_meta
+        self._interval = interval
+        self._grace = grace
+
+        self._subscribers: Dict[Tuple[str, str], int] = {}
+        self._released: Dict[Tuple[str, str], float] = {}
+        self._subscribers_lock = threading.Lock()
+
+        self._scanned_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._lines: Dict[str, Set[str]] = {}
+        self._items: Dict[Tuple[str, str], Set[str]] = {}
+        self._stamps: Dict[Key, Optional[Stamp]] = {}
+        self._comment_counts: Dict[Key, int] = {}
+
+    def subscribe(self, repo: str, line: str) -> None:
+        """
+        Starts following the items of the line from the next scan
+        """
+        with self._subscribers_lock:
+            self._subscribers[(repo, line)] = self._subscribers.get((repo, line), 0) + 1
+            self._released.pop((repo, line), None)
+
+    def unsubscribe(self, repo: str, line: str) -> None:
+        with self._subscribers_lock:
+            count = self._subscribers.get((repo, line), 0) - 1
+            if count > 0:
+                self._subscribers[(repo, line)] = count
+            else:
+                self._subscribers.pop((repo, line), None)
+                self._released[(repo, line)] = time.monotonic()
+
+    def _followed(self) -> Set[Tuple[str, str]]:
+        now = time.monotonic()
+        with self._subscribers_lock:
+            for key, released_at in list(self._released.items()):
+                if now - released_at > self._grace:
+                    del self._released[key]
+            return set(self._subscribers) | set(self._released)
+
+    def _root(self, key: Key) -> str:
+        return os.path.join(self._ws_root, *[part for part in key if part is not None])
+
+    @staticmethod
+    def _row(key: Key, meta: Optional[Meta]) -> Dict[str, Any]:
+        if key[2] is None or meta is None:
+            return {}
+        try:
+            return {"row": item_from_meta(key[2], meta)}
+        except (KeyError, IndexError, pydantic.ValidationError):
+            return {}
+
+    def _meta_changed(self, key: Key, emit: bool) -> Optional[Meta]:
+        try:
+            meta = self._read_meta(self._root(key))
+        except (MetaIOError, FileNotFoundError):
+            return None
+        comments = _comments(meta)
+        old = self._comment_counts.get(key, 0)
+        self._comment_counts[key] = len(comments)
+        if not emit:
+            return meta
+        if len(comments) > old:
+            self._log.append("comment_added", key, comments=comments[old:])
+        else:
+            self._log.append("meta_updated", key, **self._row(key, meta))
+        return meta
+
+    def _check_stamps(self, keys: List[Key], emit: bool) -> Dict[Key, Meta]:
+        metas = {}
+        stamps = self._pool.map(self._meta_stamp, [self._root(key) for key in keys])
+        for key, stamp in zip(keys, stamps):
+            if key in self._stamps and self._stamps[key] == stamp:
+                continue
+            known = key in self._stamps
+            self._stamps[key] = stamp
+            if stamp is not None:
+                meta = self._meta_changed(key, emit and known)
+                if meta is not None:
+                    metas[key] = meta
+        return metas
+
+    def _watch_line(self, repo: str, line: str) -> None:
+        root = self._root((repo, line, None))
+        self._detector.watch(root)
+        names = _list_dirs(root)
+        self._items[(repo, line)] = names
+        self._check_stamps([(repo, line, name) for name in sorted(names)], emit=False)
+
+    def _forget(self, repo: str, line: Optional[str] = None) -> None:
+        def under(key: Tuple[Optional[str], ...]) -> bool:
+            return key[0] == repo and (line is None or key[1] == line)
+
+        for state in (self._stamps, self._comment_counts):
+            for key in [key for key in state if under(key)]:
+                del state[key]
+        for key in [key for key in self._items if under(key)]:
+            self._detector.unwatch(self._root((*key, None)))
+            del self._items[key]
+
+    def _forget_items(self, repo: str, line: str) -> None:
+        for state in (self._stamps, self._comment_counts):
+            for key in [key for key in state if key[:2] == (repo, line) and key[2] is not None]:
+                del state[key]
+        self._detector.unwatch(self._root((repo, line, None)))
+        del self._items[(repo, line)]
+
+    def _poll_line(self, repo: str, line: str) -> None:
+        root = self._root((repo, line, None))
+        changes = self._detector.poll(root)
+        known = self._items[(repo, line)]
+        names = known
+        if changes.listing:
+            names = _list_dirs(root)
+            for name in sorted(known - names):
+                self._stamps.pop((repo, line, name), None)
+                self._comment_counts.pop((repo, line, name), None)
+                self._log.append("item_removed", (repo, line, name))
+            self._items[(repo, line)] = names
+
+        added = [(repo, line, name) for name in sorted(changes.items & (names - known))]
+        metas = self._check_stamps(added, emit=False)
+        for key in added:
+            self._log.append("item_added", key, **self._row(key, metas.get(key)))
+        # Other files in the item folders also change, then the stamp of the meta is the same
+        self._check_stamps(
+            [(repo, line, name) for name in sorted(changes.items & known & names)], emit=True
+        )
+
+    def scan(self) -> None:
+        """
+        Compares the workspace with the previous scan and
+        appends events, does nothing if called more often than
+        the interval or while another scan is running
+        """
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self._interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._scan(emit=self._scanned_at is not None)
+            self._scanned_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _scan(self, emit: bool) -> None:
+        repos = set(self._list_repos())
+        for repo in sorted(set(self._lines) - repos):
+            self._forget(repo)
+            del self._lines[repo]
+            self._log.append("repo_removed", (repo, None, None))
+
+        keys: List[Key] = [(None, None, None)]
+        for repo in sorted(repos):
+            if repo not in self._lines and emit:
+                self._log.append("repo_added", (repo, None, None))
+            try:
+                lines = set(self._list_lines(repo))
+            except (KeyError, FileNotFoundError):
+                # Removed while scanning, will be seen next time
+                continue
+            known = self._lines.get(repo, set())
+            for line in sorted(known - lines):
+                self._forget(repo, line)
+                self._log.append("line_removed", (repo, line, None))
+            if emit and repo in self._lines:
+                for line in sorted(lines - known):
+                    self._log.append("line_added", (repo, line, None))
+            self._lines[repo] = lines
+
+            keys.append((repo, None, None))
+            keys.extend((repo, line, None) for line in sorted(lines))
+
+        self._check_stamps(keys, emit)
+
+        followed = {key for key in self._followed() if key[1] in self._lines.get(key[0], ())}
+        for repo, line in sorted(set(self._items) - followed):
+            self._forget_items(repo, line)
+        for repo, line in sorted(followed - set(self._items)):
+            try:
+                self._watch_line(repo, line)
+            except FileNotFoundError:
+                continue
+
+        for repo, line in sorted(self._items):
+            try:
+                self._poll_line(repo, line)
+            except FileNotFoundError:
+                continue
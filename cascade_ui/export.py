@@ -0,0 +1,188 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+Batch = Dict[str, List[Any]]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columns that come before the item fields in every export
+ITEM_COLUMNS = ["repo", "line", "num", "name", "slug", "tags", "created_at", "saved_at"]
+
+ITEM_KINDS = {"num": "int"}
+
+# Values in one batch, lines often have thousands of sparse
+# fields, so the number of rows depends on the number of columns
+BATCH_CELLS = 1_000_000
+
+# Every row group of Parquet keeps metadata for each column,
+# so batches are joined into larger groups
+ROW_GROUP_CELLS = 4_000_000
+
+
+def batch_rows(n_columns: int) -> int:
+    return max(1, BATCH_CELLS // max(1, n_columns))
+
+
+def _cell(value: Any) -> Any:
+    # Nested values are kept as JSON
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def value_kind(values: Iterable[Any]) -> Optional[str]:
+    """
+    Arrow kind of the column: bool, int, float or string,
+    None if there are no values
+    """
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int):
+            kinds.add("int")
+        elif isinstance(value, float):
+            kinds.add("float")
+        else:
+            return "string"
+        if len(kinds) > 1 and not kinds <= {"int", "float"}:
+            return "string"
+    if kinds == {"int", "float"}:
+        return "float"
+    return kinds.pop() if kinds else None
+
+
+def merge_kinds(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+def write_csv(columns: List[str], batches: Iterable[Batch]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(zip(*[map(_cell, batch[column]) for column in columns]))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Chunks(io.RawIOBase):
+    """
+    Collects the bytes written by Arrow writers to be sent
+    in parts, the position is kept since Parquet needs it
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(kind: Optional[str]) -> Any:
+    return {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64()}.get(kind, pa.string())
+
+
+def _arrow_values(values: List[Any], kind: Optional[str]) -> List[Any]:
+    if kind == "float":
+        return [None if value is None else float(value) for value in values]
+    if kind in ("bool", "int"):
+        return values
+    return [None if value is None else str(_cell(value)) for value in values]
+
+
+def write_arrow(
+    columns: List[str], kinds: Dict[str, Optional[str]], batches: Iterable[Batch], format: str
+) -> Iterator[bytes]:
+    """
+    Arrow IPC file or Parquet with a record batch or a row group per batch,
+    requires ``pyarrow``
+    """
+    # Checked here and not when the body is being sent
+    if pa is None:
+        raise ImportError("pyarrow is required for Arrow and Parquet exports")
+    return _write_arrow(columns, kinds, batches, format)
+
+
+def _write_arrow(
+    columns: List[str], kinds: Dict[str, Optional[str]], batches: Iterable[Batch], format: str
+) -> Iterator[bytes]:
+    schema = pa.schema([(column, _arrow_type(kinds.get(column))) for column in columns])
+    sink = _Chunks()
+    if format == "arrow":
+        writer = pa.ipc.new_file(sink, schema)
+        group_rows = 0
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+        group_rows = ROW_GROUP_CELLS // len(columns)
+
+    group: List[Any] = []
+    try:
+        for batch in batches:
+            arrays = [
+                pa.array(_arrow_values(batch[column], kinds.get(column)), type=field.type)
+                for column, field in zip(columns, schema)
+            ]
+            group.append(pa.record_batch(arrays, schema=schema))
+            if sum(b.num_rows for b in group) >= group_rows:
+                writer.write_table(pa.Table.from_batches(group, schema=schema))
+                group = []
+                yield sink.take()
+        if group:
+            writer.write_table(pa.Table.from_batches(group, schema=schema))
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,92 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .instrument import count, span
+from .pool import IOPool
+
+FILE_KEYS = ("artifacts", "files")
+
+# mtime_ns and size of the meta, then mtime_ns of every folder in FILE_KEYS
+FilesStamp = Tuple[int, ...]
+
+
+def size_string(size_bytes: int) -> str:
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024**2:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024**3:
+        return f"{size_bytes / 1024**2:.1f} MB"
+    else:
+        return f"{size_bytes / 1024**3:.1f} GB"
+
+
+def list_files(item_root: str) -> Dict[str, List[str]]:
+    """
+    Paths of the artifacts and files of the item in the same
+    form as ``ModelLine.load_artifact_paths``, but without any stats:
+    one directory read per key
+    """
+    result = {}
+    with span("list"):
+        for key in FILE_KEYS:
+            try:
+                with os.scandir(os.path.join(item_root, key)) as entries:
+                    result[key] = sorted(entry.path for entry in entries)
+            except (FileNotFoundError, NotADirectoryError):
+                result[key] = []
+            count("fs_list")
+    return result
+
+
+def files_stamp(item_root: str, meta_stamp: Tuple[int, int]) -> FilesStamp:
+    """
+    Stamp of the listing of artifacts and files of the item. Adding or
+    removing a file changes the mtime of its folder, but not the meta
+    """
+    mtimes = []
+    for key in FILE_KEYS:
+        count("fs_stat")
+        try:
+            mtimes.append(os.stat(os.path.join(item_root, key)).st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            mtimes.append(0)
+    return (*meta_stamp, *mtimes)
+
+
+def _size(path: str) -> Optional[int]:
+    count("fs_stat")
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        # Broken links and files removed after the listing
+        return None
+
+
+def scan_sizes(
+    paths: List[Tuple[str, str]], pool: IOPool
+) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Sizes of (key, path) pairs as (key, path, size) where size
+    is None for the paths that do not exist. Stats run concurrently
+    since they are dominated by latency on network filesystems
+    """
+    with span("stat"):
+        sizes = pool.map(_size, [path for _, path in paths])
+    return [(key, path, size) for (key, path), size in zip(paths, sizes)]
@@ -0,0 +1,93 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Subtrees of the meta that are not shown in tables and not searched
+PRUNED_KEYS = frozenset(("git_uncommitted_changes", "links"))
+
+# Root keys whose values are kept as they are, metrics are turned into fields later
+RAW_KEYS = frozenset(("tags", "metrics"))
+
+# Paths of different structures kept before the memo is cleared,
+# lines usually have a few structures repeated in every item
+MAX_SCHEMAS = 4096
+
+
+class Flattener:
+    """
+    Flattens metas of items into dicts with dotted keys
+
+    Gives the same keys and values as ``flatten_dict`` with the dot
+    separator for the fields that are used, but does not walk into
+    the subtrees of ``PRUNED_KEYS`` and keeps only messages of comments.
+    Keys of the dicts and lengths of the lists are looked up in the memo
+    of the paths built for the previous items, so the items of a line
+    that share the structure do not join the paths again.
+    """
+
+    def __init__(self) -> None:
+        self._schemas: Dict[Tuple[str, Hashable], List[Tuple[str, str]]] = {}
+
+    def _paths(self, prefix: str, keys: Iterable[Any], shape: Hashable) -> List[Tuple[str, str]]:
+        # Every path is kept with the prefix for its children
+        schema_key = (prefix, shape)
+        paths = self._schemas.get(schema_key)
+        if paths is None:
+            if len(self._schemas) >= MAX_SCHEMAS:
+                self._schemas = {}
+            paths = [(f"{prefix}{key}", f"{prefix}{key}.") for key in keys]
+            self._schemas[schema_key] = paths
+        return paths
+
+    def _flatten(self, data: Any, prefix: str, out: Dict[str, Any]) -> None:
+        if isinstance(data, dict):
+            keys = tuple(data)
+            paths = self._paths(prefix, keys, keys)
+            values = data.values()
+        else:
+            paths = self._paths(prefix, range(len(data)), len(data))
+            values = data
+
+        for (path, child_prefix), value in zip(paths, values):
+            if isinstance(value, (dict, list, tuple, set)):
+                self._flatten(value, child_prefix, out)
+            else:
+                out[path] = value
+
+    def flatten(
+        self, meta: Dict[str, Any], roots: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Flattens the meta of an item, only the subtrees
+        of the root keys given if they are given
+        """
+        wanted = None if roots is None else set(roots)
+        flat: Dict[str, Any] = {}
+        for key, value in meta.items():
+            if key in PRUNED_KEYS or (wanted is not None and key not in wanted):
+                continue
+            if key in RAW_KEYS:
+                flat[key] = value
+            elif key == "comments":
+                for i, comment in enumerate(value or []):
+                    if isinstance(comment, dict) and "message" in comment:
+                        flat[f"comments.{i}.message"] = comment["message"]
+            elif isinstance(value, (dict, list, tuple, set)):
+                self._flatten(value, f"{key}.", flat)
+            else:
+                flat[key] = value
+        return flat
@@ -0,0 +1,918 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bisect
+import math
+import os
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from cascade.base import Meta, ZeroMetaError
+
+from .cache import MetaCache, Stamp, file_stamp
+from .downsample import lttb
+from .flatten import Flattener
+from .instrument import span
+from .models import FieldAggregate, Item, LineQuery
+from .pool import IOPool
+from .search import TextIndex, is_search_key, search_texts
+from .store import IndexStore, StoredItem
+
+# Marks the absence of the key in item's meta
+# to distinguish it from explicit None
+MISSING = object()
+
+
+# For the metas that are not in lines e.g. of repos
+_flattener = Flattener()
+
+
+def prepare_item_dict(
+    meta: Meta, flattener: Optional[Flattener] = None, fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    with span("flatten"):
+        return _prepare_item_dict(meta, flattener or _flattener, fields)
+
+
+def _prepare_item_dict(
+    meta: Meta, flattener: Flattener, fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Flattened meta of the item with metrics by their keys, only
+    the fields given if they are given. Subtrees that are not shown
+    or searched e.g. git_uncommitted_changes are skipped
+    """
+    roots = None if fields is None else {field.split(".", 1)[0] for field in fields}
+    flat = flattener.flatten(meta[0], roots)
+
+    metrics = flat.pop("metrics", None) or []
+    for metric in metrics:
+        flat[metric_key(metric)] = metric["value"]
+
+    if fields is not None:
+        return {key: flat[key] for key in fields if key in flat}
+    return flat
+
+
+def metric_key(metric: Dict[str, Any]) -> str:
+    """
+    Key of the metric in the flattened meta
+    """
+    name = metric["name"]
+    for key in ["dataset", "split"]:
+        part = metric.get(key)
+        name += "_" + part if part else ""
+    return f"metrics.{name}"
+
+
+def metric_directions(meta: Meta) -> Dict[str, str]:
+    """
+    Directions of the metrics of the item by their keys
+    in the flattened meta for the metrics that have them
+    """
+    return {
+        metric_key(metric): metric["direction"]
+        for metric in meta[0].get("metrics") or []
+        if metric.get("direction") in ("up", "down")
+    }
+
+
+def is_item_field(key: str) -> bool:
+    if key.startswith(("comments", "git_uncommitted_changes", "links")):
+        return False
+    if key in ("name", "slug", "tags", "saved_at", "created_at"):
+        return False
+    return True
+
+
+def is_plot_field(key: str) -> bool:
+    return key.startswith(("metrics", "params"))
+
+
+def item_nums(names: List[str], numbered: bool) -> List[int]:
+    """
+    Numbers of the items by which they are requested from the line
+
+    Items of numbered lines like ModelLine are found by their folder
+    name, so it stays the number after earlier items are removed.
+    Other lines find items by the position in their listing
+    """
+    return [
+        int(name) if numbered and name.isdigit() else position
+        for position, name in enumerate(names)
+    ]
+
+
+def to_float(value: Any) -> Optional[float]:
+    """
+    Returns the value as float if it can be plotted
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    return value
+
+
+class NumericColumn:
+    """
+    Values of a plot field stored in a typed array
+    with validity mask for the rows where the value is not a finite number
+    """
+
+    def __init__(self, n_rows: int) -> None:
+        self.values = array("d", [math.nan]) * n_rows
+        self.valid = bytearray(n_rows)
+
+    def extend(self, n_rows: int) -> None:
+        self.values.extend(array("d", [math.nan]) * n_rows)
+        self.valid.extend(bytearray(n_rows))
+
+    def permute(self, order: List[Optional[int]]) -> None:
+        values = array("d", [math.nan]) * len(order)
+        valid = bytearray(len(order))
+        for new, old in enumerate(order):
+            if old is not None:
+                values[new] = self.values[old]
+                valid[new] = self.valid[old]
+        self.values = values
+        self.valid = valid
+
+    def clear(self, row: int) -> None:
+        self.values[row] = math.nan
+        self.valid[row] = 0
+
+    def set(self, row: int, value: Any) -> None:
+        value = to_float(value)
+        if value is None:
+            self.clear(row)
+        else:
+            self.values[row] = value
+            self.valid[row] = 1
+
+
+def item_from_meta(name: str, meta: Meta) -> Item:
+    """
+    Summary of the item shown in the tables of its line
+    """
+    with span("validate"):
+        return Item(
+            name=name,
+            slug=meta[0].get("slug"),
+            tags=meta[0].get("tags"),
+            created_at=meta[0].get("created_at"),
+            saved_at=meta[0]["saved_at"],
+        )
+
+
+def _sort_key(value: Any) -> Optional[Tuple[int, float, str]]:
+    """
+    Key of the value when sorting rows by a field, None if the row has no value
+    """
+    if value is MISSING or value is None:
+        return None
+    number = to_float(value)
+    # Numbers go before other values so that
+    # mixed columns could still be compared
+    return (0, number, "") if number is not None else (1, 0.0, str(value))
+
+
+class _SortedRows:
+    """
+    Rows sorted by their keys with ties broken by the row. On sync it is
+    updated with the changed rows instead of being sorted again
+    """
+
+    def __init__(self, entries: List[Tuple[Any, int]]) -> None:
+        self._entries = sorted(entries)
+        self._rows: Optional[List[int]] = None
+
+    def rows(self) -> List[int]:
+        if self._rows is None:
+            self._rows = [row for _, row in self._entries]
+        return self._rows
+
+    def update(
+        self,
+        new_rows: Optional[List[Optional[int]]],
+        in_order: bool,
+        entries: List[Tuple[Any, int]],
+    ) -> None:
+        """
+        Moves the rows to their new positions dropping the ones mapped to None
+        and inserts the entries of the changed rows. If the rows kept do not
+        stay in the same order, ties between them are sorted again
+        """
+        if new_rows is not None:
+            self._entries = [
+                (key, new_rows[row]) for key, row in self._entries if new_rows[row] is not None
+            ]
+            if not in_order:
+                self._entries.sort()
+        for entry in entries:
+            bisect.insort(self._entries, entry)
+        self._rows = None
+
+
+class _Row:
+    def __init__(
+        self,
+        name: str,
+        meta_path: str,
+        stamp: Stamp,
+        item: Item,
+        flat: Dict[str, Any],
+        directions: Dict[str, str],
+    ) -> None:
+        self.name = name
+        self.meta_path = meta_path
+        self.stamp = stamp
+        self.item = item
+        self.flat = flat
+        self.directions = directions
+
+    @classmethod
+    def from_meta(
+        cls, name: str, meta_path: str, stamp: Stamp, meta: Meta, flattener: Flattener
+    ) -> "_Row":
+        return cls(
+            name,
+            meta_path,
+            stamp,
+            item_from_meta(name, meta),
+            prepare_item_dict(meta, flattener),
+            metric_directions(meta),
+        )
+
+    @classmethod
+    def from_stored(cls, name: str, stored: StoredItem) -> "_Row":
+        return cls(
+            name,
+            stored.meta_path,
+            stored.stamp,
+            Item(**stored.item),
+            stored.flat,
+            stored.directions,
+        )
+
+    def to_stored(self) -> StoredItem:
+        return StoredItem(
+            self.meta_path, self.stamp, self.item.model_dump(), self.flat, self.directions
+        )
+
+
+class LineIndex:
+    """
+    Flattened metadata of every item in a line stored by columns
+
+    Each item's meta is flattened once and its values are put
+    into one column per field, rows follow the order of items in the line.
+    On ``sync`` only the items whose meta file changed are flattened again.
+
+    If the persistent store is given, rows flattened by the previous runs
+    are taken from it while their meta files are not changed.
+
+    ``numbered`` tells that items are numbered by their folder names, see ``item_nums``.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        meta_cache: MetaCache,
+        pool: Optional[IOPool] = None,
+        store: Optional[IndexStore] = None,
+        numbered: bool = False,
+    ) -> None:
+        self._root = root
+        self._numbered = numbered
+        self._meta_cache = meta_cache
+        self._pool = pool if pool is not None else IOPool(workers=1)
+        self._store = store
+        # Rows of the line are read from the store at once on the first sync,
+        # later the rows are looked up one by one since other processes
+        # sharing the store could have written them
+        self._stored: Optional[Dict[str, StoredItem]] = None
+        self._store_loaded = False
+        self._saved: Dict[str, Stamp] = {}
+        self._lock = threading.RLock()
+        # Items of a line mostly share the structure of their metas
+        self._flattener = Flattener()
+
+        self._names: List[str] = []
+        self._nums: List[int] = []
+        self._meta_paths: List[str] = []
+        self._stamps: List[Stamp] = []
+        self._items: List[Item] = []
+        self._directions: List[Dict[str, str]] = []
+        self._columns: Dict[str, List[Any]] = {}
+        self._numeric: Dict[str, NumericColumn] = {}
+        self._fields: Optional[List[str]] = None
+        self._orders: Dict[str, Tuple[_SortedRows, _SortedRows]] = {}
+        self._numeric_orders: Dict[str, _SortedRows] = {}
+        self._aggregates: Dict[str, FieldAggregate] = {}
+        # Built on the first search and updated with the rows afterwards
+        self._text: Optional[TextIndex] = None
+        self._rows_by_name: Optional[Dict[str, int]] = None
+
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _load_stored(self, name: str) -> Optional[_Row]:
+        if self._store is None:
+            return None
+        if self._stored is not None:
+            stored = self._stored.get(name)
+        else:
+            stored = self._store.load_item(self._root, name)
+        if stored is None:
+            return None
+        try:
+            if file_stamp(stored.meta_path) != stored.stamp:
+                return None
+        except FileNotFoundError:
+            return None
+        return _Row.from_stored(name, stored)
+
+    def _load_row(self, name: str) -> Optional[_Row]:
+        row = self._load_stored(name)
+        if row is not None:
+            return row
+
+        try:
+            meta_path = self._meta_cache.find_meta(os.path.join(self._root, name))
+        except ZeroMetaError:
+            return None
+        meta, stamp = self._meta_cache.read_stamped(meta_path)
+        return _Row.from_meta(name, meta_path, stamp, meta, self._flattener)
+
+    def _is_fresh(self, row: int) -> bool:
+        try:
+            return file_stamp(self._meta_paths[row]) == self._stamps[row]
+        except FileNotFoundError:
+            return False
+
+    def sync(self, names: List[str], changed: Optional[Set[str]] = None) -> bool:
+        """
+        Brings the index up to date with the list of item folders of the line
+
+        Parameters
+        ----------
+        names : List[str]
+            Item folder names in the order of the line
+        changed : Optional[Set[str]]
+            Names of the items known to be added or modified. If given, other
+            items are considered unchanged and their meta files are not checked,
+            by default every item is checked
+
+        Returns
+        -------
+        bool
+            Whether anything changed in the index
+        """
+        with self._lock:
+            if self._store is not None and not self._store_loaded:
+                self._stored = self._store.load_items(self._root)
+                self._saved = {name: stored.stamp for name, stored in self._stored.items()}
+                self._store_loaded = True
+
+            old_rows = {name: row for row, name in enumerate(self._names)}
+            candidates = [
+                (num, name, old_rows.get(name))
+                for num, name in zip(item_nums(names, self._numbered), names)
+            ]
+
+            to_check = [
+                row
+                for _, name, row in candidates
+                if row is not None and (changed is None or name in changed)
+            ]
+            fresh = {
+                row for row, ok in zip(to_check, self._pool.map(self._is_fresh, to_check)) if ok
+            }
+
+            def keep(name: str, row: Optional[int]) -> bool:
+                if row is None:
+                    return False
+                return (changed is not None and name not in changed) or row in fresh
+
+            to_load = [name for _, name, row in candidates if not keep(name, row)]
+            loaded: Dict[str, _Row] = {
+                name: new_row
+                for name, new_row in zip(to_load, self._pool.map(self._load_row, to_load))
+                if new_row is not None
+            }
+            order: List[Tuple[int, str, Optional[int]]] = [
+                (num, name, row)
+                for num, name, row in candidates
+                if keep(name, row) or name in loaded
+            ]
+
+            old_order = [row for _, _, row in order]
+            nums = [num for num, _, _ in order]
+            if not loaded and old_order == list(range(len(self._names))) and nums == self._nums:
+                return False
+
+            self._reorder(order)
+            for row, (_, name, _) in enumerate(order):
+                if name in loaded:
+                    self._set_row(row, loaded[name])
+            self._save(loaded)
+            if self._text is not None:
+                for name in set(old_rows) - set(self._names):
+                    self._text.remove(name)
+
+            self._update_orders(order, loaded, len(old_rows))
+            self._fields = None
+            self._aggregates = {}
+            self._rows_by_name = None
+            self.version += 1
+            return True
+
+    def _update_orders(
+        self, order: List[Tuple[int, str, Optional[int]]], loaded: Dict[str, _Row], n_old: int
+    ) -> None:
+        # Sorting again is cheaper when many of the rows changed
+        if 4 * len(loaded) > len(order):
+            self._orders = {}
+            self._numeric_orders = {}
+            return
+
+        new_rows: List[Optional[int]] = [None] * n_old
+        changed = []
+        for new, (_, name, old) in enumerate(order):
+            if name in loaded:
+                changed.append(new)
+            elif old is not None:
+                new_rows[old] = new
+        kept = [row for row in new_rows if row is not None]
+        in_order = all(a < b for a, b in zip(kept, kept[1:]))
+        moved: Optional[List[Optional[int]]] = new_rows
+        if len(kept) == n_old and in_order and (not kept or kept[-1] == n_old - 1):
+            # Rows are only appended, so none of them moves
+            moved = None
+
+        for key, (present, absent) in self._orders.items():
+            column = self._column_or_missing(key)
+            present_entries = []
+            absent_entries = []
+            for row in changed:
+                sort_key = _sort_key(column[row])
+                if sort_key is None:
+                    absent_entries.append((0, row))
+                else:
+                    present_entries.append((sort_key, row))
+            present.update(moved, in_order, present_entries)
+            absent.update(moved, in_order, absent_entries)
+
+        for key, numeric_order in self._numeric_orders.items():
+            numeric = self._numeric.get(key)
+            entries = []
+            if numeric is not None:
+                entries = [(numeric.values[row], row) for row in changed if numeric.valid[row]]
+            numeric_order.update(moved, in_order, entries)
+
+    def _save(self, loaded: Dict[str, _Row]) -> None:
+        if self._store is None:
+            return
+
+        changed = {
+            name: row.to_stored()
+            for name, row in loaded.items()
+            if self._saved.get(name) != row.stamp
+        }
+        if changed or set(self._saved) != set(self._names):
+            self._store.save_items(self._root, changed, self._names)
+        self._stored = None
+        self._saved = dict(zip(self._names, self._stamps))
+
+    def _reorder(self, order: List[Tuple[int, str, Optional[int]]]) -> None:
+        old_order = [row for _, _, row in order]
+        n_old = len(self._names)
+        n_appended = len(order) - n_old
+        if n_appended >= 0 and old_order[:n_old] == list(range(n_old)):
+            # The most common case when new items are
+            # appended to the end of the line
+            for column in self._columns.values():
+                column.extend([MISSING] * n_appended)
+            for numeric in self._numeric.values():
+                numeric.extend(n_appended)
+            self._meta_paths.extend([""] * n_appended)
+            self._stamps.extend([(0, 0)] * n_appended)
+            self._items.extend([None] * n_appended)
+            self._directions.extend([{}] * n_appended)
+        else:
+
+            def permute(values: List[Any], default: Any) -> List[Any]:
+                return [values[row] if row is not None else default for row in old_order]
+
+            self._columns = {
+                key: permute(column, MISSING) for key, column in self._columns.items()
+            }
+            for numeric in self._numeric.values():
+                numeric.permute(old_order)
+            self._meta_paths = permute(self._meta_paths, "")
+            self._stamps = permute(self._stamps, (0, 0))
+            self._items = permute(self._items, None)
+            self._directions = permute(self._directions, {})
+
+        self._names = [name for _, name, _ in order]
+        self._nums = [num for num, _, _ in order]
+
+    def _set_row(self, row: int, new_row: _Row) -> None:
+        for column in self._columns.values():
+            column[row] = MISSING
+        for numeric in self._numeric.values():
+            numeric.clear(row)
+
+        for key, value in new_row.flat.items():
+            column = self._columns.get(key)
+            if column is None:
+                column = [MISSING] * len(self._names)
+                self._columns[key] = column
+            column[row] = value
+
+            if is_plot_field(key):
+                numeric = self._numeric.get(key)
+                if numeric is None:
+                    numeric = NumericColumn(len(self._names))
+                    self._numeric[key] = numeric
+                numeric.set(row, value)
+
+        self._meta_paths[row] = new_row.meta_path
+        self._stamps[row] = new_row.stamp
+        self._items[row] = new_row.item
+        self._directions[row] = new_row.directions
+        if self._text is not None:
+            self._text.add(new_row.name, search_texts(new_row.flat))
+
+    def items(self, rows: Optional[List[int]] = None) -> List[Item]:
+        with self._lock:
+            if rows is None:
+                return list(self._items)
+            return [self._items[row] for row in rows]
+
+    def item_fields(self) -> List[str]:
+        with self._lock:
+            if self._fields is None:
+                self._fields = sorted(
+                    key
+                    for key, column in self._columns.items()
+                    if is_item_field(key) and any(value is not MISSING for value in column)
+                )
+            return self._fields
+
+    def lookup(self, names: List[str]) -> List[Optional[Tuple[Item, Dict[str, Any]]]]:
+        """
+        Items with the folder names given and their plot fields,
+        None for the names that are not in the line
+        """
+        with self._lock:
+            if self._rows_by_name is None:
+                self._rows_by_name = {name: row for row, name in enumerate(self._names)}
+            plot_columns = [
+                (key, column) for key, column in self._columns.items() if is_plot_field(key)
+            ]
+            result = []
+            for name in names:
+                row = self._rows_by_name.get(name)
+                if row is None:
+                    result.append(None)
+                    continue
+                fields = {
+                    key: column[row] for key, column in plot_columns if column[row] is not MISSING
+                }
+                result.append((self._items[row], fields))
+            return result
+
+    def search(self, words: List[str]) -> List[Tuple[int, Item, int, List[str]]]:
+        """
+        Items with all the words in their slugs, tags, param names,
+        descriptions or comments as (num, item, score, matched fields)
+        """
+        with self._lock:
+            if self._text is None:
+                self._text = TextIndex()
+                search_columns = [
+                    (key, column) for key, column in self._columns.items() if is_search_key(key)
+                ]
+                for row, name in enumerate(self._names):
+                    flat = {
+                        key: column[row]
+                        for key, column in search_columns
+                        if column[row] is not MISSING
+                    }
+                    self._text.add(name, search_texts(flat))
+
+            if self._rows_by_name is None:
+                self._rows_by_name = {name: row for row, name in enumerate(self._names)}
+
+            result = []
+            for name, (score, fields) in self._text.search(words).items():
+                row = self._rows_by_name[name]
+                result.append((self._nums[row], self._items[row], score, fields))
+            return result
+
+    def column(self, key: str, rows: Optional[List[int]] = None) -> List[Any]:
+        """
+        Values of the field for every row or only for the rows given,
+        ``num`` is a special field of item numbers. Missing values are None
+        """
+        with self._lock:
+            if rows is None:
+                rows = range(len(self._names))
+            if key == "num":
+                return [self._nums[row] for row in rows]
+            column = self._columns.get(key)
+            if column is None:
+                return [None] * len(rows)
+            return [None if column[row] is MISSING else column[row] for row in rows]
+
+    def table(
+        self, item_fields: List[str], rows: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            if rows is None:
+                rows = list(range(len(self._names)))
+            columns = {key: self.column(key, rows) for key in item_fields}
+            return [
+                {key: column[i] for key, column in columns.items()} for i in range(len(rows))
+            ]
+
+    def _order(self, key: str) -> Tuple[List[int], List[int]]:
+        """
+        Rows with the value of the field sorted in ascending order
+        and the rows without the value. Kept up to date on sync
+        """
+        order = self._orders.get(key)
+        if order is None:
+            present = []
+            absent = []
+            for row, value in enumerate(self._column_or_missing(key)):
+                sort_key = _sort_key(value)
+                if sort_key is None:
+                    absent.append((0, row))
+                else:
+                    present.append((sort_key, row))
+            order = _SortedRows(present), _SortedRows(absent)
+            self._orders[key] = order
+        return order[0].rows(), order[1].rows()
+
+    def _numeric_order(self, key: str) -> List[int]:
+        """
+        Rows where the plot field is a finite number sorted by
+        the value in ascending order. Kept up to date on sync
+        """
+        order = self._numeric_orders.get(key)
+        if order is None:
+            numeric = self._numeric.get(key)
+            entries = []
+            if numeric is not None:
+                values = numeric.values
+                entries = [(values[row], row) for row, valid in enumerate(numeric.valid) if valid]
+            order = _SortedRows(entries)
+            self._numeric_orders[key] = order
+        return order.rows()
+
+    def _matches(self, query: LineQuery) -> Optional[bytearray]:
+        n_rows = len(self._names)
+        if (
+            query.tag is None
+            and query.slug_prefix is None
+            and not query.equals
+            and not query.ranges
+        ):
+            return None
+
+        mask = bytearray(b"\x01") * n_rows
+        if query.tag is not None:
+            tags = self._columns.get("tags", [MISSING] * n_rows)
+            for row, value in enumerate(tags):
+                if not isinstance(value, list) or query.tag not in value:
+                    mask[row] = 0
+
+        if query.slug_prefix is not None:
+            slugs = self._columns.get("slug", [MISSING] * n_rows)
+            for row, value in enumerate(slugs):
+                if not isinstance(value, str) or not value.startswith(query.slug_prefix):
+                    mask[row] = 0
+
+        for key, expected in query.equals.items():
+            for row, value in enumerate(self._column_or_missing(key)):
+                if value is MISSING or value != expected:
+                    mask[row] = 0
+
+        for field_range in query.ranges:
+            numeric = self._numeric.get(field_range.field)
+            if numeric is not None:
+                values = numeric.values
+                valid = numeric.valid
+            else:
+                values = [to_float(value) for value in self._column_or_missing(field_range.field)]
+                valid = [value is not None for value in values]
+
+            low, high = field_range.min, field_range.max
+            for row in range(n_rows):
+                if not mask[row]:
+                    continue
+                if not valid[row]:
+                    mask[row] = 0
+                elif (low is not None and values[row] < low) or (
+                    high is not None and values[row] > high
+                ):
+                    mask[row] = 0
+        return mask
+
+    def _column_or_missing(self, key: str) -> List[Any]:
+        if key == "num":
+            return list(self._nums)
+        return self._columns.get(key, [MISSING] * len(self._names))
+
+    def select(self, query: LineQuery) -> Tuple[List[int], int]:
+        """
+        Filters and sorts the rows, then takes the page requested
+
+        Returns
+        -------
+        Tuple[List[int], int]
+            Rows of the page and the total number of rows matching the filters
+        """
+        with self._lock:
+            if query.sort_by:
+                present, absent = self._order(query.sort_by)
+                # Rows without a value stay at the end in both directions
+                rows = (present[::-1] if query.descending else present) + absent
+            else:
+                rows = range(len(self._names))
+
+            mask = self._matches(query)
+            if mask is not None:
+                rows = [row for row in rows if mask[row]]
+
+            total = len(rows)
+            end = None if query.limit is None else query.offset + query.limit
+            return list(rows[query.offset : end]), total
+
+    def select_names(self, query: LineQuery) -> List[str]:
+        """
+        Names of the items of ``select``, they stay valid
+        when the rows move after the next sync
+        """
+        with self._lock:
+            rows, _ = self.select(query)
+            return [self._names[row] for row in rows]
+
+    def batch(
+        self, names: List[str], keys: List[str]
+    ) -> Tuple[List[int], List[Item], Dict[str, List[Any]]]:
+        """
+        Numbers, items and values of the fields of the items
+        with the names given, the items removed since are skipped
+        """
+        with self._lock:
+            if self._rows_by_name is None:
+                self._rows_by_name = {name: row for row, name in enumerate(self._names)}
+            rows = [self._rows_by_name[name] for name in names if name in self._rows_by_name]
+            nums = [self._nums[row] for row in rows]
+            items = [self._items[row] for row in rows]
+            return nums, items, {key: self.column(key, rows) for key in keys}
+
+    def top(
+        self,
+        key: str,
+        k: int,
+        descending: bool = True,
+        query: Optional[LineQuery] = None,
+        item_fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Tuple[float, int, Item, Dict[str, Any]]], int]:
+        """
+        Best rows by the value of the plot field among the rows
+        matching the filters of the query
+
+        Returns
+        -------
+        Tuple[List[Tuple[float, int, Item, Dict[str, Any]]], int]
+            Up to k tuples of the value, item number, item and requested fields
+            and the total number of matching rows with the value
+        """
+        with self._lock:
+            order = self._numeric_order(key)
+            if descending:
+                order = order[::-1]
+
+            mask = self._matches(query) if query is not None else None
+            if mask is not None:
+                order = [row for row in order if mask[row]]
+
+            rows = order[:k]
+            values = self._numeric[key].values if rows else []
+            table = self.table(item_fields or [], rows)
+            top = [
+                (values[row], self._nums[row], self._items[row], fields)
+                for row, fields in zip(rows, table)
+            ]
+            return top, len(order)
+
+    def _direction(self, key: str, rows: List[int]) -> Optional[str]:
+        # The latest item with the metric decides
+        # if the direction was changed at some point
+        for row in sorted(rows, reverse=True):
+            direction = self._directions[row].get(key)
+            if direction is not None:
+                return direction
+        return None
+
+    def aggregate(self, key: str) -> FieldAggregate:
+        """
+        Count, min, max and mean of the plot field over the rows where
+        it is a finite number and the best value if the field is a metric
+        with a direction. Cached until the index changes
+        """
+        with self._lock:
+            aggregate = self._aggregates.get(key)
+            if aggregate is not None:
+                return aggregate
+
+            order = self._numeric_order(key)
+            if not order:
+                aggregate = FieldAggregate(field=key, count=0)
+            else:
+                values = self._numeric[key].values
+                direction = self._direction(key, order)
+                best_row = None
+                if direction == "up":
+                    best_row = order[-1]
+                elif direction == "down":
+                    best_row = order[0]
+                aggregate = FieldAggregate(
+                    field=key,
+                    count=len(order),
+                    min=values[order[0]],
+                    max=values[order[-1]],
+                    mean=math.fsum(values[row] for row in order) / len(order),
+                    direction=direction,
+                    best=values[best_row] if best_row is not None else None,
+                    best_num=self._nums[best_row] if best_row is not None else None,
+                )
+            self._aggregates[key] = aggregate
+            return aggregate
+
+    def aggregates(self, keys: Optional[List[str]] = None) -> List[FieldAggregate]:
+        """
+        Aggregates of the plot fields given or of all of them
+        """
+        with self._lock:
+            if keys is None:
+                keys = sorted(self._numeric)
+            return [self.aggregate(key) for key in keys]
+
+    def series(
+        self, key: str, points: Optional[int] = None
+    ) -> Tuple[List[int], List[float], List[Optional[str]], int]:
+        """
+        Returns parallel lists of item numbers, values and slugs
+        for the rows where the plot field is a finite number
+        and the number of such rows.
+
+        If ``points`` is given, longer series are downsampled
+        to that many points keeping their shape
+        """
+        with self._lock:
+            numeric = self._numeric.get(key)
+            if numeric is None:
+                return [], [], [], 0
+
+            rows = [row for row, valid in enumerate(numeric.valid) if valid]
+            total = len(rows)
+            if points is not None and total > points:
+                nums = [self._nums[row] for row in rows]
+                values = [numeric.values[row] for row in rows]
+                rows = [rows[i] for i in lttb(nums, values, points)]
+
+            slugs = self._columns.get("slug")
+            nums = [self._nums[row] for row in rows]
+            values = [numeric.values[row] for row in rows]
+            if slugs is None:
+                return nums, values, [None] * len(rows), total
+            return (
+                nums,
+                values,
+                [None if slugs[row] is MISSING else slugs[row] for row in rows],
+                total,
+            )
@@ -0,0 +1,219 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bisect
+import cProfile
+import heapq
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the buckets of request durations in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    """
+    Time spent in every phase of one request and counts of operations
+
+    Phases running in the threads of the IO pool are summed up,
+    so together they can take longer than the request itself.
+    """
+
+    def __init__(self, route: str, profile: bool = False) -> None:
+        self.route = route
+        self.spans: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.profiles: Optional[List[cProfile.Profile]] = [] if profile else None
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, n: int) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        entries.extend(f'{name};desc="{n}"' for name, n in self.counts.items())
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+# Set only while an instrumented request is handled, so
+# when instrumentation is off spans and counts cost one lookup
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_span(name, time.perf_counter() - start)
+
+
+def count(name: str, n: int = 1) -> None:
+    stats = current_request.get()
+    if stats is not None:
+        stats.add_count(name, n)
+
+
+def profiled(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Calls the function under cProfile if the current request is profiled.
+    Only the calling thread is profiled, so reads fanned out to the IO pool are not seen
+    """
+    stats = current_request.get()
+    if stats is None or stats.profiles is None:
+        return fn(*args)
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is active e.g. in a concurrent request
+        return fn(*args)
+    try:
+        return fn(*args)
+    finally:
+        profile.disable()
+        stats.profiles.append(profile)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Aggregates of the requests since the start of the server
+    rendered in the Prometheus text format
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[int]] = {}
+        self._duration_sums: Dict[str, float] = {}
+        self._spans: Dict[Tuple[str, str], float] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stats: RequestStats, total: float) -> None:
+        with self._lock:
+            buckets = self._durations.setdefault(stats.route, [0] * (len(DURATION_BUCKETS) + 1))
+            buckets[bisect.bisect_left(DURATION_BUCKETS, total)] += 1
+            self._duration_sums[stats.route] = self._duration_sums.get(stats.route, 0.0) + total
+
+            for name, seconds in stats.spans.items():
+                key = (stats.route, name)
+                self._spans[key] = self._spans.get(key, 0.0) + seconds
+            for name, n in stats.counts.items():
+                key = (stats.route, name)
+                self._counts[key] = self._counts.get(key, 0) + n
+
+    def render(self, extra: Optional[Dict[str, float]] = None) -> str:
+        lines = [
+            "# HELP cascade_ui_request_duration_seconds Time to handle requests",
+            "# TYPE cascade_ui_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for route, buckets in sorted(self._durations.items()):
+                label = f'route="{_escape(route)}"'
+                total = 0
+                for bound, n in zip(DURATION_BUCKETS + (float("inf"),), buckets):
+                    total += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'cascade_ui_request_duration_seconds_bucket{{{label},le="{le}"}} {total}'
+                    )
+                lines.append(
+                    f"cascade_ui_request_duration_seconds_sum{{{label}}} "
+                    f"{self._duration_sums[route]}"
+                )
+                lines.append(f"cascade_ui_request_duration_seconds_count{{{label}}} {total}")
+
+            lines.append("# HELP cascade_ui_phase_seconds_total Time spent in phases of requests")
+            lines.append("# TYPE cascade_ui_phase_seconds_total counter")
+            for (route, name), seconds in sorted(self._spans.items()):
+                lines.append(
+                    f'cascade_ui_phase_seconds_total{{route="{_escape(route)}",'
+                    f'phase="{_escape(name)}"}} {seconds}'
+                )
+
+            lines.append("# HELP cascade_ui_operations_total Filesystem calls and cache lookups")
+            lines.append("# TYPE cascade_ui_operations_total counter")
+            for (route, name), n in sorted(self._counts.items()):
+                lines.append(
+                    f'cascade_ui_operations_total{{route="{_escape(route)}",'
+                    f'op="{_escape(name)}"}} {n}'
+                )
+
+        for name, value in (extra or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SlowestProfiles:
+    """
+    Keeps cProfile dumps of the slowest requests in the directory
+    removing the dumps that are not among the slowest anymore
+    """
+
+    def __init__(self, path: str, n: int) -> None:
+        self.path = path
+        self.n = n
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def offer(self, stats: RequestStats, total: float) -> None:
+        if not stats.profiles:
+            return
+
+        with self._lock:
+            if len(self._heap) >= self.n and total <= self._heap[0][0]:
+                return
+
+            route = stats.route.strip("/").replace("/", "_") or "root"
+            name = f"{total * 1000:.0f}ms_{route}_{time.time_ns()}.prof"
+            dump_path = os.path.join(self.path, name)
+
+            merged = pstats.Stats(stats.profiles[0])
+            for profile in stats.profiles[1:]:
+                merged.add(profile)
+            merged.dump_stats(dump_path)
+
+            if len(self._heap) >= self.n:
+                _, evicted = heapq.heapreplace(self._heap, (total, dump_path))
+                try:
+                    os.remove(evicted)
+                except FileNotFoundError:
+                    pass
+            else:
+                heapq.heappush(self._heap, (total, dump_path))
@@ -0,0 +1,96 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+from typing import Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def read_chunk(path: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read() if length is None else f.read(length)
+
+
+def read_range(path: str, offset: int = 0, length: Optional[int] = None) -> Tuple[str, int, int]:
+    """
+    Reads bytes of the file starting from the offset
+
+    Returns
+    -------
+    Tuple[str, int, int]
+        Text, the offset it starts at and the offset right after it
+    """
+    data = read_chunk(path, offset, length)
+    return _decode(data), offset, offset + len(data)
+
+
+def read_tail(path: str, n_lines: int) -> Tuple[str, int, int]:
+    """
+    Reads the last lines of the file seeking from the end
+    so that only the part of the file needed is read
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        start = end
+        data = b""
+        # One more newline is needed since the last line
+        # can end with a newline itself
+        while start > 0 and data.count(b"\n") <= n_lines:
+            step = min(CHUNK_SIZE, start)
+            start -= step
+            f.seek(start)
+            data = f.read(step) + data
+
+    lines = data.split(b"\n")
+    if data.endswith(b"\n"):
+        keep = lines[-(n_lines + 1) :]
+    else:
+        keep = lines[-n_lines:] if n_lines > 0 else [b""]
+    text = b"\n".join(keep)
+    return _decode(text), end - len(text), end
+
+
+def read_lines(path: str, first_line: int, n_lines: Optional[int] = None) -> Tuple[str, int, int]:
+    """
+    Reads lines of the file by their numbers starting from zero.
+    The file is read by chunks and only the lines requested are kept
+    """
+    start = None
+    line = 0
+    offset = 0
+    kept = []
+    with open(path, "rb") as f:
+        for raw in f:
+            if line == first_line:
+                start = offset
+            if line >= first_line:
+                if n_lines is not None and line >= first_line + n_lines:
+                    break
+                kept.append(raw)
+            offset += len(raw)
+            line += 1
+
+    if start is None:
+        start = offset
+    data = b"".join(kept)
+    return _decode(data), start, start + len(data)
@@ -51,6 +51,43 @@ class LinePathSpec(pydantic.BaseModel):
     line: str
 
 
+class FieldRange(pydantic.BaseModel):
+    field: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class LineQuery(pydantic.BaseModel):
+    offset: int = pydantic.Field(default=0, ge=0)
+    limit: Optional[int] = pydantic.Field(default=None, ge=0)
+    sort_by: Optional[str] = None
+    descending: bool = False
+    tag: Optional[str] = None
+    slug_prefix: Optional[str] = None
+    equals: Dict[str, Any] = {}
+    ranges: List[FieldRange] = []
+
+
+class LineRequest(LineQuery, LinePathSpec):
+    pass
+
+
+class ExportRequest(pydantic.BaseModel):
+    repo: Optional[str] = None
+    line: Optional[str] = None
+    query: LineQuery = LineQuery()
+    item_fields: Optional[List[str]] = None
+    format: Literal["csv", "arrow", "parquet"] = "csv"
+    batch_size: Optional[int] = pydantic.Field(default=None, gt=0)
+
+    @pydantic.model_validator(mode="after")
+    def _line_in_repo(self) -> "ExportRequest":
+        # Line names are only unique inside of a repo
+        if self.line is not None and self.repo is None:
+            raise ValueError("line is set without repo")
+        return self
+
+
 class Item(pydantic.BaseModel):
     name: str
     tags: List[str]
@@ -61,11 +98,107 @@ class Item(pydantic.BaseModel):
 
 class LineResponse(Traceable, Container):
     type: Literal["model_line", "data_line"]
+    total: int
     items: List[Item]
     item_fields: List[str]
     plot_fields: List[str]
 
 
+class LineSeriesResponse(pydantic.BaseModel):
+    field: str
+    nums: List[int]
+    values: List[float]
+    slugs: List[Optional[str]]
+    # Number of points before downsampling
+    total: int
+
+
+class FieldAggregate(pydantic.BaseModel):
+    field: str
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    direction: Optional[Literal["up", "down"]] = None
+    best: Optional[float] = None
+    best_num: Optional[int] = None
+
+
+class LineAggregatesResponse(pydantic.BaseModel):
+    fields: List[FieldAggregate]
+
+
+class LeaderboardQuery(pydantic.BaseModel):
+    metric: str
+    repo: Optional[str] = None
+    k: int = pydantic.Field(default=10, ge=1)
+    descending: bool = True
+    tag: Optional[str] = None
+    slug_prefix: Optional[str] = None
+    equals: Dict[str, Any] = {}
+    ranges: List[FieldRange] = []
+    item_fields: List[str] = []
+
+
+class LeaderboardEntry(pydantic.BaseModel):
+    repo: str
+    line: str
+    num: int
+    item: Item
+    value: float
+    fields: Dict[str, Any]
+
+
+class LeaderboardResponse(pydantic.BaseModel):
+    metric: str
+    total: int
+    entries: List[LeaderboardEntry]
+
+
+class SearchRequest(pydantic.BaseModel):
+    query: str
+    repo: Optional[str] = None
+    limit: int = pydantic.Field(50, gt=0)
+
+
+class SearchHit(pydantic.BaseModel):
+    kind: Literal["workspace", "repo", "line", "item"]
+    repo: Optional[str] = None
+    line: Optional[str] = None
+    num: Optional[int] = None
+    item: Optional[Item] = None
+    score: int
+    # Fields where the words were found
+    fields: List[str]
+
+
+class SearchResponse(pydantic.BaseModel):
+    query: str
+    total: int
+    hits: List[SearchHit]
+
+
+class WorkspaceEvent(pydantic.BaseModel):
+    id: str
+    type: Literal[
+        "reset",
+        "repo_added",
+        "repo_removed",
+        "line_added",
+        "line_removed",
+        "item_added",
+        "item_removed",
+        "comment_added",
+        "meta_updated",
+    ]
+    repo: Optional[str] = None
+    line: Optional[str] = None
+    item: Optional[str] = None
+    comments: Optional[List[Comment]] = None
+    # The item as in the line table for item_added and meta_updated of items
+    row: Optional[Item] = None
+
+
 class ModelPathSpec(pydantic.BaseModel):
     repo: str
     line: str
@@ -84,7 +217,9 @@ class Metric(pydantic.BaseModel):
 
 class File(pydantic.BaseModel):
     name: str
-    size: str
+    # Sizes are only sent by /v1/model_files
+    size: Optional[str] = None
+    size_bytes: Optional[int] = None
 
 
 class ModelResponse(Traceable):
@@ -105,6 +240,44 @@ class ModelResponse(Traceable):
     git_uncommitted_changes: Optional[List[str]]
 
 
+class ModelsBatchRequest(pydantic.BaseModel):
+    models: List[ModelPathSpec]
+    with_config: bool = True
+
+
+class BatchModel(ModelPathSpec):
+    # None if there is no such item in the line
+    item: Optional[Item]
+    config: Optional[Dict[str, Any]] = None
+    overrides: Optional[Dict[str, Any]] = None
+
+
+class ModelsBatchResponse(pydantic.BaseModel):
+    models: List[BatchModel]
+    params: List[str]
+    metrics: List[str]
+    # Values of every params.* and metrics.* key in the order
+    # of the models, None where the model does not have the key
+    values: Dict[str, List[Any]]
+    # Keys with different values across the models that were found
+    differing: List[str]
+
+
+class ModelFilesRequest(pydantic.BaseModel):
+    models: List[ModelPathSpec]
+
+
+class ModelFiles(ModelPathSpec):
+    artifacts: List[File]
+    files: List[File]
+    total_size: str
+    total_size_bytes: int
+
+
+class ModelFilesResponse(pydantic.BaseModel):
+    models: List[ModelFiles]
+
+
 class DatasetPathSpec(pydantic.BaseModel):
     repo: str
     line: str
@@ -129,8 +302,19 @@ class VersionResponse(pydantic.BaseModel):
     cascade_ui_version: str
 
 
+class LogRequest(ModelPathSpec):
+    offset: Optional[int] = pydantic.Field(default=None, ge=0)
+    length: Optional[int] = pydantic.Field(default=None, ge=0)
+    first_line: Optional[int] = pydantic.Field(default=None, ge=0)
+    n_lines: Optional[int] = pydantic.Field(default=None, ge=0)
+    tail_lines: Optional[int] = pydantic.Field(default=None, ge=0)
+
+
 class LogResponse(pydantic.BaseModel):
     log_text: Optional[str]
+    offset: int = 0
+    end: int = 0
+    size: int = 0
 
 
 class ConfigResponse(pydantic.BaseModel):
@@ -141,3 +325,21 @@ class ConfigResponse(pydantic.BaseModel):
 class AddCommentRequest(pydantic.BaseModel):
     comment: str
     path_parts: List[str]
+
+    @pydantic.field_validator("path_parts")
+    @classmethod
+    def _inside_workspace(cls, path_parts: List[str]) -> List[str]:
+        # Every part is one folder name, so the path stays inside of the workspace
+        for part in path_parts:
+            if part in ("", ".", "..") or "/" in part or "\\" in part:
+                raise ValueError(f"{part!r} is not a folder name")
+        return path_parts
+
+
+class CacheStats(pydantic.BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
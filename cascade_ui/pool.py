@@ -0,0 +1,84 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_IO_WORKERS = 8
+
+# Set for the duration of a request which can be cancelled
+# e.g. when the client disconnects
+cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+class ScanCancelled(Exception):
+    """
+    Raised inside of the reads of a request that was cancelled
+    """
+
+
+class IOPool:
+    """
+    Bounded pool of threads for independent filesystem reads
+
+    Reads are dominated by latency on network filesystems, so they are
+    fanned out to the threads while results keep the order of the inputs.
+    With a single worker everything runs in the calling thread.
+    """
+
+    def __init__(self, workers: int = DEFAULT_IO_WORKERS) -> None:
+        if workers < 1:
+            raise ValueError(f"Number of IO workers should be positive, got {workers}")
+
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if workers > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="cascade_ui_io"
+            )
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Applies the function to every item and returns results in the same order.
+        The first exception raised by the function is re-raised.
+
+        If the calling request is cancelled, the items that were not
+        started yet are skipped and ``ScanCancelled`` is raised.
+        The function sees the context variables of the caller
+        """
+        items = list(items)
+        event = cancel_event.get()
+
+        def call(item: T) -> R:
+            if event is not None and event.is_set():
+                raise ScanCancelled()
+            return fn(item)
+
+        if self._executor is None or len(items) < 2:
+            return [call(item) for item in items]
+
+        ctx = copy_context()
+        # A context can be entered by one thread at a time, so every call gets a copy
+        return list(self._executor.map(lambda item: ctx.copy().run(call, item), items))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,94 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import threading
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .server import Server
+
+logger = logging.getLogger(__name__)
+
+
+class IndexRefresher:
+    """
+    Keeps the persistent index of the workspace up to date in the background
+
+    When several worker processes share one index file only one of them
+    refreshes it at a time: the one holding the lock next to the index.
+    Others try to take the lock every interval, so one of them takes over
+    if the refresher exits. Others read the rows the refresher has written
+    instead of parsing metas themselves.
+
+    The refresher keeps in memory the indexes of every line and checks them
+    for changes every interval, the same as the ``Server.refresh``. Other
+    workers only build indexes of the lines they serve
+    """
+
+    def __init__(self, server: Server, index_path: str, interval: float) -> None:
+        self._server = server
+        self._lock_path = index_path + ".lock"
+        self._interval = interval
+        self._lock_file: Optional[IO] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._loop, name="cascade_ui_refresher", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def is_refresher(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_lock(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            # Without file locks every worker refreshes, which
+            # costs more work, but gives the same results
+            self._lock_file = open(os.devnull)
+            return True
+
+        lock_file = open(self._lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until the process exits
+        self._lock_file = lock_file
+        logger.info(f"Process {os.getpid()} refreshes the index")
+        return True
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            if self._try_lock():
+                try:
+                    self._server.refresh()
+                except Exception:
+                    logger.exception("Failed to refresh the index")
+            self._stop.wait(self._interval)
@@ -0,0 +1,63 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from typing import Any, Callable, Iterator, Optional
+
+import pydantic_core
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .instrument import span
+
+# Smaller responses are sent as is, since compressing them does not pay off
+GZIP_MIN_SIZE = 1024
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized by pydantic-core directly
+
+    Unlike the default path of FastAPI the content is not converted to
+    plain Python objects with ``jsonable_encoder`` first and models are
+    not validated again, which dominates the time for large lines.
+    Non-finite floats are written as null.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize"):
+            return pydantic_core.to_json(content)
+
+
+class IteratorResponse(StreamingResponse):
+    """
+    Streaming response over a blocking iterator
+
+    The iterator is kept, so the async handlers can read it in their own
+    executor instead of the default threadpool. ``on_close`` is called
+    when the response is sent or the sending fails
+    """
+
+    def __init__(self, content: Iterator[bytes], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.iterator = content
+        self.on_close: Optional[Callable[[], None]] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
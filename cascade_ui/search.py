@@ -0,0 +1,171 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bisect
+import re
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+# Fields of the objects that are searched and weights of their matches
+FIELD_WEIGHTS = {
+    "slug": 4,
+    "tags": 3,
+    "params": 2,
+    "description": 1,
+    "comments": 1,
+}
+FIELDS = list(FIELD_WEIGHTS)
+
+# Weight of the best field for every bit mask of the fields
+_MASK_WEIGHTS = [
+    max([FIELD_WEIGHTS[field] for bit, field in enumerate(FIELDS) if mask >> bit & 1] or [0])
+    for mask in range(1 << len(FIELDS))
+]
+
+# Shorter query words match only whole words, otherwise
+# a single letter would match a large part of the index
+MIN_PREFIX = 3
+
+# Underscores split words, so that slugs and param names match by their parts
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def is_search_key(key: str) -> bool:
+    """
+    Whether the key of the flattened meta is used by ``search_texts``
+    """
+    return key in ("slug", "tags", "description") or key.startswith(("params.", "comments."))
+
+
+def search_texts(flat: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Texts of the searched fields of the flattened meta
+    """
+    texts: Dict[str, List[str]] = {field: [] for field in FIELDS}
+    for key, value in flat.items():
+        if key in ("slug", "description"):
+            if isinstance(value, str):
+                texts[key].append(value)
+        elif key == "tags":
+            if isinstance(value, list):
+                texts["tags"].extend(str(tag) for tag in value)
+        elif key.startswith("params."):
+            # Only names of params are searched
+            texts["params"].append(key[len("params.") :])
+        elif key.startswith("comments.") and key.endswith(".message"):
+            if isinstance(value, str):
+                texts["comments"].append(value)
+    return texts
+
+
+class TextIndex:
+    """
+    Inverted index of the words of documents
+
+    Every word maps to the documents containing it and to the bit mask
+    of the fields it is found in. Words are also kept sorted, so that
+    the words starting with a query word are found by binary search.
+    Documents are updated one by one when they change.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._words: List[str] = []
+        self._docs: Dict[Hashable, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, doc: Hashable, texts: Dict[str, List[str]]) -> None:
+        """
+        Adds the document or replaces it if it is already in the index
+        """
+        self.remove(doc)
+
+        masks: Dict[str, int] = {}
+        for bit, field in enumerate(FIELDS):
+            for text in texts.get(field, ()):
+                for word in tokenize(text):
+                    masks[word] = masks.get(word, 0) | (1 << bit)
+
+        for word, mask in masks.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = {}
+                self._postings[word] = postings
+                bisect.insort(self._words, word)
+            postings[doc] = mask
+        self._docs[doc] = list(masks)
+
+    def remove(self, doc: Hashable) -> None:
+        words = self._docs.pop(doc, None)
+        if words is None:
+            return
+        for word in words:
+            postings = self._postings[word]
+            del postings[doc]
+            if not postings:
+                del self._postings[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+
+    def _matches(self, query_word: str) -> Dict[Hashable, Tuple[int, int]]:
+        # Documents with any word starting with the query word,
+        # the score prefers exact matches of the whole word
+        if len(query_word) < MIN_PREFIX:
+            postings = self._postings.get(query_word, {})
+            return {doc: (2 * _MASK_WEIGHTS[mask], mask) for doc, mask in postings.items()}
+
+        result: Dict[Hashable, Tuple[int, int]] = {}
+        start = bisect.bisect_left(self._words, query_word)
+        for i in range(start, len(self._words)):
+            word = self._words[i]
+            if not word.startswith(query_word):
+                break
+            exact = 2 if word == query_word else 1
+            for doc, mask in self._postings[word].items():
+                score = exact * _MASK_WEIGHTS[mask]
+                old = result.get(doc)
+                if old is None:
+                    result[doc] = (score, mask)
+                else:
+                    result[doc] = (max(score, old[0]), mask | old[1])
+        return result
+
+    def search(self, query_words: Iterable[str]) -> Dict[Hashable, Tuple[int, List[str]]]:
+        """
+        Documents containing every query word, each word can match as a prefix.
+        Returns their scores and the fields with matches
+        """
+        found: Dict[Hashable, Tuple[int, int]] = {}
+        for i, query_word in enumerate(dict.fromkeys(query_words)):
+            matches = self._matches(query_word)
+            if i == 0:
+                found = matches
+            else:
+                found = {
+                    doc: (score + matches[doc][0], mask | matches[doc][1])
+                    for doc, (score, mask) in found.items()
+                    if doc in matches
+                }
+            if not found:
+                break
+        return {
+            doc: (score, [field for bit, field in enumerate(FIELDS) if mask >> bit & 1])
+            for doc, (score, mask) in found.items()
+        }
@@ -15,50 +15,133 @@ limitations under the License.
 """
 
 import glob
+import heapq
 import json
 import os
+import threading
+import uuid
 import warnings
-from typing import Any, Dict, List
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import pydantic_core
 from cascade import __version__ as cascade_version
 from cascade.base import (
+    Meta,
     MetaHandler,
+    MetaIOError,
     TraceableOnDisk,
     ZeroMetaError,
     supported_meta_formats,
 )
-from cascade.base.utils import flatten_dict
-from cascade.lines import DataLine, ModelLine
-from cascade.workspaces import Workspace
+from cascade.lines import DataLine, Line, ModelLine
+from cascade.repos import Repo
+from fastapi import Response
 
 from . import __version__
+from .cache import DirCache, MetaCache, Stamp, file_stamp, meta_cache
+from .comments import CommentWriter
+from .etag import make_etag
+from .events import ChangeFeed, EventLog
+from .export import (
+    ITEM_COLUMNS,
+    ITEM_KINDS,
+    MEDIA_TYPES,
+    Batch,
+    batch_rows,
+    merge_kinds,
+    value_kind,
+    write_arrow,
+    write_csv,
+)
+from .files import (
+    FILE_KEYS,
+    FilesStamp,
+    files_stamp,
+    list_files,
+    scan_sizes,
+    size_string,
+)
+from .flatten import Flattener
+from .index import LineIndex, is_plot_field, item_nums, prepare_item_dict
+from .instrument import span
+from .logs import read_lines, read_range, read_tail
 from .models import (
     AddCommentRequest,
+    BatchModel,
+    CacheStats,
+    Comment,
     ConfigResponse,
     DatasetPathSpec,
     DatasetResponse,
+    ExportRequest,
     File,
     Item,
+    LeaderboardEntry,
+    LeaderboardQuery,
+    LeaderboardResponse,
+    LineAggregatesResponse,
     LinePathSpec,
+    LineQuery,
+    LineRequest,
     LineResponse,
     LineRow,
+    LineSeriesResponse,
+    LogRequest,
     LogResponse,
+    ModelFiles,
+    ModelFilesRequest,
+    ModelFilesResponse,
     ModelPathSpec,
     ModelResponse,
+    ModelsBatchRequest,
+    ModelsBatchResponse,
     RepoCard,
     RepoPathSpec,
     RepoResponse,
+    SearchHit,
+    SearchRequest,
+    SearchResponse,
     VersionResponse,
+    WorkspaceEvent,
     WorkspaceResponse,
 )
+from .pool import DEFAULT_IO_WORKERS, IOPool
+from .responses import IteratorResponse
+from .search import TextIndex, search_texts, tokenize
+from .store import IndexStore, StoredLine
+from .watch import ChangeDetector, make_detector
 
 SCRIPT_DIR = os.path.dirname(__file__)
 
 CLS2TYPE = {DataLine: "data_line", ModelLine: "model_line"}
 
+# Types in line metas as they are read by cascade's LineFactory,
+# "line" is used by repos before cascade 0.14.0
+LINE_TYPES = {
+    "line": "model_line",
+    "model_line": "model_line",
+    "model": "model_line",
+    "data_line": "data_line",
+    "data": "data_line",
+}
+
+# Number of models whose file sizes are kept in memory
+FILE_SIZES_CACHE_SIZE = 4096
+
+# Seconds between scans of the workspace for the events
+EVENTS_INTERVAL = 0.5
+
 
 class Server:
-    def __init__(self, path: str) -> None:
+    def __init__(
+        self,
+        path: str,
+        meta_cache: MetaCache = meta_cache,
+        detector: Optional[ChangeDetector] = None,
+        io_workers: int = DEFAULT_IO_WORKERS,
+        store: Optional[IndexStore] = None,
+    ) -> None:
         meta_paths = glob.glob(os.path.join(path, "meta.*"))
         meta_paths = [
             path for path in meta_paths if os.path.splitext(path)[-1] in supported_meta_formats
@@ -80,211 +163,879 @@ class Server:
             raise ValueError(f"Cannot start UI in {type}, workspaces only")
 
         self._ws_meta = meta
-        self._ws = Workspace(path)
-        self._ws_name = self._ws.get_root()
+        self._ws_name = path
+        self._meta_cache = meta_cache
+        self._dirs = DirCache()
+        self._comments = CommentWriter(meta_cache)
+        self._detector = detector if detector is not None else make_detector()
+        self._pool = IOPool(io_workers)
+        self._store = store
+        # Versions of indexes start over with every server,
+        # so ETags built from them also include this
+        self._instance = uuid.uuid4().hex
+
+        self._repo_names: Optional[Tuple[int, List[str]]] = None
+        self._repos: Dict[str, Tuple[int, Repo]] = {}
+        self._objects_lock = threading.Lock()
+
+        self._line_indexes: Dict[Tuple[str, str], Tuple[Line, LineIndex]] = {}
+        self._line_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._line_locks_lock = threading.Lock()
+
+        self._search_text = TextIndex()
+        self._search_stamps: Dict[Tuple[Optional[str], Optional[str]], Stamp] = {}
+        self._search_lock = threading.Lock()
+
+        self._file_sizes: "OrderedDict[str, Tuple[FilesStamp, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+        self._file_sizes_lock = threading.Lock()
+
+        self._events = EventLog(self._instance)
+        # Created on the first subscription since it watches every line
+        self._feed: Optional[ChangeFeed] = None
+        self._feed_lock = threading.Lock()
+
+    def _load_meta(self, obj: TraceableOnDisk) -> Meta:
+        return self._read_dir_meta(obj.get_root())
+
+    def _read_dir_meta(self, root: str) -> Meta:
+        return self._meta_cache.read(self._dirs.find_meta(root))
+
+    def _load_item_meta(self, line: Line, num: Union[int, str]) -> Meta:
+        meta, _ = self._load_item_meta_stamped(line, num)
+        return meta
+
+    def _load_item_meta_stamped(self, line: Line, num: Union[int, str]) -> Tuple[Meta, Stamp]:
+        # Lines resolve item folder names differently
+        # e.g. ModelLine formats num, DataLine uses the listing
+        name = line._parse_item_name(num)
+        meta_path = self._meta_cache.find_meta(os.path.join(line.get_root(), name))
+        return self._meta_cache.read_stamped(meta_path)
+
+    def _meta_stamp(self, root: str) -> Optional[Stamp]:
+        try:
+            return file_stamp(self._dirs.find_meta(root))
+        except (ZeroMetaError, FileNotFoundError):
+            return None
+
+    def _stored_line_row(self, root: str) -> Optional[LineRow]:
+        stored = self._store.load_line(root)
+        if stored is None:
+            return None
+        try:
+            if os.stat(root).st_mtime_ns != stored.dir_mtime_ns:
+                return None
+            if file_stamp(stored.meta_path) != stored.stamp:
+                return None
+        except FileNotFoundError:
+            return None
+        return LineRow(**stored.summary)
+
+    def _list_repos(self) -> List[str]:
+        """
+        Names of the repos in the workspace, the same as
+        ``Workspace.get_repo_names``, but without creating the workspace
+        """
+        # Repos are listed again only when the folder changes
+        mtime = os.stat(self._ws_name).st_mtime_ns
+        with self._objects_lock:
+            if self._repo_names is not None and self._repo_names[0] == mtime:
+                return self._repo_names[1]
+
+        def is_repo(name: str) -> bool:
+            try:
+                meta = self._read_dir_meta(os.path.join(self._ws_name, name))
+            except MetaIOError as e:
+                warnings.warn(str(e))
+                return False
+            return meta[0].get("type") == "repo"
+
+        dirs = self._dirs.list_dirs(self._ws_name)
+        names = [name for name, ok in zip(dirs, self._pool.map(is_repo, dirs)) if ok]
+        with self._objects_lock:
+            self._repo_names = (mtime, names)
+        return names
+
+    def _repo_root(self, name: str) -> str:
+        if name not in self._list_repos():
+            raise KeyError(f"{name} repo does not exist in workspace {self._ws_name}")
+        return os.path.join(self._ws_name, name)
+
+    def _list_lines(self, repo: str) -> List[str]:
+        # Repo treats every folder as a line
+        return self._dirs.list_dirs(self._repo_root(repo))
+
+    def _repo(self, name: str) -> Repo:
+        root = self._repo_root(name)
+
+        mtime = os.stat(root).st_mtime_ns
+        with self._objects_lock:
+            cached = self._repos.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        with span("objects"):
+            repo = Repo(root)
+        with self._objects_lock:
+            self._repos[name] = (mtime, repo)
+        return repo
+
+    def refresh(self) -> None:
+        """
+        Brings summaries of repos and indexes of every line up to date
+        which also updates the persistent store if it is used
+        """
+        for repo in self._list_repos():
+            self.repo(RepoPathSpec(repo=repo))
+            for line_name in self._list_lines(repo):
+                self._line_index(repo, line_name)
+
+    def add_comment(self, req: AddCommentRequest) -> Comment:
+        root = os.path.abspath(os.path.join(self._ws_name, *req.path_parts))
+        return Comment(**self._comments.add(root, req.comment))
 
-    def add_comment(self, req: AddCommentRequest):
-        path = os.path.join(self._ws_name, *req.path_parts)
-        tr = TraceableOnDisk(path, meta_fmt=".json")
-        tr.comment(req.comment)
+    def workspace_etag(self) -> str:
+        names = self._list_repos()
+
+        def stamps(name: str) -> Tuple[int, Optional[Stamp]]:
+            root = os.path.join(self._ws_name, name)
+            return os.stat(root).st_mtime_ns, self._meta_stamp(root)
+
+        return make_etag(self._meta_stamp(self._ws_name), names, self._pool.map(stamps, names))
 
     def workspace(self) -> WorkspaceResponse:
-        self._ws = Workspace(self._ws_name)
-        ws_meta = self._ws.get_meta()
-
-        repos = []
-        for name in self._ws.get_repo_names():
-            repo = self._ws[name]
-            meta = repo.get_meta()
-            card = RepoCard(name=name, len=len(repo), tags=meta[0].get("tags"))
-            repos.append(card)
-
-        return WorkspaceResponse(
-            name=self._ws_name,
-            len=len(repos),
-            repos=repos,
-            tags=ws_meta[0].get("tags"),
-            comments=ws_meta[0].get("comments"),
+        ws_meta = self._read_dir_meta(self._ws_name)
+
+        def load_card(name: str) -> RepoCard:
+            root = os.path.join(self._ws_name, name)
+            meta = self._read_dir_meta(root)
+            # Every folder of a repo is a line
+            return RepoCard(
+                name=name, len=len(self._dirs.list_dirs(root)), tags=meta[0].get("tags")
+            )
+
+        repos = self._pool.map(load_card, self._list_repos())
+
+        with span("validate"):
+            return WorkspaceResponse(
+                name=self._ws_name,
+                len=len(repos),
+                repos=repos,
+                tags=ws_meta[0].get("tags"),
+                comments=ws_meta[0].get("comments"),
+            )
+
+    def repo_etag(self, path: RepoPathSpec) -> str:
+        root = self._repo_root(path.repo)
+        names = self._list_lines(path.repo)
+
+        def stamps(name: str) -> Tuple[int, Optional[Stamp]]:
+            line_root = os.path.join(root, name)
+            return os.stat(line_root).st_mtime_ns, self._meta_stamp(line_root)
+
+        return make_etag(
+            os.stat(root).st_mtime_ns,
+            self._meta_stamp(root),
+            names,
+            self._pool.map(stamps, names),
         )
 
     def repo(self, path: RepoPathSpec) -> RepoResponse:
-        r = self._ws[path.repo]
-        repo_meta = r.get_meta()
-        names = r.get_line_names()
-        lines = [r[line] for line in names]
+        """
+        Summary of the repo and its lines
+
+        Lines are not created here: the count of items and other fields
+        are taken from the listing of the line folder and its meta,
+        both are cached until they change
+        """
+        root = self._repo_root(path.repo)
+        repo_meta = self._read_dir_meta(root)
+        names = self._list_lines(path.repo)
+
+        def load_row(name: str) -> Optional[LineRow]:
+            line_root = os.path.join(root, name)
+            if self._store is not None:
+                row = self._stored_line_row(line_root)
+                if row is not None:
+                    return row
+            # Taken before the listing to not miss the items added meanwhile
+            dir_mtime = os.stat(line_root).st_mtime_ns
+
+            try:
+                meta_path = self._dirs.find_meta(line_root)
+                meta, stamp = self._meta_cache.read_stamped(meta_path)
+            except MetaIOError as e:
+                warnings.warn(str(e))
+                return None
 
-        line_rows = []
-        for name, line in zip(names, lines):
-            t = CLS2TYPE[type(line)]
-            meta = line.load_meta()
+            t = LINE_TYPES.get(meta[0].get("type"))
+            if t is None:
+                warnings.warn(f"Unknown type of line {name}: {meta[0].get('type')}")
+                return None
 
             created_at = meta[0].get("created_at")
             updated_at = meta[0].get("updated_at")
 
             if not created_at or not updated_at:
                 warnings.warn(f"No created_at or updated_at in line {name}")
-                continue
+                return None
 
             row = LineRow(
                 name=name,
-                len=len(line),
+                # Lines treat every folder as an item
+                len=len(self._dirs.list_dirs(line_root)),
                 type=t,
                 tags=meta[0].get("tags"),
                 created_at=created_at,
                 updated_at=updated_at,
             )
-            line_rows.append(row)
-
-        return RepoResponse(
-            name=path.repo,
-            len=len(lines),
-            lines=line_rows,
-            tags=repo_meta[0].get("tags"),
-            comments=repo_meta[0].get("comments"),
-        )
+            if self._store is not None:
+                self._store.save_line(
+                    line_root, StoredLine(dir_mtime, meta_path, stamp, row.model_dump())
+                )
+            return row
 
-    def _prepare_item_dict(self, meta: Dict[str, Any]) -> Dict[str, Any]:
-        meta = meta[0]
-        flat = flatten_dict(meta, separator=".", root_keys_to_ignore=("tags", "metrics"))
+        line_rows = [row for row in self._pool.map(load_row, names) if row is not None]
 
-        metrics = flat.pop("metrics", [])
-        for metric in metrics:
-            name = metric["name"]
-            for key in ["dataset", "split"]:
-                part = metric.get(key)
-                name += "_" + part if part else ""
-            flat[f"metrics.{name}"] = metric["value"]
+        with span("validate"):
+            return RepoResponse(
+                name=path.repo,
+                len=len(names),
+                lines=line_rows,
+                tags=repo_meta[0].get("tags"),
+                comments=repo_meta[0].get("comments"),
+            )
 
-        return flat
+    def _line_index(self, repo: str, line_name: str) -> Tuple[Line, LineIndex]:
+        key = (repo, line_name)
+        with self._line_locks_lock:
+            lock = self._line_locks.setdefault(key, threading.Lock())
 
-    def _get_item_fields(self, meta: List[Dict[str, Any]]) -> List[str]:
-        def keys_filter(key: str) -> bool:
-            if key.startswith(("comments", "git_uncommitted_changes", "links")):
-                return False
-            if key in ("name", "slug", "tags", "saved_at", "created_at"):
-                return False
-            return True
+        with lock:
+            entry = self._line_indexes.get(key)
+            if entry is None:
+                r = self._repo(repo)
+                with span("objects"):
+                    line = r[line_name]
+                # Watch before the first scan to not miss
+                # the items saved while it is running
+                self._detector.watch(line.get_root())
+                index = LineIndex(
+                    line.get_root(),
+                    self._meta_cache,
+                    self._pool,
+                    self._store,
+                    numbered=isinstance(line, ModelLine),
+                )
+                index.sync(line.get_item_names())
+                self._line_indexes[key] = (line, index)
+                return line, index
 
-        flat = self._prepare_item_dict(meta)
-        keys = list(filter(keys_filter, flat.keys()))
-        return keys
+            line, index = entry
+            changes = self._detector.poll(line.get_root())
+            if changes.listing:
+                with span("list"):
+                    line.reload()
+            # Removed items come as a change of the listing only
+            if changes.listing or changes.items:
+                index.sync(line.get_item_names(), changed=changes.items)
+            return line, index
 
-    def line_item_table(
-        self, line_path: LinePathSpec, item_fields: List[str]
-    ) -> List[Dict[str, Any]]:
-        line = self._ws[line_path.repo][line_path.line]
-        items = []
-        for i in range(len(line)):
+    def _indexed_lines(
+        self, lines: Iterable[Tuple[str, str]], skip_missing: bool = False
+    ) -> Iterator[Tuple[str, str, Line, LineIndex]]:
+        """
+        Synced indexes of the lines given as (repo, line) pairs. With ``skip_missing``
+        unknown repos and lines are skipped instead of raising
+        """
+        for repo, line_name in lines:
+            # Lines are synced one by one since every sync fans out to the pool itself
             try:
-                meta = line.load_obj_meta(i)
-            except ZeroMetaError:
+                line, index = self._line_index(repo, line_name)
+            except (KeyError, MetaIOError):
+                if not skip_missing:
+                    raise
                 continue
-            item = {}
-            flat = self._prepare_item_dict(meta)
-            for key in item_fields:
-                if key == "num":
-                    value = i
-                else:
-                    value = flat.get(key)
-                item[key] = value
-            items.append(item)
-        return items
-
-    def _filter_plot_fields(self, field_name):
-        if field_name.startswith(("metrics", "params")):
-            return True
-        return False
-
-    def line(self, path: LinePathSpec) -> LineResponse:
-        line = self._ws[path.repo][path.line]
-        line_meta = line.get_meta()
-
-        items = []
-        item_names = line.get_item_names()
-        item_fields = set()
-        for i, name in enumerate(item_names):
+            yield repo, line_name, line, index
+
+    def _lines_of(self, repos: List[str]) -> Iterator[Tuple[str, str]]:
+        for repo in repos:
+            for line_name in self._list_lines(repo):
+                yield repo, line_name
+
+    def _line_etag(self, line_path: LinePathSpec, *params: Any) -> str:
+        line, index = self._line_index(line_path.repo, line_path.line)
+        return make_etag(
+            self._instance,
+            index.version,
+            self._meta_stamp(line.get_root()),
+            line_path.repo,
+            line_path.line,
+            *params,
+        )
+
+    def line_item_table_etag(
+        self, line_path: LinePathSpec, item_fields: List[str], query: Optional[LineQuery] = None
+    ) -> str:
+        return self._line_etag(
+            line_path, item_fields, query.model_dump() if query is not None else None
+        )
+
+    def line_item_table(
+        self,
+        line_path: LinePathSpec,
+        item_fields: List[str],
+        query: Optional[LineQuery] = None,
+        response: Response = None,
+    ) -> List[Dict[str, Any]]:
+        _, index = self._line_index(line_path.repo, line_path.line)
+        rows, total = index.select(query if query is not None else LineQuery())
+        if response is not None:
+            response.headers["X-Total-Count"] = str(total)
+        return index.table(item_fields, rows)
+
+    def _iter_line_items(
+        self, line: Line, item_fields: List[str], batch_size: int = 64
+    ) -> Iterator[bytes]:
+        def load(name: str) -> Optional[Meta]:
             try:
-                meta = line.load_obj_meta(i)
-                item_fields.update(self._get_item_fields(meta))
-            except ZeroMetaError:
-                continue
-            item = Item(
-                name=name,
-                slug=meta[0].get("slug"),
-                tags=meta[0].get("tags"),
-                created_at=meta[0].get("created_at"),
-                saved_at=meta[0]["saved_at"],
+                return self._meta_cache.read(
+                    self._meta_cache.find_meta(os.path.join(line.get_root(), name))
+                )
+            except (ZeroMetaError, FileNotFoundError):
+                return None
+
+        flattener = Flattener()
+        names = line.get_item_names()
+        all_nums = item_nums(names, isinstance(line, ModelLine))
+        for start in range(0, len(names), batch_size):
+            nums = all_nums[start : start + batch_size]
+            batch = names[start : start + batch_size]
+            for i, meta in zip(nums, self._pool.map(load, batch)):
+                if meta is None:
+                    continue
+                flat = prepare_item_dict(meta, flattener, item_fields)
+                item = {key: i if key == "num" else flat.get(key) for key in item_fields}
+                yield pydantic_core.to_json(item) + b"\n"
+
+    def _iter_index_items(
+        self, index: LineIndex, item_fields: List[str], batch_size: int = 1000
+    ) -> Iterator[bytes]:
+        start = 0
+        # The index may change between batches, so its length is checked every time
+        while start < len(index):
+            rows = list(range(start, min(start + batch_size, len(index))))
+            table = index.table(item_fields, rows)
+            yield b"".join(pydantic_core.to_json(item) + b"\n" for item in table)
+            start += batch_size
+
+    def line_item_table_stream(
+        self, line_path: LinePathSpec, item_fields: List[str]
+    ) -> IteratorResponse:
+        """
+        Same rows as ``line_item_table``, but sent as NDJSON while they are read.
+        If the line is already indexed, rows are taken from the index
+        """
+        if (line_path.repo, line_path.line) in self._line_indexes:
+            _, index = self._line_index(line_path.repo, line_path.line)
+            rows = self._iter_index_items(index, item_fields)
+        else:
+            line = self._repo(line_path.repo)[line_path.line]
+            rows = self._iter_line_items(line, item_fields)
+        return IteratorResponse(rows, media_type="application/x-ndjson")
+
+    def _export_batches(
+        self,
+        selected: List[Tuple[str, str, LineIndex, List[str]]],
+        item_fields: List[str],
+        batch_size: int,
+    ) -> Iterator[Batch]:
+        for repo, line_name, index, names in selected:
+            for start in range(0, len(names), batch_size):
+                nums, items, columns = index.batch(names[start : start + batch_size], item_fields)
+                yield {
+                    "repo": [repo] * len(nums),
+                    "line": [line_name] * len(nums),
+                    "num": nums,
+                    "name": [item.name for item in items],
+                    "slug": [item.slug for item in items],
+                    "tags": [item.tags for item in items],
+                    "created_at": [item.created_at for item in items],
+                    "saved_at": [item.saved_at for item in items],
+                    **columns,
+                }
+
+    def export(self, req: ExportRequest) -> IteratorResponse:
+        """
+        Flattened items of a line, of every line of a repo or of the whole
+        workspace that match the query as CSV, Arrow IPC file or Parquet.
+        The query sorts and pages the items of each line separately
+
+        The table is written in batches from the line indexes, so only
+        one batch of the output is held in memory at a time
+        """
+        if req.line is not None:
+            lines = [(req.repo, req.line)]
+        else:
+            lines = self._lines_of([req.repo] if req.repo is not None else self._list_repos())
+        selected = [
+            (repo, line_name, index, index.select_names(req.query))
+            for repo, line_name, _, index in self._indexed_lines(lines)
+        ]
+
+        item_fields = req.item_fields
+        if item_fields is None:
+            item_fields = sorted(
+                {key for _, _, index, _ in selected for key in index.item_fields()}
             )
-            items.append(item)
-        return LineResponse(
-            name=path.line,
-            len=len(line),
-            type=CLS2TYPE[type(line)],
-            comments=line_meta[0].get("comments"),
-            tags=line_meta[0].get("tags"),
-            items=items,
-            item_fields=list(sorted(item_fields)),
-            plot_fields=list(sorted(filter(self._filter_plot_fields, item_fields))),
+        item_fields = [key for key in item_fields if key not in ITEM_COLUMNS]
+        columns = ITEM_COLUMNS + item_fields
+        batch_size = req.batch_size or batch_rows(len(columns))
+        batches = self._export_batches(selected, item_fields, batch_size)
+
+        if req.format == "csv":
+            body = write_csv(columns, batches)
+        else:
+            kinds = dict(ITEM_KINDS)
+            for key in item_fields:
+                for _, _, index, _ in selected:
+                    kinds[key] = merge_kinds(kinds.get(key), value_kind(index.column(key)))
+            body = write_arrow(columns, kinds, batches, req.format)
+
+        name = "_".join(part for part in (req.repo, req.line) if part) or "workspace"
+        return IteratorResponse(
+            body,
+            media_type=MEDIA_TYPES[req.format],
+            headers={"Content-Disposition": f'attachment; filename="{name}.{req.format}"'},
         )
 
-    def _file_size_string(self, size_bytes: int) -> str:
-        if size_bytes < 1024:
-            return f"{size_bytes} B"
-        elif size_bytes < 1024**2:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_bytes < 1024**3:
-            return f"{size_bytes / 1024**2:.1f} MB"
+    def line_series_etag(
+        self, line_path: LinePathSpec, field: str, points: Optional[int] = None
+    ) -> str:
+        return self._line_etag(line_path, field, points)
+
+    def line_series(
+        self, line_path: LinePathSpec, field: str, points: Optional[int] = None
+    ) -> LineSeriesResponse:
+        """
+        Values of the plot field, downsampled to ``points`` if given
+        """
+        _, index = self._line_index(line_path.repo, line_path.line)
+        nums, values, slugs, total = index.series(field, points)
+        return LineSeriesResponse(field=field, nums=nums, values=values, slugs=slugs, total=total)
+
+    def line_aggregates_etag(
+        self, line_path: LinePathSpec, fields: Optional[List[str]] = None
+    ) -> str:
+        return self._line_etag(line_path, fields)
+
+    def line_aggregates(
+        self, line_path: LinePathSpec, fields: Optional[List[str]] = None
+    ) -> LineAggregatesResponse:
+        """
+        Count, min, max, mean and the best value of the plot fields
+        of the line, of every plot field if none are given
+        """
+        _, index = self._line_index(line_path.repo, line_path.line)
+        return LineAggregatesResponse(fields=index.aggregates(fields))
+
+    def line_etag(self, path: LineRequest) -> str:
+        return self._line_etag(path, path.model_dump())
+
+    def line(self, path: LineRequest) -> LineResponse:
+        if not isinstance(path, LineRequest):
+            path = LineRequest(**path.model_dump())
+
+        line, index = self._line_index(path.repo, path.line)
+        line_meta = self._load_meta(line)
+        rows, total = index.select(path)
+
+        item_fields = index.item_fields()
+        with span("validate"):
+            return LineResponse(
+                name=path.line,
+                len=len(line),
+                type=CLS2TYPE[type(line)],
+                comments=line_meta[0].get("comments"),
+                tags=line_meta[0].get("tags"),
+                total=total,
+                items=index.items(rows),
+                item_fields=item_fields,
+                plot_fields=list(filter(is_plot_field, item_fields)),
+            )
+
+    def query(self, query: LeaderboardQuery) -> LeaderboardResponse:
+        """
+        Top items by the metric across the lines of a repo or of the whole workspace
+
+        Every line keeps its items sorted by each requested field in its index,
+        so only the best of every line are merged here. Indexes are updated
+        incrementally when lines change.
+        """
+        if query.repo is not None:
+            repos = [query.repo]
         else:
-            return f"{size_bytes / 1024**3:.1f} GB"
+            repos = self._list_repos()
+
+        line_query = LineQuery(
+            tag=query.tag,
+            slug_prefix=query.slug_prefix,
+            equals=query.equals,
+            ranges=query.ranges,
+        )
+
+        total = 0
+        candidates = []
+        for repo, line_name, _, index in self._indexed_lines(self._lines_of(repos)):
+            top, matched = index.top(
+                query.metric, query.k, query.descending, line_query, query.item_fields
+            )
+            total += matched
+            candidates.extend(
+                LeaderboardEntry(
+                    repo=repo, line=line_name, num=num, item=item, value=value, fields=fields
+                )
+                for value, num, item, fields in top
+            )
+
+        select = heapq.nlargest if query.descending else heapq.nsmallest
+        entries = select(query.k, candidates, key=lambda entry: entry.value)
+        return LeaderboardResponse(metric=query.metric, total=total, entries=entries)
+
+    def _model_root(self, path: ModelPathSpec) -> str:
+        return os.path.join(self._ws_name, path.repo, path.line, f"{path.num:0>5d}")
+
+    def _files_stamp(self, root: str) -> Optional[FilesStamp]:
+        meta_stamp = self._meta_stamp(root)
+        if meta_stamp is None:
+            return None
+        return files_stamp(root, meta_stamp)
+
+    def _load_file_sizes(
+        self, root: str, stamp: Optional[FilesStamp]
+    ) -> Optional[List[Dict[str, Any]]]:
+        if stamp is None:
+            return None
+        with self._file_sizes_lock:
+            cached = self._file_sizes.get(root)
+            if cached is not None and cached[0] == stamp:
+                self._file_sizes.move_to_end(root)
+                return cached[1]
+        if self._store is not None:
+            return self._store.load_files(root, stamp)
+        return None
+
+    def _save_file_sizes(
+        self, root: str, stamp: Optional[FilesStamp], files: List[Dict[str, Any]]
+    ) -> None:
+        if stamp is None:
+            return
+        with self._file_sizes_lock:
+            self._file_sizes[root] = (stamp, files)
+            self._file_sizes.move_to_end(root)
+            while len(self._file_sizes) > FILE_SIZES_CACHE_SIZE:
+                self._file_sizes.popitem(last=False)
+        if self._store is not None:
+            self._store.save_files(root, stamp, files)
+
+    def model_files(self, req: ModelFilesRequest) -> ModelFilesResponse:
+        """
+        Sizes of artifacts and files of the models with totals per model
+
+        Sizes are kept while the meta of the model and the mtimes of
+        its artifact and file folders are the same. Stats of all models
+        that are not cached run concurrently
+        """
+        roots = [self._model_root(path) for path in req.models]
+        stamps = self._pool.map(self._files_stamp, roots)
+
+        sizes = []
+        missing = []
+        for i, (root, stamp) in enumerate(zip(roots, stamps)):
+            files = self._load_file_sizes(root, stamp)
+            if files is None:
+                missing.append(i)
+            sizes.append(files)
+
+        listings = self._pool.map(list_files, [roots[i] for i in missing])
+        paths = [
+            (i, key, name)
+            for i, listing in zip(missing, listings)
+            for key in FILE_KEYS
+            for name in listing[key]
+        ]
+        scanned = scan_sizes([(key, name) for _, key, name in paths], self._pool)
+        for i in missing:
+            sizes[i] = []
+        for (i, _, _), (key, name, size) in zip(paths, scanned):
+            if size is not None:
+                sizes[i].append({"key": key, "name": name, "size": size})
+        for i in missing:
+            self._save_file_sizes(roots[i], stamps[i], sizes[i])
+
+        models = []
+        for path, files in zip(req.models, sizes):
+            by_key = {key: [] for key in FILE_KEYS}
+            for file in files:
+                by_key[file["key"]].append(
+                    File(name=file["name"], size=size_string(file["size"]), size_bytes=file["size"])
+                )
+            total = sum(file["size"] for file in files)
+            models.append(
+                ModelFiles(
+                    **path.model_dump(),
+                    artifacts=by_key["artifacts"],
+                    files=by_key["files"],
+                    total_size=size_string(total),
+                    total_size_bytes=total,
+                )
+            )
+        return ModelFilesResponse(models=models)
+
+    def model_etag(self, path: ModelPathSpec) -> str:
+        # Artifacts and files are listed in the response, so their folders
+        # are checked along with the meta and the folder of the model
+        root = self._model_root(path)
+        return make_etag(os.stat(root).st_mtime_ns, self._files_stamp(root))
 
     def model(self, path: ModelPathSpec) -> ModelResponse:
-        line = self._ws[path.repo][path.line]
-        meta = line.load_model_meta(path.num)
-        paths = line.load_artifact_paths(path.num)
-
-        files = []
-        artifacts = []
-        for key in paths:
-            for path in paths[key]:
-                if os.path.exists(path):
-                    size_bytes = os.path.getsize(path)
-                    size_str = self._file_size_string(size_bytes)
-                    file = File(name=path, size=size_str)
-                    if key == "artifacts":
-                        artifacts.append(file)
-                    else:
-                        files.append(file)
-
-        return ModelResponse(
-            slug=meta[0]["slug"],
-            path=meta[0]["path"],
-            created_at=meta[0]["created_at"],
-            saved_at=meta[0]["saved_at"],
-            user=meta[0]["user"],
-            host=meta[0]["host"],
-            cwd=meta[0].get("cwd"),
-            python_version=meta[0]["python_version"],
-            description=meta[0]["description"],
-            comments=meta[0]["comments"],
-            tags=meta[0]["tags"],
-            params=meta[0]["params"],
-            metrics=meta[0]["metrics"],
-            artifacts=artifacts,
-            files=files,
-            git_commit=meta[0].get("git_commit"),
-            git_uncommitted_changes=meta[0].get("git_uncommitted_changes"),
+        repo = self._repo(path.repo)
+        with span("objects"):
+            line = repo[path.line]
+        meta = self._load_item_meta(line, path.num)
+
+        # Only names are listed here, sizes are sent by model_files
+        # so that a model with many artifacts does not wait for stats
+        listing = list_files(os.path.join(line.get_root(), line._parse_item_name(path.num)))
+        artifacts = [File(name=name) for name in listing["artifacts"]]
+        files = [File(name=name) for name in listing["files"]]
+
+        with span("validate"):
+            return ModelResponse(
+                slug=meta[0]["slug"],
+                path=meta[0]["path"],
+                created_at=meta[0]["created_at"],
+                saved_at=meta[0]["saved_at"],
+                user=meta[0]["user"],
+                host=meta[0]["host"],
+                cwd=meta[0].get("cwd"),
+                python_version=meta[0]["python_version"],
+                description=meta[0]["description"],
+                comments=meta[0]["comments"],
+                tags=meta[0]["tags"],
+                params=meta[0]["params"],
+                metrics=meta[0]["metrics"],
+                artifacts=artifacts,
+                files=files,
+                git_commit=meta[0].get("git_commit"),
+                git_uncommitted_changes=meta[0].get("git_uncommitted_changes"),
+            )
+
+    def models_batch(self, req: ModelsBatchRequest) -> ModelsBatchResponse:
+        """
+        Several models at once for comparison
+
+        Models are taken from the indexes of their lines, so every line is
+        created and synced once. Values of params and metrics are returned
+        by key for all models to be compared directly
+        """
+        by_line: Dict[Tuple[str, str], List[int]] = {}
+        for i, path in enumerate(req.models):
+            by_line.setdefault((path.repo, path.line), []).append(i)
+
+        found: List[Optional[Tuple[Item, Dict[str, Any]]]] = [None] * len(req.models)
+        # Models of unknown repos and lines are not found as other missing models
+        for repo, line_name, line, index in self._indexed_lines(by_line, skip_missing=True):
+            positions = by_line[(repo, line_name)]
+            # Folders are found as in /v1/model
+            names = []
+            for i in positions:
+                try:
+                    names.append(line._parse_item_name(req.models[i].num))
+                except FileNotFoundError:
+                    names.append("")
+            records = index.lookup(names)
+            for i, record in zip(positions, records):
+                found[i] = record
+
+        configs = [None] * len(req.models)
+        if req.with_config:
+            configs = self._pool.map(self.run_config, req.models)
+
+        keys = sorted({key for record in found if record is not None for key in record[1]})
+        values = {
+            key: [record[1].get(key) if record is not None else None for record in found]
+            for key in keys
+        }
+        present = [i for i, record in enumerate(found) if record is not None]
+        differing = [
+            key
+            for key, column in values.items()
+            if len({json.dumps(column[i], sort_keys=True, default=str) for i in present}) > 1
+        ]
+
+        models = [
+            BatchModel(
+                **path.model_dump(),
+                item=record[0] if record is not None else None,
+                config=config.config if config is not None else None,
+                overrides=config.overrides if config is not None else None,
+            )
+            for path, record, config in zip(req.models, found, configs)
+        ]
+        with span("validate"):
+            return ModelsBatchResponse(
+                models=models,
+                params=[key for key in keys if key.startswith("params")],
+                metrics=[key for key in keys if key.startswith("metrics")],
+                values=values,
+                differing=differing,
+            )
+
+    def _sync_search(self) -> None:
+        # Metas of the workspace, repos and lines are
+        # tokenized again only when their stamps change
+        roots: Dict[Tuple[Optional[str], Optional[str]], str] = {(None, None): self._ws_name}
+        for repo in self._list_repos():
+            roots[(repo, None)] = os.path.join(self._ws_name, repo)
+            for line_name in self._list_lines(repo):
+                roots[(repo, line_name)] = os.path.join(self._ws_name, repo, line_name)
+        stamps = dict(zip(roots, self._pool.map(self._meta_stamp, roots.values())))
+
+        with self._search_lock:
+            for key in set(self._search_stamps) - set(roots):
+                self._search_text.remove(key)
+                del self._search_stamps[key]
+
+            for key, stamp in stamps.items():
+                if stamp is None or self._search_stamps.get(key) == stamp:
+                    continue
+                try:
+                    meta = self._read_dir_meta(roots[key])
+                except (MetaIOError, FileNotFoundError):
+                    continue
+                self._search_text.add(key, search_texts(prepare_item_dict(meta)))
+                self._search_stamps[key] = stamp
+
+    def search(self, req: SearchRequest) -> SearchResponse:
+        """
+        Items, lines, repos and the workspace with all the words of the query
+        in their slugs, tags, param names, descriptions or comments.
+        Query words of three letters or longer also match as prefixes
+
+        Every line keeps the index of its items which is built on the first
+        search and updated when the items change, same for the workspace,
+        repos and lines themselves
+        """
+        words = tokenize(req.query)
+        if not words:
+            return SearchResponse(query=req.query, total=0, hits=[])
+
+        repos = [req.repo] if req.repo is not None else self._list_repos()
+        hits = []
+        for repo, line_name, _, index in self._indexed_lines(self._lines_of(repos)):
+            hits.extend(
+                SearchHit(
+                    kind="item",
+                    repo=repo,
+                    line=line_name,
+                    num=num,
+                    item=item,
+                    score=score,
+                    fields=fields,
+                )
+                for num, item, score, fields in index.search(words)
+            )
+
+        self._sync_search()
+        with self._search_lock:
+            found = self._search_text.search(words)
+        for (repo, line_name), (score, fields) in found.items():
+            if req.repo is not None and repo != req.repo:
+                continue
+            kind = "workspace" if repo is None else "repo" if line_name is None else "line"
+            hits.append(SearchHit(kind=kind, repo=repo, line=line_name, score=score, fields=fields))
+
+        best = heapq.nlargest(
+            req.limit,
+            hits,
+            key=lambda hit: (hit.score, hit.repo is None, hit.line is None, -(hit.num or 0)),
         )
+        with span("validate"):
+            return SearchResponse(query=req.query, total=len(hits), hits=best)
+
+    def _change_feed(self) -> ChangeFeed:
+        with self._feed_lock:
+            if self._feed is None:
+                self._feed = ChangeFeed(
+                    self._events,
+                    make_detector(EVENTS_INTERVAL),
+                    self._pool,
+                    self._ws_name,
+                    self._list_repos,
+                    self._list_lines,
+                    self._meta_stamp,
+                    self._read_dir_meta,
+                    interval=EVENTS_INTERVAL,
+                )
+            return self._feed
 
-    def run_log(self, path: ModelPathSpec) -> LogResponse:
-        log_file = os.path.join(
+    def last_event_id(self) -> str:
+        """
+        Id to get the events after the current state of the workspace,
+        the first call records the state to compare with later
+        """
+        self._change_feed().scan()
+        return self._events.last_id
+
+    def subscribe(self, repo: str, line: str) -> None:
+        """
+        Events of the items of the line are made only while it has
+        subscribers, e.g. clients that show the line
+        """
+        self._change_feed().subscribe(repo, line)
+
+    def unsubscribe(self, repo: str, line: str) -> None:
+        self._change_feed().unsubscribe(repo, line)
+
+    def events(self, last_id: str) -> List[WorkspaceEvent]:
+        """
+        Changes in the workspace after the event with the id:
+        repos, lines and items added or removed, comments added
+        and metas updated. The workspace is scanned at most once in
+        ``EVENTS_INTERVAL`` seconds however many clients ask.
+        Items are followed only in the lines with subscribers
+        """
+        self._change_feed().scan()
+        return [WorkspaceEvent(**event) for event in self._events.since(last_id)]
+
+    def run_log_path(self, path: ModelPathSpec) -> str:
+        return os.path.join(
             self._ws_name, path.repo, path.line, f"{path.num:0>5d}", "files", "cascade_run.log"
         )
-        log_text = None
-        if os.path.exists(log_file):
-            with open(log_file, "r") as f:
-                log_text = "\n".join(f.readlines())
 
-        return LogResponse(log_text=log_text)
+    def run_log(self, path: LogRequest) -> LogResponse:
+        """
+        Returns the whole log or its part: the last ``tail_lines``,
+        ``n_lines`` starting from ``first_line`` or ``length`` bytes from ``offset``
+        """
+        if not isinstance(path, LogRequest):
+            path = LogRequest(**path.model_dump())
+
+        log_file = self.run_log_path(path)
+        if not os.path.exists(log_file):
+            return LogResponse(log_text=None)
+
+        size = os.path.getsize(log_file)
+        if path.tail_lines is not None:
+            text, start, end = read_tail(log_file, path.tail_lines)
+        elif path.first_line is not None:
+            text, start, end = read_lines(log_file, path.first_line, path.n_lines)
+        else:
+            text, start, end = read_range(log_file, path.offset or 0, path.length)
+
+        return LogResponse(log_text=text, offset=start, end=end, size=size)
 
     def run_config(self, path: ModelPathSpec) -> ConfigResponse:
         config_file = os.path.join(
@@ -312,8 +1063,8 @@ class Server:
         return ConfigResponse(config=config, overrides=overrides)
 
     def dataset(self, path: DatasetPathSpec) -> DatasetResponse:
-        line = self._ws[path.repo].add_line(path.line, line_type="data")
-        meta = line.load_obj_meta(path.ver)
+        line = self._repo(path.repo).add_line(path.line, line_type="data")
+        meta = self._load_item_meta(line, path.ver)
 
         return DatasetResponse(
             name=path.ver,
@@ -330,6 +1081,9 @@ class Server:
             git_uncommitted_changes=meta[0]["git_uncommitted_changes"],
         )
 
+    def cache_stats(self) -> CacheStats:
+        return self._meta_cache.stats()
+
     def version(self):
         return VersionResponse(
             cascade_ml_version=cascade_version,
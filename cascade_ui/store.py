@@ -0,0 +1,230 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from .cache import Stamp
+from .files import FilesStamp
+
+DEFAULT_INDEX_NAME = ".cascade_ui_index.sqlite"
+
+# Bumped when the layout of the tables or of the stored values changes,
+# the file is rebuilt from scratch then
+SCHEMA_VERSION = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    line_root TEXT NOT NULL,
+    name TEXT NOT NULL,
+    meta_path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    flat TEXT NOT NULL,
+    directions TEXT NOT NULL,
+    PRIMARY KEY (line_root, name)
+);
+CREATE TABLE IF NOT EXISTS lines (
+    root TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER NOT NULL,
+    meta_path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS item_files (
+    root TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    artifacts_mtime_ns INTEGER NOT NULL,
+    files_mtime_ns INTEGER NOT NULL,
+    files TEXT NOT NULL
+);
+"""
+
+
+class StoredItem(NamedTuple):
+    meta_path: str
+    stamp: Stamp
+    item: Dict[str, Any]
+    flat: Dict[str, Any]
+    directions: Dict[str, str]
+
+
+class StoredLine(NamedTuple):
+    dir_mtime_ns: int
+    meta_path: str
+    stamp: Stamp
+    summary: Dict[str, Any]
+
+
+def _dumps(value: Any) -> str:
+    # YAML metas may contain values like dates which JSON does not have
+    return json.dumps(value, default=str)
+
+
+def _stored_item(
+    meta_path: str, mtime_ns: int, size: int, item: str, flat: str, directions: str
+) -> StoredItem:
+    return StoredItem(
+        meta_path, (mtime_ns, size), json.loads(item), json.loads(flat), json.loads(directions)
+    )
+
+
+class IndexStore:
+    """
+    Persistent index of the workspace in a SQLite file
+
+    Keeps flattened item metadata, line summaries and artifact sizes
+    between restarts of the server. Every record is stored with the
+    stamp of the file it was built from and is used only while the
+    stamp is the same, so the file is a cache and can be deleted any time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # Several worker processes may write at once, then they wait for each other
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        # WAL keeps the journal file in place instead of
+        # creating and deleting it on every write
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            for table in ("items", "lines", "item_files"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_workspace(cls, ws_path: str) -> "IndexStore":
+        return cls(os.path.join(ws_path, DEFAULT_INDEX_NAME))
+
+    def load_items(self, line_root: str) -> Dict[str, StoredItem]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, meta_path, mtime_ns, size, item, flat, directions FROM items "
+                "WHERE line_root = ?",
+                (line_root,),
+            ).fetchall()
+        return {name: _stored_item(*row) for name, *row in rows}
+
+    def load_item(self, line_root: str, name: str) -> Optional[StoredItem]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT meta_path, mtime_ns, size, item, flat, directions FROM items "
+                "WHERE line_root = ? AND name = ?",
+                (line_root, name),
+            ).fetchone()
+        if row is None:
+            return None
+        return _stored_item(*row)
+
+    def save_items(
+        self, line_root: str, items: Dict[str, StoredItem], names: Iterable[str]
+    ) -> None:
+        """
+        Writes the items given and removes the items of the line
+        which are not in the names anymore
+        """
+        names = set(names)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            stored = {
+                name
+                for (name,) in self._conn.execute(
+                    "SELECT name FROM items WHERE line_root = ?", (line_root,)
+                )
+            }
+            self._conn.executemany(
+                "DELETE FROM items WHERE line_root = ? AND name = ?",
+                [(line_root, name) for name in stored - names],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        line_root,
+                        name,
+                        item.meta_path,
+                        item.stamp[0],
+                        item.stamp[1],
+                        _dumps(item.item),
+                        _dumps(item.flat),
+                        _dumps(item.directions),
+                    )
+                    for name, item in items.items()
+                ],
+            )
+
+    def load_line(self, root: str) -> Optional[StoredLine]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dir_mtime_ns, meta_path, mtime_ns, size, summary FROM lines WHERE root = ?",
+                (root,),
+            ).fetchone()
+        if row is None:
+            return None
+        dir_mtime_ns, meta_path, mtime_ns, size, summary = row
+        return StoredLine(dir_mtime_ns, meta_path, (mtime_ns, size), json.loads(summary))
+
+    def save_line(self, root: str, line: StoredLine) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lines VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    root,
+                    line.dir_mtime_ns,
+                    line.meta_path,
+                    line.stamp[0],
+                    line.stamp[1],
+                    _dumps(line.summary),
+                ),
+            )
+
+    def load_files(self, root: str, stamp: FilesStamp) -> Optional[List[Dict[str, Any]]]:
+        """
+        Artifact and file sizes of the item in bytes if they were stored
+        with the same stamp of the item's meta and of its file folders
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, artifacts_mtime_ns, files_mtime_ns, files "
+                "FROM item_files WHERE root = ?",
+                (root,),
+            ).fetchone()
+        if row is None or tuple(row[:4]) != stamp:
+            return None
+        return json.loads(row[4])
+
+    def save_files(self, root: str, stamp: FilesStamp, files: List[Dict[str, Any]]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO item_files VALUES (?, ?, ?, ?, ?, ?)",
+                (root, *stamp, _dumps(files)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,267 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import glob
+import logging
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from .cache import Stamp, file_stamp
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+logger = logging.getLogger(__name__)
+
+
+class Changes(NamedTuple):
+    listing: bool
+    """Item folders were added or removed"""
+    items: Set[str]
+    """Names of item folders that were added or modified"""
+
+
+NO_CHANGES = Changes(listing=False, items=set())
+
+
+def _list_items(root: str) -> Set[str]:
+    with os.scandir(root) as it:
+        return {entry.name for entry in it if entry.is_dir()}
+
+
+def _meta_stamp(root: str, name: str) -> Optional[Tuple[str, Stamp]]:
+    paths = glob.glob(os.path.join(root, name, "meta.*"))
+    if len(paths) != 1:
+        return None
+    try:
+        return paths[0], file_stamp(paths[0])
+    except FileNotFoundError:
+        return None
+
+
+class ChangeDetector:
+    """
+    Tracks item folders of the lines and tells which of them
+    changed since the previous call of ``poll``
+    """
+
+    def watch(self, root: str) -> None:
+        raise NotImplementedError()
+
+    def poll(self, root: str) -> Changes:
+        raise NotImplementedError()
+
+    def unwatch(self, root: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _PolledLine:
+    def __init__(self, root: str) -> None:
+        self.dir_mtime = os.stat(root).st_mtime_ns
+        self.names = _list_items(root)
+        self.metas: Dict[str, Optional[Tuple[str, Stamp]]] = {
+            name: _meta_stamp(root, name) for name in self.names
+        }
+        self.polled_at = time.monotonic()
+
+
+class PollingDetector(ChangeDetector):
+    """
+    Detects changes by comparing stamps of the files
+
+    The folder of the line is listed again only if its mtime or item
+    count changed, meta files of known items are checked with a single stat.
+    Each line is polled at most once in ``interval`` seconds.
+    """
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self._interval = interval
+        self._lines: Dict[str, _PolledLine] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, root: str) -> None:
+        state = _PolledLine(root)
+        with self._lock:
+            self._lines[root] = state
+
+    def unwatch(self, root: str) -> None:
+        with self._lock:
+            self._lines.pop(root, None)
+
+    def poll(self, root: str) -> Changes:
+        with self._lock:
+            state = self._lines.get(root)
+            if state is None:
+                raise KeyError(f"{root} is not watched")
+
+            now = time.monotonic()
+            if now - state.polled_at < self._interval:
+                return NO_CHANGES
+            state.polled_at = now
+
+            listing = False
+            changed = set()
+            dir_mtime = os.stat(root).st_mtime_ns
+            if dir_mtime != state.dir_mtime:
+                state.dir_mtime = dir_mtime
+                names = _list_items(root)
+                if names != state.names:
+                    listing = True
+                    changed.update(names - state.names)
+                    for name in state.names - names:
+                        state.metas.pop(name, None)
+                    state.names = names
+
+            for name in state.names:
+                old = state.metas.get(name)
+                if old is not None:
+                    try:
+                        if file_stamp(old[0]) == old[1]:
+                            continue
+                    except FileNotFoundError:
+                        pass
+                new = _meta_stamp(root, name)
+                if new != old or name in changed:
+                    state.metas[name] = new
+                    changed.add(name)
+
+            return Changes(listing=listing, items=changed)
+
+
+class InotifyDetector(ChangeDetector):
+    """
+    Detects changes using inotify events of the line folders
+    and item folders, requires ``inotify_simple`` package
+
+    Lines that could not be watched e.g. because of watch limits
+    are handed to the polling fallback.
+    """
+
+    def __init__(self, fallback: Optional[ChangeDetector] = None) -> None:
+        if inotify_simple is None:
+            raise ImportError("inotify_simple is required for InotifyDetector")
+
+        flags = inotify_simple.flags
+        self._line_flags = (
+            flags.CREATE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM | flags.ONLYDIR
+        )
+        self._item_flags = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+
+        self._inotify = inotify_simple.INotify()
+        self._fallback = fallback if fallback is not None else PollingDetector()
+        self._polled: Set[str] = set()
+        # wd -> (line root, item name or None for the line folder itself)
+        self._wds: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._pending: Dict[str, Changes] = {}
+        self._lock = threading.Lock()
+
+    def _add_watch(self, root: str, name: Optional[str]) -> None:
+        if name is None:
+            wd = self._inotify.add_watch(root, self._line_flags)
+        else:
+            wd = self._inotify.add_watch(os.path.join(root, name), self._item_flags)
+        self._wds[wd] = (root, name)
+
+    def watch(self, root: str) -> None:
+        with self._lock:
+            try:
+                self._add_watch(root, None)
+                for name in _list_items(root):
+                    self._add_watch(root, name)
+            except OSError as e:
+                logger.warning(f"Falling back to polling for {root}: {e}")
+                self._polled.add(root)
+                self._fallback.watch(root)
+                return
+            self._pending[root] = Changes(listing=False, items=set())
+
+    def _drain(self) -> None:
+        for event in self._inotify.read(timeout=0):
+            target = self._wds.get(event.wd)
+            if target is None:
+                continue
+            root, name = target
+            changes = self._pending.get(root)
+            if changes is None:
+                continue
+
+            if name is not None:
+                changes.items.add(name)
+                continue
+
+            if not event.name:
+                continue
+            changes = changes._replace(listing=True)
+            changes.items.add(event.name)
+            self._pending[root] = changes
+            if event.mask & (inotify_simple.flags.CREATE | inotify_simple.flags.MOVED_TO):
+                try:
+                    self._add_watch(root, event.name)
+                except OSError as e:
+                    # Item folder may be gone already,
+                    # then the change will be seen as removal
+                    logger.debug(f"Failed to watch {event.name} in {root}: {e}")
+
+    def poll(self, root: str) -> Changes:
+        if root in self._polled:
+            return self._fallback.poll(root)
+
+        with self._lock:
+            if root not in self._pending:
+                raise KeyError(f"{root} is not watched")
+            self._drain()
+            changes = self._pending[root]
+            self._pending[root] = Changes(listing=False, items=set())
+            return changes
+
+    def unwatch(self, root: str) -> None:
+        if root in self._polled:
+            self._polled.discard(root)
+            self._fallback.unwatch(root)
+            return
+
+        with self._lock:
+            self._pending.pop(root, None)
+            for wd in [wd for wd, (r, _) in self._wds.items() if r == root]:
+                del self._wds[wd]
+                try:
+                    self._inotify.rm_watch(wd)
+                except OSError:
+                    # Removed already together with the folder
+                    pass
+
+    def close(self) -> None:
+        self._inotify.close()
+
+
+def make_detector(interval: float = 1.0) -> ChangeDetector:
+    """
+    Returns inotify-based detector if it is available
+    and polling detector otherwise
+    """
+    if inotify_simple is not None:
+        try:
+            return InotifyDetector(fallback=PollingDetector(interval))
+        except OSError as e:
+            logger.warning(f"Failed to initialize inotify: {e}")
+    return PollingDetector(interval)
@@ -9,7 +9,7 @@ export async function fetchLineItems(
 ) {
   if (!repoName || !lineName) return;
   const fields = Array.from(new Set(selectedFields));
-  const response = await fetch("/v1/line_item_table", {
+  const response = await fetch("/v1/line_item_table_stream", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({
@@ -17,32 +17,54 @@ export async function fetchLineItems(
       item_fields: fields,
     }),
   });
-  if (response.ok) {
-    const items = await response.json();
-    if (line) {
-      // Merge fetched fields into existing items, preserving other fields
-      if (!Array.isArray(line.items)) {
-        line.items = [];
-      }
-      for (let idx = 0; idx < items.length; idx++) {
-        const fetchedItem = items[idx] as Record<string, any>;
-        let existing = (line.items[idx] as Record<string, any>) || {};
-        // Merge fetched fields into existing item
-        for (const field of Object.keys(fetchedItem)) {
-          existing[field] = fetchedItem[field];
-        }
-        // Ensure defaultFields exist
-        for (const field of defaultFields) {
-          if (!(field in existing)) {
-            existing[field] = "";
-          }
-        }
-        // Cast back to the expected type for line.items
-        line.items[idx] = existing as typeof line.items[number];
+  if (!response.ok || !response.body) return;
+
+  if (line && !Array.isArray(line.items)) {
+    line.items = [];
+  }
+
+  // Merge fetched fields into existing item, preserving other fields
+  function mergeItem(idx: number, fetchedItem: Record<string, any>) {
+    if (!line) return;
+    let existing = (line.items[idx] as Record<string, any>) || {};
+    for (const field of Object.keys(fetchedItem)) {
+      existing[field] = fetchedItem[field];
+    }
+    // Ensure defaultFields exist
+    for (const field of defaultFields) {
+      if (!(field in existing)) {
+        existing[field] = "";
       }
-      // If there are more existing items than fetched, keep the rest as is
-      // If there are fewer, trim the array
-      line.items.length = items.length;
     }
+    // Cast back to the expected type for line.items
+    line.items[idx] = existing as typeof line.items[number];
+  }
+
+  // Rows come as newline-delimited JSON and are merged as soon as they arrive
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let count = 0;
+  while (true) {
+    const { done, value } = await reader.read();
+    if (value) {
+      buffer += decoder.decode(value, { stream: true });
+    }
+    if (done) {
+      buffer += decoder.decode();
+    }
+    const lines = buffer.split("\n");
+    buffer = done ? "" : lines.pop() ?? "";
+    for (const row of lines) {
+      if (!row) continue;
+      mergeItem(count, JSON.parse(row));
+      count++;
+    }
+    if (done) break;
+  }
+
+  if (line) {
+    // If there are more existing items than fetched, trim the array
+    line.items.length = count;
   }
-}
\ No newline at end of file
+}
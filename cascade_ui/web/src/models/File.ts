@@ -1,9 +1,21 @@
 export class File {
     name: string;
-    size: string;
+    size?: string;
+    size_bytes?: number;
 
-    constructor(name: string, size: string) {
+    constructor(name: string, size?: string, size_bytes?: number) {
         this.name = name;
         this.size = size;
+        this.size_bytes = size_bytes;
     }
-}
\ No newline at end of file
+}
+
+export interface ModelFiles {
+    repo: string;
+    line: string;
+    num: number;
+    artifacts: File[];
+    files: File[];
+    total_size: string;
+    total_size_bytes: number;
+}
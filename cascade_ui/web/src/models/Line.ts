@@ -22,6 +22,7 @@ export class Line {
     type: string;
     created_at: string;
     updated_at: string;
+    total: number;
     items: Response[];
     item_fields: string[];
     tags: string[];
@@ -34,6 +35,7 @@ export class Line {
         this.type = line.type;
         this.created_at = line.created_at;
         this.updated_at = line.updated_at;
+        this.total = line.total;
         this.items = line.items;
         this.item_fields = line.item_fields;
         this.tags = line.tags;
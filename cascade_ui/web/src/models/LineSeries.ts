@@ -0,0 +1,26 @@
+export class LineSeries {
+    field: string;
+    nums: number[];
+    values: number[];
+    slugs: (string | null)[];
+    total: number;
+
+    constructor(series: LineSeries) {
+        this.field = series.field;
+        this.nums = series.nums;
+        this.values = series.values;
+        this.slugs = series.slugs;
+        this.total = series.total;
+    }
+}
+
+export interface FieldAggregate {
+    field: string;
+    count: number;
+    min: number | null;
+    max: number | null;
+    mean: number | null;
+    direction: "up" | "down" | null;
+    best: number | null;
+    best_num: number | null;
+}
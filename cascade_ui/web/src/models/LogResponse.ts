@@ -1,7 +1,13 @@
 export class LogResponse {
     log_text: string | null;
+    offset: number;
+    end: number;
+    size: number;
 
     constructor(log: LogResponse) {
         this.log_text = log.log_text
+        this.offset = log.offset
+        this.end = log.end
+        this.size = log.size
     }
-}
\ No newline at end of file
+}
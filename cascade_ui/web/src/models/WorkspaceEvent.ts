@@ -0,0 +1,24 @@
+import type {ItemComment} from "@/models/ItemComment";
+import type {Response} from "@/models/Line";
+
+export type WorkspaceEventType =
+    "reset"
+    | "repo_added"
+    | "repo_removed"
+    | "line_added"
+    | "line_removed"
+    | "item_added"
+    | "item_removed"
+    | "comment_added"
+    | "meta_updated";
+
+export interface WorkspaceEvent {
+    id: string;
+    type: WorkspaceEventType;
+    repo?: string;
+    line?: string;
+    item?: string;
+    comments?: ItemComment[];
+    // The item as in the line table for item_added and meta_updated of items
+    row?: Response;
+}
@@ -0,0 +1,62 @@
+import type {WorkspaceEvent} from "@/models/WorkspaceEvent";
+import type {Response} from "@/models/Line";
+import {ItemComment} from "@/models/ItemComment";
+
+// The browser reconnects by itself and the server replays
+// the missed events or sends a reset event.
+// Events of items are sent only for the line given
+export default function SubscribeEvents(
+  onEvent: (event: WorkspaceEvent) => void,
+  line?: {repo: string, line: string},
+): EventSource {
+  const query = line ? `?${new URLSearchParams({repo: line.repo, line: line.line})}` : '';
+  const source = new EventSource(`http://localhost:8000/v1/events${query}`);
+  source.onmessage = (message: MessageEvent) => {
+    onEvent(JSON.parse(message.data));
+  };
+  return source;
+}
+
+// Appends new comments skipping those already shown e.g. sent from this page
+export function appendComments(comments: ItemComment[], event: WorkspaceEvent): void {
+  const known = new Set(comments.map(comment => comment.id));
+  for (const comment of event.comments ?? []) {
+    if (!known.has(comment.id)) {
+      comments.push(new ItemComment(comment));
+    }
+  }
+}
+
+// Events of one scan come together, so they are followed by a single fetch
+export function batched(fn: () => void, delayMs: number = 200): () => void {
+  let timer: ReturnType<typeof setTimeout> | null = null;
+  return () => {
+    if (timer === null) {
+      timer = setTimeout(() => {
+        timer = null;
+        fn();
+      }, delayMs);
+    }
+  };
+}
+
+// Applies the item event to the rows of the line table keeping the fields
+// fetched for the rows before. Returns false if the line has to be fetched again
+export function patchItems(items: Response[], event: WorkspaceEvent): boolean {
+  const index = items.findIndex(item => item.name === event.item);
+  if (event.type === "item_removed") {
+    if (index >= 0) {
+      items.splice(index, 1);
+    }
+    return true;
+  }
+  if (!event.row || (event.type !== "item_added" && event.type !== "meta_updated")) {
+    return false;
+  }
+  if (index >= 0) {
+    Object.assign(items[index], event.row);
+  } else {
+    items.push({...event.row});
+  }
+  return true;
+}
@@ -0,0 +1,19 @@
+import type {FieldAggregate} from "@/models/LineSeries";
+
+export default async function GetLineAggregates(
+  repo: string, line: string, fields?: string[]
+): Promise<FieldAggregate[]> {
+  return fetch('http://localhost:8000/v1/line_aggregates', {
+    method: "post",
+    headers: {
+      "Access-Control-Allow-Origin": "*",
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify({line_path: {repo: repo, line: line}, fields: fields ?? null})
+  })
+    .then(res => res.json())
+    .then(res => res.fields)
+    .catch(function (error) {
+      console.log(error);
+    });
+}
@@ -0,0 +1,21 @@
+import type {LineSeries} from "@/models/LineSeries";
+
+// Longer series are downsampled on the server to this many points
+export const SERIES_POINTS = 1000;
+
+export default async function GetLineSeries(
+  repo: string, line: string, field: string, points: number = SERIES_POINTS
+): Promise<LineSeries> {
+  return fetch('http://localhost:8000/v1/line_series', {
+    method: "post",
+    headers: {
+      "Access-Control-Allow-Origin": "*",
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify({line_path: {repo: repo, line: line}, field: field, points: points})
+  })
+    .then(res => res.json())
+    .catch(function (error) {
+      console.log(error);
+    });
+}
@@ -1,13 +1,13 @@
 import type {Model} from "@/models/Model";
 
+// GET lets the browser revalidate the cached response with its ETag
 export default async function GetModel(repo: string, line: string, num: number): Promise<Model> {
-  return fetch('http://localhost:8000/v1/model', {
-    method: "post",
+  const params = new URLSearchParams({repo: repo, line: line, num: String(num)});
+  return fetch(`http://localhost:8000/v1/model?${params}`, {
+    method: "get",
     headers: {
-      "Access-Control-Allow-Origin": "*",
-      "Content-Type": "application/json"
-    },
-    body: JSON.stringify({repo: repo, line: line, num: num})
+      "Access-Control-Allow-Origin": "*"
+    }
   })
     .then(res => res.json())
     .catch(function (error) {
@@ -0,0 +1,19 @@
+import type {ModelFiles} from "@/models/File";
+import type {ModelPathSpec} from "@/models/PathSpecs";
+
+// Sizes are requested separately, so the model page does not wait for them
+export default async function GetModelFiles(models: ModelPathSpec[]): Promise<ModelFiles[]> {
+  return fetch('http://localhost:8000/v1/model_files', {
+    method: "post",
+    headers: {
+      "Access-Control-Allow-Origin": "*",
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify({models: models})
+  })
+    .then(res => res.json())
+    .then(res => res.models)
+    .catch(function (error) {
+      console.log(error);
+    });
+}
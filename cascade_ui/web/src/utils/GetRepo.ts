@@ -1,13 +1,13 @@
 import type {Repo} from "@/models/Repo";
 
+// GET lets the browser revalidate the cached response with its ETag
 export default async function GetRepo(path: string): Promise<Repo> {
-  return fetch('http://localhost:8000/v1/repo', {
-    method: "post",
+  const params = new URLSearchParams({repo: path});
+  return fetch(`http://localhost:8000/v1/repo?${params}`, {
+    method: "get",
     headers: {
-      "Access-Control-Allow-Origin": "*",
-      "Content-Type": "application/json"
-    },
-    body: JSON.stringify({repo: path})
+      "Access-Control-Allow-Origin": "*"
+    }
   })
     .then(res => res.json())
     .catch(function (error) {
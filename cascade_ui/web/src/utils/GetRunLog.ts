@@ -1,17 +1,27 @@
 import type {LogResponse} from "@/models/LogResponse";
 import type { ModelPathSpec } from "@/models/PathSpecs";
 
-export default async function GetRunLog(path: ModelPathSpec): Promise<LogResponse> {
+export default async function GetRunLog(path: ModelPathSpec, tailLines?: number): Promise<LogResponse> {
   return fetch('http://localhost:8000/v1/run_log', {
     method: "post",
     headers: {
       "Access-Control-Allow-Origin": "*",
       "Content-Type": "application/json"
     },
-    body: JSON.stringify(path)
+    body: JSON.stringify({ ...path, tail_lines: tailLines })
   })
     .then(res => res.json())
     .catch(function (error) {
       console.log(error);
     });
 }
+
+export function FollowRunLog(path: ModelPathSpec, offset: number): EventSource {
+  const params = new URLSearchParams({
+    repo: path.repo,
+    line: path.line,
+    num: String(path.num),
+    offset: String(offset),
+  });
+  return new EventSource(`http://localhost:8000/v1/run_log/follow?${params}`);
+}
@@ -1,11 +1,11 @@
 import type {Workspace} from "@/models/Workspace";
 
+// GET lets the browser revalidate the cached response with its ETag
 export default async function GetWorkspace(): Promise<Workspace> {
   return fetch('http://localhost:8000/v1/workspace', {
-    method: "post",
+    method: "get",
     headers: {
-      "Access-Control-Allow-Origin": "*",
-      "Content-Type": "application/json"
+      "Access-Control-Allow-Origin": "*"
     }
   })
     .then(res => res.json())
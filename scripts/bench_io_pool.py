@@ -0,0 +1,84 @@
+"""
+Measures cold /v1/line and /v1/repo with different numbers of IO workers
+on a filesystem with injected latency imitating NFS
+
+python scripts/bench_io_pool.py --models 300 --delay-ms 2
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from cascade.models import BasicModel
+from cascade.workspaces import Workspace
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from cascade_ui.cache import MetaCache
+from cascade_ui.models import LinePathSpec, RepoPathSpec
+from cascade_ui.server import Server
+from cascade_ui.watch import PollingDetector
+
+
+class DelayedMetaCache(MetaCache):
+    """
+    Sleeps on every filesystem access the cache does
+    to imitate a high latency filesystem
+    """
+
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self._delay = delay
+
+    def find_meta(self, path, meta_template="meta.*"):
+        time.sleep(self._delay)
+        return super().find_meta(path, meta_template)
+
+    def read_stamped(self, path):
+        time.sleep(self._delay)
+        return super().read_stamped(path)
+
+
+def make_workspace(path: str, n_lines: int, n_models: int) -> None:
+    ws = Workspace(path)
+    repo = ws.add_repo("repo")
+    for _ in range(n_lines):
+        line = repo.add_line()
+        for i in range(n_models):
+            line.save(BasicModel(lr=i / n_models, epochs=i), only_meta=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=4)
+    parser.add_argument("--models", type=int, default=300)
+    parser.add_argument("--delay-ms", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as ws_path:
+        make_workspace(ws_path, args.lines, args.models)
+
+        for workers in args.workers:
+            server = Server(
+                ws_path,
+                meta_cache=DelayedMetaCache(args.delay_ms / 1000),
+                detector=PollingDetector(),
+                io_workers=workers,
+            )
+
+            start = time.perf_counter()
+            server.repo(RepoPathSpec(repo="repo"))
+            repo_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            server.line(LinePathSpec(repo="repo", line="00000"))
+            line_time = time.perf_counter() - start
+
+            print(
+                f"workers={workers:<3} repo: {repo_time * 1000:8.1f} ms  "
+                f"line: {line_time * 1000:8.1f} ms"
+            )
@@ -0,0 +1,90 @@
+"""
+Measures serialization time and size on the wire of the largest responses
+with the default FastAPI path and with the fast path with gzip
+
+python scripts/bench_serialization.py --models 2000 --params 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+from cascade.metrics import Metric
+from cascade.models import BasicModel
+from cascade.workspaces import Workspace
+from fastapi.encoders import jsonable_encoder
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from cascade_ui.models import LinePathSpec, RepoPathSpec
+from cascade_ui.responses import FastJSONResponse
+from cascade_ui.server import Server
+
+
+def make_workspace(path: str, n_models: int, n_params: int) -> None:
+    ws = Workspace(path)
+    line = ws.add_repo("repo").add_line()
+    for i in range(n_models):
+        model = BasicModel(**{f"param_{p}": (i * p) % 17 / 7 for p in range(n_params)})
+        for split in ("train", "val", "test"):
+            model.add_metric(Metric(name="acc", value=i / n_models, split=split))
+        line.save(model, only_meta=True)
+
+
+def default_render(content) -> bytes:
+    # What FastAPI does for a route with a response model
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_render(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(name: str, content, repeat: int) -> None:
+    for label, render in (("default", default_render), ("fast", fast_render)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = render(content)
+        elapsed = (time.perf_counter() - start) / repeat
+
+        print(
+            f"{name:<16} {label:<8} {elapsed * 1000:8.1f} ms  {len(body) / 1024:9.1f} KiB",
+            end="",
+        )
+        for level in (5, 9):
+            start = time.perf_counter()
+            compressed = gzip.compress(body, compresslevel=level)
+            gzip_time = time.perf_counter() - start
+            print(
+                f"  gzip-{level}: {len(compressed) / 1024:8.1f} KiB {gzip_time * 1000:6.1f} ms",
+                end="",
+            )
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", type=int, default=2000)
+    parser.add_argument("--params", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as ws_path:
+        make_workspace(ws_path, args.models, args.params)
+        server = Server(ws_path)
+        line_path = LinePathSpec(repo="repo", line="00000")
+
+        line = server.line(line_path)
+        table = server.line_item_table(line_path, line.item_fields)
+        repo = server.repo(RepoPathSpec(repo="repo"))
+
+        measure("line", line, args.repeat)
+        measure("line_item_table", table, args.repeat)
+        measure("repo", repo, args.repeat)
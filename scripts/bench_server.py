@@ -0,0 +1,293 @@
+"""
+Benchmarks the endpoints of the Server on a generated workspace
+
+Calls every endpoint directly and through the ASGI app and reports
+latency of the first call and p50/p99 of the next ones, meta files read
+per request and peak RSS. Every endpoint runs in a new process, so its
+peak RSS is not raised by the endpoints run before. Results are saved
+as JSON and can be compared with the results of another commit
+
+python scripts/bench_server.py --seed 0 --repos 2 --lines 5 --models 1000 --output new.json
+python scripts/bench_server.py --workspace ws --output new.json --compare old.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from cascade.base import MetaHandler
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+sys.path.append(os.path.join(BASE_DIR, "scripts"))
+
+from create_dummy_workspace import create_dummy_workspace
+
+from cascade_ui.aio import AsyncServer
+from cascade_ui.app import create_app
+from cascade_ui.cache import MetaCache
+from cascade_ui.models import (
+    LinePathSpec,
+    LineRequest,
+    LogRequest,
+    ModelPathSpec,
+    RepoPathSpec,
+)
+from cascade_ui.server import Server
+
+ENDPOINTS = ["workspace", "repo", "line", "line_item_table", "model", "run_log", "run_config"]
+
+
+class ReadCounter:
+    """
+    Counts the meta files read through MetaHandler
+    including the reads done by cascade itself
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._read = MetaHandler.read.__func__
+
+    def install(self) -> None:
+        counter = self
+
+        def read(cls, path):
+            counter.count += 1
+            return counter._read(cls, path)
+
+        MetaHandler.read = classmethod(read)
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def list_targets(
+    ws_path: str,
+) -> Tuple[List[str], List[Tuple[str, str]], List[Tuple[str, str, int]]]:
+    server = Server(ws_path, meta_cache=MetaCache())
+    repos = [repo.name for repo in server.workspace().repos]
+    lines = []
+    models = []
+    for repo in repos:
+        for row in server.repo(RepoPathSpec(repo=repo)).lines:
+            if row.type != "model_line":
+                continue
+            lines.append((repo, row.name))
+            models.extend((repo, row.name, num) for num in range(row.len))
+    return repos, lines, models
+
+
+def make_requests(
+    ws_path: str, rng: random.Random
+) -> Dict[str, Callable[[], Tuple[str, Dict[str, Any]]]]:
+    """
+    For every endpoint a function returning the name of the
+    method and arguments of the next request to a random target
+    """
+    repos, lines, models = list_targets(ws_path)
+
+    def line_path() -> Dict[str, Any]:
+        repo, line = rng.choice(lines)
+        return {"repo": repo, "line": line}
+
+    def model_path() -> Dict[str, Any]:
+        repo, line, num = rng.choice(models)
+        return {"repo": repo, "line": line, "num": num}
+
+    return {
+        "workspace": lambda: {},
+        "repo": lambda: {"repo": rng.choice(repos)},
+        "line": lambda: {**line_path(), "limit": 100},
+        "line_item_table": lambda: {
+            "line_path": line_path(),
+            "item_fields": ["num", "created_at", "saved_at"],
+        },
+        "model": model_path,
+        "run_log": lambda: {**model_path(), "tail_lines": 100},
+        "run_config": model_path,
+    }
+
+
+def call_direct(server: Server, endpoint: str, body: Dict[str, Any]) -> None:
+    if endpoint == "workspace":
+        server.workspace()
+    elif endpoint == "repo":
+        server.repo(RepoPathSpec(**body))
+    elif endpoint == "line":
+        server.line(LineRequest(**body))
+    elif endpoint == "line_item_table":
+        server.line_item_table(LinePathSpec(**body["line_path"]), body["item_fields"])
+    elif endpoint == "run_log":
+        server.run_log(LogRequest(**body))
+    else:
+        getattr(server, endpoint)(ModelPathSpec(**body))
+
+
+def run_direct(ws_path: str, next_body, endpoint: str, repeat: int) -> List[float]:
+    server = Server(ws_path, meta_cache=MetaCache())
+    times = []
+    for _ in range(repeat + 1):
+        body = next_body()
+        start = time.perf_counter()
+        call_direct(server, endpoint, body)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+async def _run_asgi(ws_path: str, next_body, endpoint: str, repeat: int) -> List[float]:
+    handlers = AsyncServer(Server(ws_path, meta_cache=MetaCache()))
+    app = create_app(handlers)
+    transport = httpx.ASGITransport(app=app)
+    times = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(repeat + 1):
+            body = next_body()
+            start = time.perf_counter()
+            response = await client.post(f"/v1/{endpoint}", json=body)
+            response.raise_for_status()
+            times.append(time.perf_counter() - start)
+    handlers.shutdown()
+    return times
+
+
+def run_asgi(ws_path: str, next_body, endpoint: str, repeat: int) -> List[float]:
+    return asyncio.run(_run_asgi(ws_path, next_body, endpoint, repeat))
+
+
+RUNNERS = {"direct": run_direct, "asgi": run_asgi}
+
+
+def measure(ws_path: str, seed: int, mode: str, endpoint: str, repeat: int) -> Dict[str, Any]:
+    """
+    Benchmarks one endpoint, meant to be called in a new process
+    """
+    # Every endpoint gets the same sequence of targets
+    next_body = make_requests(ws_path, random.Random(seed))[endpoint]
+    counter = ReadCounter()
+    counter.install()
+    times = RUNNERS[mode](ws_path, next_body, endpoint, repeat)
+
+    warm = [t * 1000 for t in times[1:]]
+    return {
+        "endpoint": endpoint,
+        "mode": mode,
+        "cold_ms": times[0] * 1000,
+        "p50_ms": percentile(warm, 50),
+        "p99_ms": percentile(warm, 99),
+        "reads_per_request": counter.count / len(times),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], old_path: str) -> None:
+    with open(old_path) as f:
+        old = {(r["endpoint"], r["mode"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {old_path}")
+    for result in results:
+        before = old.get((result["endpoint"], result["mode"]))
+        if before is None:
+            continue
+        print(
+            f"{result['endpoint']:<16} {result['mode']:<7}"
+            f" p50 x{result['p50_ms'] / max(before['p50_ms'], 1e-9):6.2f}"
+            f" p99 x{result['p99_ms'] / max(before['p99_ms'], 1e-9):6.2f}"
+            f" reads {before['reads_per_request']:8.1f} -> {result['reads_per_request']:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workspace", default=None, help="Existing workspace instead of a new one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repos", type=int, default=2)
+    parser.add_argument("--lines", type=int, default=2)
+    parser.add_argument("--models", type=int, default=200)
+    parser.add_argument("--params", type=int, default=20)
+    parser.add_argument("--metrics", type=int, default=5)
+    parser.add_argument("--comments", type=int, default=2)
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", default=["direct", "asgi"])
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS)
+    parser.add_argument("--output", default="bench_server.json")
+    parser.add_argument("--compare", default=None, help="Results of a previous run")
+    args = parser.parse_args()
+
+    tmp = None
+    ws_path = args.workspace
+    if ws_path is None:
+        tmp = tempfile.TemporaryDirectory()
+        ws_path = os.path.join(tmp.name, "ws")
+        start = time.perf_counter()
+        create_dummy_workspace(
+            ws_path,
+            seed=args.seed,
+            repos=args.repos,
+            lines=args.lines,
+            models=args.models,
+            params=args.params,
+            metrics=args.metrics,
+            comments=args.comments,
+            files=args.files,
+            data_lines=False,
+            run_files=True,
+        )
+        print(f"Generated workspace in {time.perf_counter() - start:.1f} s")
+
+    # Spawned, so the children do not start with the memory of this process
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for mode in args.modes:
+        for endpoint in args.endpoints:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    measure, ws_path, args.seed, mode, endpoint, args.repeat
+                ).result()
+            results.append(result)
+            print(
+                f"{endpoint:<16} {mode:<7} cold {result['cold_ms']:9.1f} ms"
+                f"  p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms"
+                f"  reads/req {result['reads_per_request']:8.1f}"
+                f"  peak RSS {result['peak_rss_mb']:7.1f} MiB"
+            )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"commit": git_commit(), "args": vars(args), "results": results}, f, indent=2
+        )
+    print(f"Saved to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if tmp is not None:
+        tmp.cleanup()
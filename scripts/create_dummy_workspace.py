@@ -1,6 +1,19 @@
+"""
+Creates a random workspace for development and benchmarks
+
+Every count is random by default, pass it to make the shape fixed
+and the seed to make the content reproducible
+
+python scripts/create_dummy_workspace.py --seed 0 --repos 2 --lines 5 --models 1000
+"""
+
+import argparse
+import json
 import os
 import random
 import shutil
+import tempfile
+from typing import Optional
 
 from cascade.data import ApplyModifier, RangeSampler, Wrapper
 from cascade.metrics import Metric
@@ -16,29 +29,55 @@ def f(x):
     return x + 1
 
 
-fake = Faker()
+def _count(value: Optional[int], low: int, high: int) -> int:
+    return random.randint(low, high) if value is None else value
+
+
+def create_dummy_workspace(
+    ws_path: str,
+    seed: Optional[int] = None,
+    repos: Optional[int] = None,
+    lines: Optional[int] = None,
+    models: Optional[int] = None,
+    params: Optional[int] = None,
+    metrics: Optional[int] = None,
+    comments: Optional[int] = None,
+    tags: Optional[int] = None,
+    files: Optional[int] = None,
+    data_lines: bool = True,
+    run_files: bool = False,
+) -> Workspace:
+    """
+    Creates the workspace with repos x lines x models
+
+    Counts that are None are random in the same ranges as before.
+    With ``run_files`` every model also gets cascade_run.log
+    and cascade_config.json like the ones written by cascade runs
+    """
+    if seed is not None:
+        random.seed(seed)
+        Faker.seed(seed)
+    fake = Faker()
 
-if __name__ == "__main__":
-    ws_path = os.path.join(BASE_DIR, "dummy_workspace")
     try:
         os.makedirs(ws_path)
     except FileExistsError as e:
         raise FileExistsError("The workspace already exists at this path!") from e
     ws = Workspace(ws_path)
 
-    os.makedirs("tmp", exist_ok=True)
-    for i in range(random.randint(1, 10)):
+    tmp = tempfile.mkdtemp()
+    for i in range(_count(repos, 1, 10)):
         repo = Repo(os.path.join(ws_path, f"repo_of_{fake.word('noun')}_{i}"))
-        for i in range(random.randint(1, 5)):
-            line_type = random.choice(["model", "data"])
+        for i in range(_count(lines, 1, 5)):
+            line_type = random.choice(["model", "data"]) if data_lines else "model"
             line = repo.add_line(line_type=line_type)
 
             if line_type == "model":
-                for i in range(random.randint(0, 10)):
+                for i in range(_count(models, 0, 10)):
                     model = BasicModel()
                     model.describe(fake.text())
 
-                    for _ in range(random.randint(0, 10)):
+                    for _ in range(_count(metrics, 0, 10)):
                         model.add_metric(
                             Metric(
                                 name=fake.word(),
@@ -53,25 +92,33 @@ if __name__ == "__main__":
                             )
                         )
 
-                    for _ in range(random.randint(0, 5)):
+                    for _ in range(_count(files, 0, 5)):
                         name = fake.word()
-                        path = f"tmp/{name}.txt"
+                        path = os.path.join(tmp, f"{name}.txt")
                         with open(path, "w") as file:
                             file.write(name)
                         model.add_file(path)
 
-                    params = {}
-                    for _ in range(random.randint(0, 30)):
-                        params[fake.word("noun")] = fake.random_number()
+                    for _ in range(_count(params, 0, 30)):
+                        model.params[fake.word("noun")] = fake.random_number()
 
-                    for _ in range(random.randint(0, 30)):
+                    for _ in range(_count(comments, 0, 30)):
                         model.comment(fake.sentence())
 
-                    for _ in range(random.randint(0, 20)):
+                    for _ in range(_count(tags, 0, 20)):
                         tag = fake.word().lower()[: min(len(fake.word()), 10)]
                         model.tag(tag)
 
                     line.save(model)
+
+                    if run_files:
+                        files_dir = os.path.join(line.get_root(), f"{i:05d}", "files")
+                        os.makedirs(files_dir, exist_ok=True)
+                        with open(os.path.join(files_dir, "cascade_run.log"), "w") as file:
+                            for step in range(200):
+                                file.write(f"step {step} loss {random.random():.4f}\n")
+                        with open(os.path.join(files_dir, "cascade_config.json"), "w") as file:
+                            json.dump(dict(model.params), file)
             elif line_type == "data":
                 for i in range(random.randint(1, 5)):
                     line = repo.add_line(line_type="data")
@@ -81,10 +128,10 @@ if __name__ == "__main__":
 
                     ds.describe(fake.text())
 
-                    for _ in range(random.randint(0, 30)):
+                    for _ in range(_count(comments, 0, 30)):
                         ds.comment(fake.sentence())
 
-                    for _ in range(random.randint(0, 20)):
+                    for _ in range(_count(tags, 0, 20)):
                         tag = fake.word().lower()[: min(len(fake.word()), 10)]
                         ds.tag(tag)
 
@@ -92,4 +139,31 @@ if __name__ == "__main__":
             else:
                 raise Exception()
 
-    shutil.rmtree("tmp")
+    shutil.rmtree(tmp)
+    return ws
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=os.path.join(BASE_DIR, "dummy_workspace"))
+    parser.add_argument("--seed", type=int, default=None)
+    for name in ("repos", "lines", "models", "params", "metrics", "comments", "tags", "files"):
+        parser.add_argument(f"--{name}", type=int, default=None)
+    parser.add_argument("--no-data-lines", action="store_true")
+    parser.add_argument("--run-files", action="store_true")
+    args = parser.parse_args()
+
+    create_dummy_workspace(
+        args.path,
+        seed=args.seed,
+        repos=args.repos,
+        lines=args.lines,
+        models=args.models,
+        params=args.params,
+        metrics=args.metrics,
+        comments=args.comments,
+        tags=args.tags,
+        files=args.files,
+        data_lines=not args.no_data_lines,
+        run_files=args.run_files,
+    )
@@ -24,8 +24,12 @@ setuptools.setup(
     python_requires=">=3.8",
     install_requires=[
         "cascade-ml>=0.16.0",
-        "fastapi>=0.110.0",
+        "fastapi>=0.115.0",
         "uvicorn>=0.29.0",
         "pydantic>=2.6.4",
     ],
+    extras_require={
+        "inotify": ["inotify_simple"],
+        "arrow": ["pyarrow"],
+    },
 )
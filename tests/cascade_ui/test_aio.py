@@ -0,0 +1,326 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+from typing import Dict, Optional
+
+import pytest
+from cascade.models import BasicModel
+from fastapi import Response
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui import server as server_module
+from cascade_ui.aio import CLIENT_CLOSED_REQUEST, AsyncServer
+from cascade_ui.app import create_app
+from cascade_ui.pool import IOPool, cancel_event
+from cascade_ui.responses import IteratorResponse
+from cascade_ui.server import LinePathSpec, ModelPathSpec, RepoPathSpec, Server
+from cascade_ui.watch import PollingDetector
+
+
+class FakeRequest:
+    def __init__(self, headers: Optional[Dict[str, str]] = None) -> None:
+        self.disconnected = False
+        self.headers = headers or {}
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.mark.asyncio
+async def test_same_as_sync(workspace):
+    server = Server(workspace.get_root())
+    handlers = AsyncServer(server)
+
+    path = LinePathSpec(repo="repo", line="00000")
+    line = await handlers.line(path, FakeRequest(), Response())
+    assert json.loads(line.body) == server.line(path).model_dump(mode="json")
+    assert (await handlers.version()) == server.version()
+
+
+@pytest.mark.asyncio
+async def test_scan_cancelled_on_disconnect(workspace):
+    handlers = AsyncServer(Server(workspace.get_root()), disconnect_poll_interval=0.01)
+    pool = IOPool(workers=1)
+    done = []
+
+    def read(i):
+        time.sleep(0.01)
+        done.append(i)
+
+    request = FakeRequest()
+    scan = asyncio.ensure_future(handlers._scan(request, pool.map, read, range(1000)))
+    await asyncio.sleep(0.05)
+    request.disconnected = True
+
+    resp = await scan
+    assert resp.status_code == CLIENT_CLOSED_REQUEST
+
+    await asyncio.sleep(0.05)
+    assert len(done) < 1000
+
+
+@pytest.mark.asyncio
+async def test_scan_limit(workspace):
+    handlers = AsyncServer(Server(workspace.get_root()), scan_limit=1)
+    running = []
+    peak = []
+
+    def scan():
+        running.append(1)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.pop()
+
+    await asyncio.gather(*[handlers._scan(FakeRequest(), scan) for _ in range(3)])
+    assert max(peak) == 1
+
+
+@pytest.mark.asyncio
+async def test_scan_stream(workspace):
+    handlers = AsyncServer(Server(workspace.get_root()), scan_limit=1)
+    reads = []
+
+    def rows():
+        for i in range(3):
+            reads.append((threading.current_thread().name, cancel_event.get() is not None))
+            yield b"%d\n" % i
+
+    response = await handlers._scan_stream(FakeRequest(), IteratorResponse, rows())
+    chunks = response.body_iterator
+    assert await chunks.__anext__() == b"0\n"
+
+    # The slot is held while the body is sent
+    other = asyncio.ensure_future(handlers._scan(FakeRequest(), lambda: "done"))
+    await asyncio.sleep(0.05)
+    assert not other.done()
+
+    assert [chunk async for chunk in chunks] == [b"1\n", b"2\n"]
+    assert await other == "done"
+    assert all(name.startswith("cascade_ui_handler") and scoped for name, scoped in reads)
+
+
+@pytest.mark.asyncio
+async def test_line_etag_in_scan(workspace):
+    server = Server(workspace.get_root())
+    handlers = AsyncServer(server, scan_limit=1)
+    path = LinePathSpec(repo="repo", line="00000")
+    release = threading.Event()
+
+    busy = asyncio.ensure_future(handlers._scan(FakeRequest(), release.wait))
+    try:
+        await asyncio.sleep(0.01)
+        # The ETag of a line not indexed yet takes a scan slot as the body does
+        request = FakeRequest({"if-none-match": '"x"'})
+        line = asyncio.ensure_future(handlers.line(path, request, Response()))
+        await asyncio.sleep(0.05)
+        assert not line.done()
+        assert not server._line_indexes
+    finally:
+        release.set()
+        await busy
+    assert (await line).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_run_log_follow(workspace):
+    server = Server(workspace.get_root())
+    handlers = AsyncServer(server, follow_interval=0.01)
+    request = FakeRequest()
+
+    log_file = server.run_log_path(ModelPathSpec(repo="repo", line="00000", num=0))
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    with open(log_file, "w") as f:
+        f.write("first\n")
+
+    response = await handlers.run_log_follow("repo", "00000", 0, request, offset=0)
+    events = response.body_iterator
+
+    first = json.loads((await events.__anext__())[len("data: "):])
+    assert first == {"text": "first\n", "offset": 0, "end": 6}
+
+    with open(log_file, "a") as f:
+        f.write("second\n")
+    second = json.loads((await events.__anext__())[len("data: "):])
+    assert second == {"text": "second\n", "offset": 6, "end": 13}
+
+    request.disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await events.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_streamed_chunk_not_held_by_gzip(workspace):
+    line = workspace["repo"]["00000"]
+    for a in range(3):
+        line.save(BasicModel(a=a), only_meta=True)
+    app = create_app(AsyncServer(Server(workspace.get_root())))
+
+    request = json.dumps(
+        {"line_path": {"repo": "repo", "line": "00000"}, "item_fields": ["num", "params.a"]}
+    ).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/line_item_table_stream",
+        "raw_path": b"/v1/line_item_table_stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip"), (b"content-type", b"application/json")],
+        "server": ("test", 80),
+        "client": ("test", 1),
+    }
+    received = []
+    messages = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": request, "more_body": False}
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    start, first = messages[:2]
+    assert b"content-encoding" not in dict(start["headers"])
+    # Every row is sent as soon as it is read
+    assert json.loads(first["body"]) == {"num": 0, "params.a": None}
+    assert first["more_body"]
+
+
+@pytest.mark.asyncio
+async def test_events_stream(workspace, monkeypatch):
+    monkeypatch.setattr(server_module, "EVENTS_INTERVAL", 0)
+    server = Server(workspace.get_root())
+    handlers = AsyncServer(server, follow_interval=0.01)
+    request = FakeRequest()
+
+    response = await handlers.events(request)
+    events = response.body_iterator
+    assert (await events.__anext__()).startswith("retry: ")
+
+    workspace["repo"].add_line("other", model_cls=BasicModel)
+    message = await events.__anext__()
+    event_id, data = message.strip().split("\n")
+    assert event_id == f"id: {json.loads(data[len('data: '):])['id']}"
+    assert json.loads(data[len("data: "):])["type"] == "line_added"
+
+    # Reconnecting client gets what it missed
+    workspace["repo"].add_line("third", model_cls=BasicModel)
+    response = await handlers.events(request, last_event_id=event_id[len("id: "):])
+    events = response.body_iterator
+    await events.__anext__()
+    missed = [json.loads((await events.__anext__()).split("data: ")[1]) for _ in range(2)]
+    assert [(e["type"], e.get("line")) for e in missed] == [
+        ("meta_updated", None),
+        ("line_added", "third"),
+    ]
+
+    # The stream ends after the events already found
+    request.disconnected = True
+    assert all(message.startswith("id: ") for message in [m async for m in events])
+
+
+@pytest.mark.asyncio
+async def test_line_events(workspace, monkeypatch):
+    monkeypatch.setattr(server_module, "EVENTS_INTERVAL", 0)
+    server = Server(workspace.get_root())
+    handlers = AsyncServer(server, follow_interval=0.01)
+    request = FakeRequest()
+
+    response = await handlers.events(request, repo="repo", line="00000")
+    events = response.body_iterator
+    await events.__anext__()
+
+    workspace["repo"]["00000"].save(BasicModel(), only_meta=True)
+    types = {}
+    while "item_added" not in types:
+        event = json.loads((await events.__anext__()).split("data: ")[1])
+        types[event["type"]] = event
+    assert types["item_added"]["row"]["name"] == "00001"
+
+    request.disconnected = True
+    [message async for message in events]
+    assert server._change_feed()._subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_not_modified(workspace):
+    handlers = AsyncServer(Server(workspace.get_root()))
+    path = RepoPathSpec(repo="repo")
+
+    response = Response()
+    repo = await handlers.repo(path, FakeRequest(), response)
+    etag = repo.headers["etag"]
+    assert json.loads(repo.body)["name"] == "repo"
+    assert repo.headers["cache-control"] == "no-cache"
+
+    cached = await handlers.repo(path, FakeRequest({"if-none-match": etag}), Response())
+    assert cached.status_code == 304
+
+    workspace["repo"].add_line(model_cls=BasicModel)
+    repo = await handlers.repo(path, FakeRequest({"if-none-match": etag}), Response())
+    assert len(json.loads(repo.body)["lines"]) == 2
+    assert repo.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_line_not_modified(workspace):
+    server = Server(workspace.get_root(), detector=PollingDetector(interval=0))
+    handlers = AsyncServer(server)
+    path = LinePathSpec(repo="repo", line="00000")
+
+    line = await handlers.line(path, FakeRequest(), Response())
+    etag = line.headers["etag"]
+    cached = await handlers.line(path, FakeRequest({"if-none-match": etag}), Response())
+    assert cached.status_code == 304
+
+    workspace["repo"]["00000"].save(BasicModel(), only_meta=True)
+    line = await handlers.line(path, FakeRequest({"if-none-match": etag}), Response())
+    assert json.loads(line.body)["len"] == 2
+
+    log = await handlers.run_log(ModelPathSpec(repo="repo", line="00000", num=0), FakeRequest())
+    cached = await handlers.run_log(
+        ModelPathSpec(repo="repo", line="00000", num=0),
+        FakeRequest({"if-none-match": log.headers["etag"]}),
+    )
+    assert cached.status_code == 304
+
+    model_path = ModelPathSpec(repo="repo", line="00000", num=0)
+    model = await handlers.model(model_path, FakeRequest(), Response())
+    artifacts = os.path.join(workspace.get_root(), "repo", "00000", "00000", "artifacts")
+    os.makedirs(artifacts, exist_ok=True)
+    with open(os.path.join(artifacts, "added.bin"), "wb") as f:
+        f.write(b"0")
+    model = await handlers.model(
+        model_path, FakeRequest({"if-none-match": model.headers["etag"]}), Response()
+    )
+    assert len(json.loads(model.body)["artifacts"]) == 1
@@ -0,0 +1,97 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+import pytest
+from cascade.base import MetaHandler, ZeroMetaError
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.cache import DirCache, MetaCache
+from cascade_ui.server import LinePathSpec, Server
+
+
+def test_hit_and_invalidation(tmp_path):
+    path = str(tmp_path / "meta.json")
+    MetaHandler.write(path, [{"a": 1}])
+
+    cache = MetaCache()
+    assert cache.read(path) == [{"a": 1}]
+    assert cache.read(path) == [{"a": 1}]
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    MetaHandler.write(path, [{"a": 22}])
+    assert cache.read(path) == [{"a": 22}]
+    assert cache.misses == 2
+
+
+def test_lru_eviction(tmp_path):
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"meta_{i}.json")
+        MetaHandler.write(path, [{"value": i}])
+        paths.append(path)
+
+    size = os.path.getsize(paths[0])
+    cache = MetaCache(max_bytes=size * 2)
+    for path in paths:
+        cache.read(path)
+
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.entries == 2
+    assert stats.size_bytes <= stats.max_bytes
+
+
+def test_read_dir_zero_meta(tmp_path):
+    cache = MetaCache()
+    with pytest.raises(ZeroMetaError):
+        cache.read_dir(str(tmp_path))
+
+
+def test_dir_cache(tmp_path):
+    os.makedirs(tmp_path / "b")
+    os.makedirs(tmp_path / "a")
+    MetaHandler.write(str(tmp_path / "meta.json"), [{"a": 1}])
+
+    dirs = DirCache()
+    listing = dirs.listing(str(tmp_path))
+    assert listing.dirs == ["a", "b"]
+    assert dirs.find_meta(str(tmp_path)) == str(tmp_path / "meta.json")
+    assert dirs.listing(str(tmp_path)) is listing
+
+    os.rmdir(tmp_path / "a")
+    os.remove(tmp_path / "meta.json")
+    assert dirs.list_dirs(str(tmp_path)) == ["b"]
+    with pytest.raises(ZeroMetaError):
+        dirs.find_meta(str(tmp_path))
+
+
+def test_server_shares_cache(workspace):
+    cache = MetaCache()
+    s = Server(workspace.get_root(), meta_cache=cache)
+
+    s.line(LinePathSpec(repo="repo", line="00000"))
+    misses = s.cache_stats().misses
+    assert misses > 0
+
+    s.line_item_table(LinePathSpec(repo="repo", line="00000"), ["num", "slug"])
+    assert s.cache_stats().misses == misses
@@ -0,0 +1,92 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import sys
+
+from cascade.base import MetaHandler
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui import server as server_module
+from cascade_ui.events import EventLog
+from cascade_ui.models import AddCommentRequest
+from cascade_ui.server import Server
+
+
+def test_event_log():
+    log = EventLog("a", size=2)
+    start = log.last_id
+    log.append("repo_added", ("r1", None, None))
+    assert [e["repo"] for e in log.since(start)] == ["r1"]
+    assert log.since(log.last_id) == []
+
+    log.append("repo_added", ("r2", None, None))
+    log.append("repo_added", ("r3", None, None))
+    # The first event is gone, so the client has to reset
+    assert [e["type"] for e in log.since(start)] == ["reset"]
+    assert [e["type"] for e in log.since("b:1")] == ["reset"]
+    assert [e["repo"] for e in log.since("a:1")] == ["r2", "r3"]
+
+
+def test_workspace_events(workspace, monkeypatch):
+    monkeypatch.setattr(server_module, "EVENTS_INTERVAL", 0)
+    s = Server(workspace.get_root())
+    s.subscribe("repo", "00000")
+    last_id = s.last_event_id()
+    assert s.events(last_id) == []
+
+    line = workspace["repo"]["00000"]
+    line.save(BasicModel())
+    s.add_comment(AddCommentRequest(comment="Looks good", path_parts=["repo", "00000", "00000"]))
+    s.add_comment(AddCommentRequest(comment="Repo note", path_parts=["repo"]))
+    repo = workspace["repo"]
+    repo.add_line("other", model_cls=BasicModel)
+    shutil.rmtree(os.path.join(line.get_root(), "00001"))
+
+    events = s.events(last_id)
+    summary = {(e.type, e.repo, e.line, e.item) for e in events}
+    assert ("comment_added", "repo", "00000", "00000") in summary
+    assert ("comment_added", "repo", None, None) in summary
+    assert ("line_added", "repo", "other", None) in summary
+    # Added and removed before the scan
+    assert not {e for e in summary if e[3] == "00001"}
+
+    comments = [e.comments for e in events if e.type == "comment_added" and e.line]
+    assert [c.message for c in comments[0]] == ["Looks good"]
+
+    last_id = events[-1].id
+    line.save(BasicModel())
+    events = s.events(last_id)
+    assert {(e.type, e.line) for e in events} == {
+        ("item_added", "00000"),
+        ("meta_updated", "00000"),
+    }
+    # The item is sent with the event, so the line view does not fetch the line again
+    added = [e for e in events if e.type == "item_added"][0]
+    assert added.row.name == added.item
+    meta = MetaHandler.read_dir(os.path.join(line.get_root(), added.item))
+    assert added.row.slug == meta[0]["slug"]
+
+    # Items of the lines nobody follows are not checked
+    last_id = events[-1].id
+    repo["other"].save(BasicModel())
+    events = s.events(last_id)
+    assert {(e.type, e.line) for e in events} == {("meta_updated", "other")}
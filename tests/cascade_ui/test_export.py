@@ -0,0 +1,119 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import csv
+import io
+import os
+import sys
+
+import pydantic
+import pytest
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui import export
+from cascade_ui.models import ExportRequest, LineQuery
+from cascade_ui.server import Server
+
+
+def body(response) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(collect())
+
+
+def test_value_kind():
+    assert export.value_kind([None, 1, 2]) == "int"
+    assert export.value_kind([1, 2.5]) == "float"
+    assert export.value_kind([True, 1]) == "string"
+    assert export.value_kind([None]) is None
+    assert export.merge_kinds("int", None) == "int"
+    assert export.merge_kinds("int", "float") == "float"
+    assert export.merge_kinds("bool", "float") == "string"
+
+
+def test_export_csv(workspace):
+    line = workspace["repo"]["00000"]
+    for lr in (0.1, 0.01):
+        line.save(BasicModel(lr=lr, layers=[1, 2]), only_meta=True)
+    workspace["repo"].add_line("other", model_cls=BasicModel).save(BasicModel(lr=1), only_meta=True)
+
+    s = Server(workspace.get_root())
+    response = s.export(
+        ExportRequest(
+            repo="repo",
+            query=LineQuery(sort_by="params.lr", descending=True, limit=2),
+            item_fields=["params.lr", "params.layers.1"],
+            batch_size=1,
+        )
+    )
+    assert response.media_type == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(body(response).decode())))
+    assert [(row["line"], row["num"], row["params.lr"]) for row in rows] == [
+        ("00000", "1", "0.1"),
+        ("00000", "2", "0.01"),
+        ("other", "0", "1"),
+    ]
+    assert rows[0]["params.layers.1"] == "2"
+    # Lists are written as JSON
+    assert rows[0]["tags"] == "[]"
+
+    # All item fields of the lines by default
+    response = s.export(ExportRequest(repo="repo", line="other"))
+    header = body(response).decode().splitlines()[0].split(",")
+    assert header[: len(export.ITEM_COLUMNS)] == export.ITEM_COLUMNS
+    assert "params.lr" in header
+
+
+@pytest.mark.skipif(export.pa is None, reason="pyarrow is not installed")
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+def test_export_arrow(workspace, format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    line = workspace["repo"]["00000"]
+    for lr in (0.1, 1):
+        line.save(BasicModel(lr=lr), only_meta=True)
+
+    s = Server(workspace.get_root())
+    response = s.export(
+        ExportRequest(
+            repo="repo", line="00000", item_fields=["params.lr"], format=format, batch_size=1
+        )
+    )
+    data = body(response)
+    if format == "arrow":
+        table = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    else:
+        table = pq.read_table(pa.BufferReader(data))
+    assert table.schema.field("params.lr").type == pa.float64()
+    assert table.column("params.lr").to_pylist() == [None, 0.1, 1.0]
+
+
+def test_export_line_without_repo():
+    with pytest.raises(pydantic.ValidationError):
+        ExportRequest(line="00000")
+
+
+def test_export_without_pyarrow(workspace, monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    with pytest.raises(ImportError):
+        Server(workspace.get_root()).export(ExportRequest(repo="repo", format="parquet"))
@@ -0,0 +1,298 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import sys
+
+from cascade.base import MetaHandler
+from cascade.base.utils import flatten_dict
+from cascade.metrics import Metric
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.cache import MetaCache
+from cascade_ui.flatten import Flattener
+from cascade_ui.index import LineIndex, prepare_item_dict
+from cascade_ui.models import FieldRange, LeaderboardQuery, LineQuery, LineRequest
+from cascade_ui.server import LinePathSpec, Server
+from cascade_ui.watch import PollingDetector
+
+
+def save_model(line, **params):
+    model = BasicModel(**params)
+    model.add_metric(Metric(name="acc", value=params.get("a", 0) / 10, split="val"))
+    line.save(model)
+
+
+def test_flatten():
+    meta = {
+        "params": {"lr": 0.1, "layers": [8, {"act": "relu"}], "empty": {}},
+        "comments": [{"id": "1", "user": "u", "message": "LR bug"}],
+        "git_uncommitted_changes": ["M a.py"],
+        "links": [{"name": "data"}],
+        "tags": ["a"],
+        "metrics": [{"name": "acc", "value": 0.5, "split": "val"}],
+        "slug": "fair_squid",
+    }
+    expected = flatten_dict(meta, separator=".", root_keys_to_ignore=("tags", "metrics"))
+    flattener = Flattener()
+    for _ in range(2):
+        # The second time the paths are taken from the memo
+        flat = flattener.flatten(meta)
+        assert {key: expected[key] for key in flat} == flat
+
+    assert set(expected) - set(flat) == {
+        "comments.0.id",
+        "comments.0.user",
+        "git_uncommitted_changes.0",
+        "links.0.name",
+    }
+
+    assert prepare_item_dict([meta], fields=["params.layers.1.act", "metrics.acc_val", "x"]) == {
+        "params.layers.1.act": "relu",
+        "metrics.acc_val": 0.5,
+    }
+
+
+def test_table(workspace):
+    line = workspace["repo"]["00000"]
+    save_model(line, a=1)
+    save_model(line, a=2, b={"c": 3})
+
+    s = Server(workspace.get_root())
+    resp = s.line(LinePathSpec(repo="repo", line="00000"))
+    assert resp.item_fields == sorted(resp.item_fields)
+    assert "params.a" in resp.item_fields
+    assert "params.b.c" in resp.item_fields
+    assert "slug" not in resp.item_fields
+    assert "metrics.acc_val" in resp.plot_fields
+
+    table = s.line_item_table(LinePathSpec(repo="repo", line="00000"), ["num", "params.a"])
+    assert table == [
+        {"num": 0, "params.a": None},
+        {"num": 1, "params.a": 1},
+        {"num": 2, "params.a": 2},
+    ]
+
+
+def test_sync_appends_and_updates(workspace):
+    line = workspace["repo"]["00000"]
+    index = LineIndex(line.get_root(), MetaCache())
+    assert index.sync(line.get_item_names())
+    assert not index.sync(line.get_item_names())
+    version = index.version
+
+    save_model(line, a=5)
+    line.reload()
+    assert index.sync(line.get_item_names())
+    assert index.version == version + 1
+    assert index.column("params.a") == [None, 5]
+
+    model_line = workspace["repo"]["00000"]
+    model_line.save(BasicModel(a=7), only_meta=True)
+    model_line.reload()
+    index.sync(model_line.get_item_names())
+    assert index.column("num") == [0, 1, 2]
+    assert index.column("params.a") == [None, 5, 7]
+
+    meta_dir = os.path.join(line.get_root(), "00001")
+    meta = MetaHandler.read_dir(meta_dir)
+    meta[0]["params"]["a"] = 6
+    MetaHandler.write_dir(meta_dir, meta)
+    assert index.sync(model_line.get_item_names())
+    assert index.column("params.a") == [None, 6, 7]
+
+
+def test_items_without_meta_are_skipped(workspace):
+    line = workspace["repo"]["00000"]
+    os.makedirs(os.path.join(line.get_root(), "00001"))
+    save_model(line, a=1)
+    line.reload()
+
+    index = LineIndex(line.get_root(), MetaCache())
+    index.sync(line.get_item_names())
+    assert len(index) == 2
+    assert index.column("num") == [0, 2]
+
+
+def test_series(workspace):
+    line = workspace["repo"]["00000"]
+    save_model(line, a=1, opt="adam")
+    save_model(line, a=2, opt="sgd")
+    save_model(line, a=True)
+
+    s = Server(workspace.get_root())
+    series = s.line_series(LinePathSpec(repo="repo", line="00000"), "params.a")
+    assert series.nums == [1, 2]
+    assert series.values == [1.0, 2.0]
+    assert len(series.slugs) == 2
+    assert all(series.slugs)
+
+    series = s.line_series(LinePathSpec(repo="repo", line="00000"), "params.opt")
+    assert series.nums == []
+
+
+def test_aggregates_and_downsampling(workspace):
+    line = workspace["repo"]["00000"]
+    for a in range(100):
+        model = BasicModel(a=a % 7)
+        model.add_metric(Metric(name="loss", value=abs(50 - a), direction="down"))
+        line.save(model, only_meta=True)
+    line.reload()
+
+    index = LineIndex(line.get_root(), MetaCache())
+    index.sync(line.get_item_names())
+
+    loss, param = index.aggregates(["metrics.loss", "params.a"])
+    assert (loss.count, loss.min, loss.max, loss.direction) == (100, 0.0, 50.0, "down")
+    assert (loss.best, loss.best_num) == (0.0, 51)
+    assert param.direction is None and param.best is None
+    assert param.mean == sum(a % 7 for a in range(100)) / 100
+    assert index.aggregate("params.missing").count == 0
+
+    nums, values, _, total = index.series("metrics.loss", points=10)
+    assert total == 100
+    assert len(nums) == 10
+    # The ends and the minimum are kept
+    assert nums[0] == 1 and nums[-1] == 100
+    assert 0.0 in values
+
+
+def test_select(workspace):
+    line = workspace["repo"]["00000"]
+    for a in [3, 1, 2]:
+        model = BasicModel(a=a)
+        if a > 1:
+            model.tag("good")
+        line.save(model)
+    line.reload()
+
+    index = LineIndex(line.get_root(), MetaCache())
+    index.sync(line.get_item_names())
+
+    rows, total = index.select(LineQuery(sort_by="params.a"))
+    assert total == 4
+    assert index.column("num", rows) == [2, 3, 1, 0]
+
+    rows, _ = index.select(LineQuery(sort_by="params.a", descending=True))
+    assert index.column("num", rows) == [1, 3, 2, 0]
+
+    rows, total = index.select(LineQuery(tag="good", sort_by="params.a", limit=1))
+    assert total == 2
+    assert index.column("params.a", rows) == [2]
+
+    rows, total = index.select(LineQuery(ranges=[FieldRange(field="params.a", max=2.5)]))
+    assert total == 2
+    assert index.column("num", rows) == [2, 3]
+
+    slug = index.column("slug")[1]
+    rows, total = index.select(LineQuery(slug_prefix=slug))
+    assert total == 1
+    assert rows == [1]
+
+
+def test_tag_filter_without_tags(workspace):
+    line = workspace["repo"]["00000"]
+    save_model(line, a=1)
+    line.reload()
+
+    index = LineIndex(line.get_root(), MetaCache())
+    index.sync(line.get_item_names())
+    assert index.select(LineQuery(tag="good")) == ([], 0)
+    # Rows without the column match no tag either
+    del index._columns["tags"]
+    assert index.select(LineQuery(tag="good")) == ([], 0)
+
+
+def test_orders_updated_on_sync(workspace):
+    line = workspace["repo"]["00000"]
+    for a in range(20):
+        save_model(line, a=(a * 7) % 11)
+    line.reload()
+
+    index = LineIndex(line.get_root(), MetaCache())
+    index.sync(line.get_item_names())
+    sort = LineQuery(sort_by="params.a", descending=True)
+    index.select(sort)
+    index.top("metrics.acc_val", 5)
+    orders = index._orders["params.a"]
+
+    meta_dir = os.path.join(line.get_root(), "00003")
+    meta = MetaHandler.read_dir(meta_dir)
+    meta[0]["params"]["a"] = 4
+    MetaHandler.write_dir(meta_dir, meta)
+    shutil.rmtree(os.path.join(line.get_root(), "00007"))
+    save_model(line, a=4)
+    line.reload()
+    index.sync(line.get_item_names())
+
+    # Only the changed rows are moved in the orders
+    assert index._orders["params.a"] is orders
+    fresh = LineIndex(line.get_root(), MetaCache())
+    fresh.sync(line.get_item_names())
+    for query in (sort, LineQuery(sort_by="params.a"), LineQuery(sort_by="params.b")):
+        assert index.select(query) == fresh.select(query)
+    for descending in (True, False):
+        assert index.top("metrics.acc_val", 5, descending) == fresh.top(
+            "metrics.acc_val", 5, descending
+        )
+
+
+def test_line_pagination(workspace):
+    line = workspace["repo"]["00000"]
+    for _ in range(4):
+        line.save(BasicModel())
+
+    s = Server(workspace.get_root())
+    resp = s.line(LineRequest(repo="repo", line="00000", offset=1, limit=2))
+    assert resp.total == 5
+    assert [item.name for item in resp.items] == ["00001", "00002"]
+
+
+def test_query_across_lines(workspace):
+    repo = workspace["repo"]
+    first = repo["00000"]
+    save_model(first, a=3)
+    save_model(first, a=9)
+    second = repo.add_line(model_cls=BasicModel)
+    save_model(second, a=5)
+    other = workspace.add_repo("other").add_line(model_cls=BasicModel)
+    save_model(other, a=7, lr=0.1)
+
+    s = Server(workspace.get_root(), detector=PollingDetector(interval=0))
+    resp = s.query(LeaderboardQuery(metric="metrics.acc_val", k=3, item_fields=["params.a"]))
+    assert resp.total == 4
+    assert [(e.repo, e.line, e.num) for e in resp.entries] == [
+        ("repo", "00000", 2),
+        ("other", "00000", 0),
+        ("repo", "00001", 0),
+    ]
+    assert [e.fields["params.a"] for e in resp.entries] == [9, 7, 5]
+
+    resp = s.query(LeaderboardQuery(metric="metrics.acc_val", repo="repo", k=1, descending=False))
+    assert resp.entries[0].value == 0.3
+
+    resp = s.query(LeaderboardQuery(metric="metrics.acc_val", equals={"params.lr": 0.1}))
+    assert [e.repo for e in resp.entries] == ["other"]
+
+    # New items are picked up by the indexes of the lines
+    save_model(second, a=10)
+    resp = s.query(LeaderboardQuery(metric="metrics.acc_val", k=1))
+    assert (resp.entries[0].line, resp.entries[0].value) == ("00001", 1.0)
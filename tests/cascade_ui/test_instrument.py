@@ -0,0 +1,85 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+import httpx
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.aio import AsyncServer
+from cascade_ui.app import create_app
+from cascade_ui.cache import MetaCache
+from cascade_ui.instrument import RequestStats, current_request
+from cascade_ui.pool import IOPool
+from cascade_ui.server import LinePathSpec, Server
+
+
+def test_spans_recorded_across_pool(workspace):
+    server = Server(workspace.get_root(), meta_cache=MetaCache(), io_workers=4)
+    stats = RequestStats("/v1/line")
+    token = current_request.set(stats)
+    try:
+        server.line(LinePathSpec(repo="repo", line="00000"))
+    finally:
+        current_request.reset(token)
+
+    assert {"parse", "list", "flatten", "validate"} <= set(stats.spans)
+    assert stats.counts["cache_miss"] > 0
+    assert stats.counts["fs_list"] > 0
+
+
+def test_pool_keeps_context():
+    stats = RequestStats("test")
+    token = current_request.set(stats)
+    try:
+        seen = IOPool(workers=4).map(lambda _: current_request.get(), range(8))
+    finally:
+        current_request.reset(token)
+    assert all(s is stats for s in seen)
+
+
+@pytest.mark.asyncio
+async def test_server_timing_and_metrics(workspace, tmp_path_factory):
+    profile_dir = str(tmp_path_factory.mktemp("profiles"))
+    handlers = AsyncServer(Server(workspace.get_root(), meta_cache=MetaCache()))
+    app = create_app(handlers, profile_slowest=1, profile_dir=profile_dir)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/v1/line", json={"repo": "repo", "line": "00000"})
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        assert "parse;dur=" in timing
+        assert "total;dur=" in timing
+
+        await client.get("/v1/workspace")
+        for i in range(3):
+            assert (await client.get(f"/v1/missing_{i}")).status_code == 404
+        metrics = (await client.get("/v1/metrics")).text
+
+    assert 'cascade_ui_request_duration_seconds_count{route="/v1/line"} 1' in metrics
+    assert 'cascade_ui_phase_seconds_total{route="/v1/line",phase="parse"}' in metrics
+    # Unmatched paths share one series
+    assert 'cascade_ui_request_duration_seconds_count{route="other"} 3' in metrics
+    assert "/v1/missing" not in metrics
+    assert "cascade_ui_meta_cache_misses" in metrics
+    assert len(os.listdir(profile_dir)) == 1
+    handlers.shutdown()
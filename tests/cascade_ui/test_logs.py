@@ -0,0 +1,90 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.logs import read_lines, read_range, read_tail
+from cascade_ui.models import LogRequest
+from cascade_ui.server import Server
+
+TEXT = "".join(f"line {i}\n" for i in range(10))
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "cascade_run.log"
+    path.write_text(TEXT)
+    return str(path)
+
+
+def test_read_range(log_file):
+    text, start, end = read_range(log_file, 7, 7)
+    assert text == "line 1\n"
+    assert (start, end) == (7, 14)
+
+    text, start, end = read_range(log_file, end)
+    assert text == TEXT[14:]
+    assert end == len(TEXT)
+
+
+@pytest.mark.parametrize("n_lines", [0, 1, 3, 10, 20])
+def test_read_tail(log_file, n_lines):
+    text, start, end = read_tail(log_file, n_lines)
+    expected = "".join(TEXT.splitlines(keepends=True)[-n_lines:]) if n_lines else ""
+    assert text == expected
+    assert TEXT[start:end] == expected
+    assert end == len(TEXT)
+
+
+def test_read_lines(log_file):
+    text, start, end = read_lines(log_file, 2, 3)
+    assert text == "line 2\nline 3\nline 4\n"
+    assert TEXT[start:end] == text
+
+    text, start, end = read_lines(log_file, 100)
+    assert text == ""
+    assert start == end == len(TEXT)
+
+
+def test_run_log(workspace):
+    server = Server(workspace.get_root())
+    path = server.run_log_path(LogRequest(repo="repo", line="00000", num=0))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(TEXT)
+
+    full = server.run_log(LogRequest(repo="repo", line="00000", num=0))
+    assert full.log_text == TEXT
+    assert full.end == full.size == len(TEXT)
+
+    tail = server.run_log(LogRequest(repo="repo", line="00000", num=0, tail_lines=2))
+    assert tail.log_text == "line 8\nline 9\n"
+
+    appended = server.run_log(LogRequest(repo="repo", line="00000", num=0, offset=tail.end))
+    assert appended.log_text == ""
+
+
+def test_run_log_missing(workspace):
+    server = Server(workspace.get_root())
+    resp = server.run_log(LogRequest(repo="repo", line="00000", num=0))
+    assert resp.log_text is None
@@ -0,0 +1,64 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import random
+import sys
+import time
+
+import pytest
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.pool import IOPool
+from cascade_ui.server import LinePathSpec, RepoPathSpec, Server
+
+
+def test_map_keeps_order():
+    def slow_square(x):
+        time.sleep(random.random() / 100)
+        return x * x
+
+    pool = IOPool(workers=4)
+    assert pool.map(slow_square, range(20)) == [x * x for x in range(20)]
+
+
+def test_map_raises():
+    def fail(x):
+        raise ValueError(x)
+
+    with pytest.raises(ValueError):
+        IOPool(workers=4).map(fail, range(3))
+
+
+def test_same_results_with_workers(workspace):
+    repo = workspace["repo"]
+    line = repo["00000"]
+    for i in range(5):
+        line.save(BasicModel(a=i))
+    repo.add_line()
+
+    path = workspace.get_root()
+    results = []
+    for workers in (1, 4):
+        s = Server(path, io_workers=workers)
+        resp = s.repo(RepoPathSpec(repo="repo"))
+        line_resp = s.line(LinePathSpec(repo="repo", line="00000"))
+        results.append(([row.name for row in resp.lines], line_resp.items))
+    assert results[0] == results[1]
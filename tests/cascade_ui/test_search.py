@@ -0,0 +1,65 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.models import AddCommentRequest, SearchRequest
+from cascade_ui.search import TextIndex, tokenize
+from cascade_ui.server import Server
+from cascade_ui.watch import PollingDetector
+
+
+def test_text_index():
+    index = TextIndex()
+    index.add(1, {"slug": ["fair_squid_of_bliss"], "comments": ["LR bug again"]})
+    index.add(2, {"params": ["learning_rate"], "description": ["Squid baseline"]})
+
+    assert set(index.search(tokenize("squid"))) == {1, 2}
+    assert index.search(["squ"])[1] == (4, ["slug"])
+    assert index.search(["sq"]) == {}
+    assert set(index.search(["squid", "lr"])) == {1}
+    assert set(index.search(["learn"])) == {2}
+
+    index.add(1, {"slug": ["other"]})
+    assert set(index.search(["squid"])) == {2}
+    index.remove(2)
+    assert index.search(["squid"]) == {}
+    assert len(index) == 1
+
+
+def test_search_follows_comments(workspace):
+    line = workspace["repo"]["00000"]
+    model = BasicModel(learning_rate=0.1)
+    model.describe("Baseline with warmup")
+    line.save(model, only_meta=True)
+
+    s = Server(workspace.get_root(), detector=PollingDetector(interval=0))
+    hits = s.search(SearchRequest(query="warm")).hits
+    assert [(hit.kind, hit.num) for hit in hits] == [("item", 1)]
+    assert s.search(SearchRequest(query="learning rate")).hits[0].fields == ["params"]
+    assert s.search(SearchRequest(query="lr bug")).total == 0
+
+    s.add_comment(AddCommentRequest(comment="LR bug here", path_parts=["repo", "00000", "00001"]))
+    s.add_comment(AddCommentRequest(comment="LR bug everywhere", path_parts=["repo"]))
+    hits = s.search(SearchRequest(query="lr bug")).hits
+    assert sorted((hit.kind, hit.num) for hit in hits) == [("item", 1), ("repo", None)]
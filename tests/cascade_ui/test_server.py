@@ -14,13 +14,29 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import asyncio
+import json
 import os
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pydantic
+import pytest
+from cascade.metrics import Metric
+from cascade.models import BasicModel
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
 
 sys.path.append(BASE_DIR)
+from cascade_ui.models import (
+    AddCommentRequest,
+    LeaderboardQuery,
+    ModelFilesRequest,
+    ModelsBatchRequest,
+    SearchRequest,
+)
 from cascade_ui.server import LinePathSpec, ModelPathSpec, RepoPathSpec, Server
 
 
@@ -32,6 +48,29 @@ def test_repos(workspace):
     assert repo.name == "repo"
 
 
+def test_summaries_do_not_create_objects(workspace):
+    path = workspace.get_root()
+    workspace["repo"].add_line("data", line_type="data")
+    metas = [
+        os.path.join(path, "meta.json"),
+        os.path.join(path, "repo", "meta.json"),
+        os.path.join(path, "repo", "00000", "meta.json"),
+    ]
+    # Creating any of the objects would rewrite their metas
+    before = [os.stat(meta).st_mtime_ns for meta in metas]
+
+    s = Server(path)
+    ws = s.workspace()
+    repo = s.repo(RepoPathSpec(repo="repo"))
+
+    assert [(card.name, card.len) for card in ws.repos] == [("repo", 2)]
+    assert [(row.name, row.type, row.len) for row in repo.lines] == [
+        ("00000", "model_line", 1),
+        ("data", "data_line", 0),
+    ]
+    assert [os.stat(meta).st_mtime_ns for meta in metas] == before
+
+
 def test_lines(workspace):
     path = workspace.get_root()
 
@@ -47,3 +86,128 @@ def test_model(workspace):
     s = Server(path)
     model = s.model(ModelPathSpec(repo="repo", line="00000", num=0))
     assert len(model.artifacts) == 0
+
+
+def test_models_batch(workspace):
+    path = workspace.get_root()
+    first = workspace["repo"]["00000"]
+    first.save(BasicModel(lr=0.1, opt="adam"), only_meta=True)
+    second = workspace["repo"].add_line()
+    second.save(BasicModel(lr=0.1, opt="sgd"), only_meta=True)
+
+    s = Server(path)
+    batch = s.models_batch(
+        ModelsBatchRequest(
+            models=[
+                ModelPathSpec(repo="repo", line="00000", num=1),
+                ModelPathSpec(repo="repo", line="00001", num=0),
+                ModelPathSpec(repo="repo", line="00000", num=7),
+                ModelPathSpec(repo="repo", line="missing", num=0),
+                ModelPathSpec(repo="missing", line="00000", num=0),
+            ]
+        )
+    )
+    assert [m.item is not None for m in batch.models] == [True, True, False, False, False]
+    assert batch.params == ["params.lr", "params.opt"]
+    assert batch.values["params.opt"] == ["adam", "sgd", None, None, None]
+    assert batch.differing == ["params.opt"]
+    assert batch.models[0].config is None
+
+
+def test_nums_after_removal(workspace):
+    line = workspace["repo"]["00000"]
+    for acc in (0.1, 0.2):
+        model = BasicModel()
+        model.describe("Removal")
+        model.add_metric(Metric(name="acc", value=acc))
+        line.save(model, only_meta=True)
+    shutil.rmtree(os.path.join(line.get_root(), "00001"))
+
+    s = Server(workspace.get_root())
+    batch = s.models_batch(
+        ModelsBatchRequest(
+            models=[ModelPathSpec(repo="repo", line="00000", num=num) for num in range(3)]
+        )
+    )
+    assert [m.item is not None for m in batch.models] == [True, False, True]
+
+    entries = s.query(LeaderboardQuery(metric="metrics.acc")).entries
+    hits = s.search(SearchRequest(query="removal")).hits
+    assert [e.num for e in entries] == [2] and [h.num for h in hits] == [2]
+    model = s.model(ModelPathSpec(repo="repo", line="00000", num=2))
+    assert model.slug == entries[0].item.slug == hits[0].item.slug
+
+
+def test_model_files(workspace):
+    path = workspace.get_root()
+    model_root = os.path.join(path, "repo", "00000", "00000")
+    os.makedirs(os.path.join(model_root, "artifacts"), exist_ok=True)
+    for name, size in (("a.bin", 10), ("b.bin", 2048)):
+        with open(os.path.join(model_root, "artifacts", name), "wb") as f:
+            f.write(b"0" * size)
+
+    s = Server(path)
+    model_path = ModelPathSpec(repo="repo", line="00000", num=0)
+    model = s.model(model_path)
+    assert [os.path.basename(a.name) for a in model.artifacts] == ["a.bin", "b.bin"]
+    assert model.artifacts[0].size is None
+
+    sizes = s.model_files(ModelFilesRequest(models=[model_path, model_path])).models
+    assert len(sizes) == 2
+    assert [a.size_bytes for a in sizes[0].artifacts] == [10, 2048]
+    assert sizes[0].artifacts[1].size == "2.0 KB"
+    assert sizes[0].total_size_bytes == 2058
+
+    # Removing a file changes its folder, but not the meta
+    os.remove(os.path.join(model_root, "artifacts", "a.bin"))
+    files = s.model_files(ModelFilesRequest(models=[model_path])).models[0]
+    assert [os.path.basename(a.name) for a in files.artifacts] == ["b.bin"]
+    assert files.total_size_bytes == 2048
+
+
+@pytest.mark.parametrize("path_parts", [["..", ".."], ["repo", "../.."], ["/etc"], [""]])
+def test_comment_outside_workspace(path_parts):
+    with pytest.raises(pydantic.ValidationError):
+        AddCommentRequest(comment="comment", path_parts=path_parts)
+
+
+def test_concurrent_comments(workspace):
+    s = Server(workspace.get_root())
+    line_path = LinePathSpec(repo="repo", line="00000")
+    s.line(line_path)
+
+    def add(i):
+        return s.add_comment(
+            AddCommentRequest(comment=f"comment {i}", path_parts=["repo", "00000", "00000"])
+        )
+
+    with ThreadPoolExecutor(8) as pool:
+        added = list(pool.map(add, range(50)))
+
+    comments = s.model(ModelPathSpec(repo="repo", line="00000", num=0)).comments
+    assert sorted(c.message for c in comments) == sorted(c.message for c in added)
+    assert [c.id for c in comments] == [str(i) for i in range(1, 51)]
+    # Temporary files are renamed over the meta
+    model_root = os.path.join(workspace.get_root(), "repo", "00000", "00000")
+    assert [name for name in os.listdir(model_root) if name.startswith("meta.")] == ["meta.json"]
+    assert not [name for name in os.listdir(model_root) if name.startswith(".tmp")]
+
+
+def test_line_item_table_stream(workspace):
+    path = workspace.get_root()
+    workspace["repo"]["00000"].save(BasicModel(a=1))
+
+    s = Server(path)
+    line_path = LinePathSpec(repo="repo", line="00000")
+    expected = s.line_item_table(line_path, ["num", "params.a"])
+
+    # Without index the rows are read from disk
+    cold = Server(path)
+    for server in (cold, s):
+        resp = server.line_item_table_stream(line_path, ["num", "params.a"])
+        body = b"".join(asyncio.run(collect(resp.body_iterator)))
+        assert [json.loads(row) for row in body.splitlines()] == expected
+
+
+async def collect(iterator):
+    return [chunk async for chunk in iterator]
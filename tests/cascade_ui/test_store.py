@@ -0,0 +1,124 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui.cache import MetaCache
+from cascade_ui.index import LineIndex
+from cascade_ui.models import ModelFilesRequest
+from cascade_ui.refresh import IndexRefresher
+from cascade_ui.server import LinePathSpec, ModelPathSpec, RepoPathSpec, Server
+from cascade_ui.store import DEFAULT_INDEX_NAME, IndexStore
+from cascade_ui.watch import PollingDetector
+
+
+def test_index_restored_from_store(workspace):
+    line = workspace["repo"]["00000"]
+    line.save(BasicModel(a=1), only_meta=True)
+    line.reload()
+    store = IndexStore.for_workspace(workspace.get_root())
+
+    index = LineIndex(line.get_root(), MetaCache(), store=store)
+    index.sync(line.get_item_names())
+    assert os.path.exists(os.path.join(workspace.get_root(), DEFAULT_INDEX_NAME))
+
+    # A restarted server parses only the metas changed after the store was written
+    cache = MetaCache()
+    restored = LineIndex(line.get_root(), cache, store=IndexStore(store.path))
+    restored.sync(line.get_item_names())
+    assert cache.misses == 0
+    assert restored.column("params.a") == index.column("params.a") == [None, 1]
+    assert restored.items() == index.items()
+
+    line.save(BasicModel(a=2), only_meta=True)
+    line.reload()
+    cache = MetaCache()
+    restored = LineIndex(line.get_root(), cache, store=IndexStore(store.path))
+    restored.sync(line.get_item_names())
+    assert cache.misses == 1
+    assert restored.column("params.a") == [None, 1, 2]
+
+
+def test_server_with_store(workspace):
+    store = IndexStore.for_workspace(workspace.get_root())
+    server = Server(workspace.get_root(), meta_cache=MetaCache(), store=store)
+    repo = server.repo(RepoPathSpec(repo="repo"))
+
+    cache = MetaCache()
+    restarted = Server(workspace.get_root(), meta_cache=cache, store=store)
+    assert restarted.repo(RepoPathSpec(repo="repo")) == repo
+    # Only the repo meta is read, line summaries come from the store
+    assert cache.misses == 1
+
+    line = server.line(LinePathSpec(repo="repo", line="00000"))
+    model = server.model(ModelPathSpec(repo="repo", line="00000", num=0))
+    restarted = Server(workspace.get_root(), meta_cache=MetaCache(), store=store)
+    assert restarted.line(LinePathSpec(repo="repo", line="00000")) == line
+    assert restarted.model(ModelPathSpec(repo="repo", line="00000", num=0)) == model
+
+    model_path = ModelPathSpec(repo="repo", line="00000", num=0)
+    files_root = os.path.join(workspace.get_root(), "repo", "00000", "00000", "files")
+    before = server.model_files(ModelFilesRequest(models=[model_path])).models[0]
+    os.makedirs(files_root, exist_ok=True)
+    with open(os.path.join(files_root, "added.txt"), "w") as f:
+        f.write("added")
+    restarted = Server(workspace.get_root(), meta_cache=MetaCache(), store=store)
+    after = restarted.model_files(ModelFilesRequest(models=[model_path])).models[0]
+    assert after.total_size_bytes == before.total_size_bytes + 5
+
+
+def test_workers_share_refreshed_store(workspace, tmp_path):
+    line = workspace["repo"]["00000"]
+    index_path = str(tmp_path / DEFAULT_INDEX_NAME)
+
+    refresher = Server(
+        workspace.get_root(),
+        meta_cache=MetaCache(),
+        store=IndexStore(index_path),
+        detector=PollingDetector(interval=0),
+    )
+    cache = MetaCache()
+    worker = LineIndex(line.get_root(), cache, store=IndexStore(index_path))
+
+    refresher.refresh()
+    worker.sync(line.get_item_names())
+    assert cache.misses == 0
+
+    # Items written after the worker's first sync are also taken from the store
+    line.save(BasicModel(a=3), only_meta=True)
+    line.reload()
+    refresher.refresh()
+    worker.sync(line.get_item_names())
+    assert cache.misses == 0
+    assert worker.column("params.a")[-1] == 3
+
+
+def test_single_refresher(workspace, tmp_path):
+    index_path = str(tmp_path / DEFAULT_INDEX_NAME)
+    server = Server(workspace.get_root(), meta_cache=MetaCache())
+    first = IndexRefresher(server, index_path, interval=60)
+    second = IndexRefresher(server, index_path, interval=60)
+
+    assert first._try_lock()
+    assert not second._try_lock()
+    assert first.is_refresher and not second.is_refresher
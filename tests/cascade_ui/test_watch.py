@@ -0,0 +1,115 @@
+"""
+Copyright 2023-2025 Oleg Sevostyanov, Ilia Moiseev
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+from cascade.base import MetaHandler
+from cascade.models import BasicModel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.append(BASE_DIR)
+from cascade_ui import watch
+from cascade_ui.server import LinePathSpec, ModelPathSpec, Server
+
+
+def make_detectors():
+    detectors = [watch.PollingDetector(interval=0)]
+    if watch.inotify_simple is not None:
+        detectors.append(watch.InotifyDetector())
+    return detectors
+
+
+@pytest.mark.parametrize("detector", make_detectors())
+def test_detects_new_and_modified_items(workspace, detector):
+    line = workspace["repo"]["00000"]
+    root = line.get_root()
+    detector.watch(root)
+    assert detector.poll(root).items == set()
+
+    line.save(BasicModel())
+    changes = detector.poll(root)
+    assert changes.listing
+    assert "00001" in changes.items
+
+    meta = MetaHandler.read_dir(os.path.join(root, "00000"))
+    meta[0]["tags"] = ["changed"]
+    MetaHandler.write_dir(os.path.join(root, "00000"), meta)
+    changes = detector.poll(root)
+    assert not changes.listing
+    assert changes.items == {"00000"}
+    detector.close()
+
+
+def test_polling_interval(workspace):
+    line = workspace["repo"]["00000"]
+    detector = watch.PollingDetector(interval=3600)
+    detector.watch(line.get_root())
+
+    line.save(BasicModel())
+    assert detector.poll(line.get_root()) == watch.NO_CHANGES
+
+
+def test_server_picks_up_new_items(workspace):
+    s = Server(workspace.get_root(), detector=watch.PollingDetector(interval=0))
+    resp = s.line(LinePathSpec(repo="repo", line="00000"))
+    assert len(resp.items) == 1
+
+    workspace["repo"]["00000"].save(BasicModel(a=1))
+    resp = s.line(LinePathSpec(repo="repo", line="00000"))
+    assert resp.len == 2
+    assert [item.name for item in resp.items] == ["00000", "00001"]
+    assert "params.a" in resp.item_fields
+
+
+@pytest.mark.parametrize("detector", make_detectors())
+def test_server_drops_removed_items(workspace, detector):
+    line = workspace["repo"]["00000"]
+    line.save(BasicModel())
+    line.save(BasicModel())
+    s = Server(workspace.get_root(), detector=detector)
+    line_path = LinePathSpec(repo="repo", line="00000")
+    assert s.line(line_path).total == 3
+
+    shutil.rmtree(os.path.join(line.get_root(), "00001"))
+    resp = s.line(line_path)
+    assert resp.len == 2
+    assert resp.total == 2
+    assert [item.name for item in resp.items] == ["00000", "00002"]
+    assert len(s.line_item_table(line_path, ["num"])) == 2
+
+
+def test_nums_follow_folders_after_removal(workspace):
+    line = workspace["repo"]["00000"]
+    line.save(BasicModel())
+    line.save(BasicModel())
+    shutil.rmtree(os.path.join(line.get_root(), "00001"))
+    s = Server(workspace.get_root(), detector=watch.PollingDetector(interval=0))
+    line_path = LinePathSpec(repo="repo", line="00000")
+
+    # Streamed before the line is indexed
+    streamed = [json.loads(row) for row in s._iter_line_items(line, ["num", "slug"])]
+    table = s.line_item_table(line_path, ["num", "slug"])
+    assert [row["num"] for row in table] == [0, 2]
+    assert streamed == table
+    for row in table:
+        model = s.model(ModelPathSpec(repo="repo", line="00000", num=row["num"]))
+        assert model.slug == row["slug"]